@@ -0,0 +1,66 @@
+###----------------------------------
+###  Python Modules
+###----------------------------------
+import os, sys, time, getopt
+from core import *
+from core.agentTemplates import *
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+###----------------------------------------------
+### - Agent Setup Micro-benchmark
+###----------------------------------------------
+### Measures only the per-question setup cost that used to be paid before any
+### network call (graph compile, prompt parsing, retriever and chain construction)
+### against the registry lookups that replace it. No LLM or Elasticsearch request
+### is made, so placeholder endpoints are enough.
+os.environ.setdefault("ELASTIC_ENDPOINT", "http://localhost:9200")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://benchmark.openai.azure.com")
+
+def legacy_request_setup():
+    ### what processflow_graph_invoke + router/analyzer agents built on every question
+    llm = get_llm()
+    create_processflow_graph()
+    router_chain = PromptTemplate.from_template(routerPrompt()) | llm
+    rag_chain = (
+        {"context": create_retriever() | format_docs,
+         "question": RunnableLambda(lambda x: "question")}
+        | PromptTemplate.from_template(ragAnalyzerPrompt())
+        | RunnableLambda(lambda x: x)
+        | llm
+        )
+    return router_chain, rag_chain
+
+def warm_request_setup():
+    get_resource("processflow_graph")
+    return get_agent_chain("router"), get_agent_chain("analyzer")
+
+def time_per_call(function, iterations):
+    function()
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start_time) / iterations * 1000
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "n:", ["iterations="])
+    except getopt.GetoptError as err:
+        print(f"Error: {err}")
+        print("Usage: python3 -m benchmarks.agent_overhead [-n <iterations>]")
+        sys.exit(1)
+
+    iterations = 200
+    for opt, arg in opts:
+        if opt in ("-n", "--iterations"):
+            iterations = int(arg)
+
+    legacy_ms = time_per_call(legacy_request_setup, iterations)
+    warm_ms = time_per_call(warm_request_setup, iterations)
+    print(f"Per-request setup, rebuilt each time : {round(legacy_ms, 3)} ms")
+    print(f"Per-request setup, reused            : {round(warm_ms, 3)} ms")
+    print(f"Removed per request                  : {round(legacy_ms - warm_ms, 3)} ms ({iterations} iterations)")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,296 @@
+###----------------------------------
+###  Python Modules
+###----------------------------------
+import io, os, sys, json, time, getopt, tempfile, contextlib
+import core.utility
+from core import *
+import core.agentTemplates as agentTemplates
+from core.answerCache import clear_answer_cache
+from core.retrievalCache import clear_retrieval_cache
+from core.agentTemplates import processflow_graph_invoke
+from core.batchInference import processflow_graph_batch
+from core.responseStreaming import stream_processflow_graph
+from benchmarks.fakes import FakeChatModel, fake_speech2text, start_fake_elasticsearch, llm_timings, reset_llm_timings
+
+###----------------------------------------------
+### - Offline End-to-End Benchmark
+###----------------------------------------------
+### Ingestion, router, retrieval and generation run through the real code paths
+### against local stand-ins (benchmarks/fakes.py) : a fake chat model with fixed
+### latency and token rate, an in-process Elasticsearch HTTP server and an ASR
+### stub. Questions are unique per run so the answer and retrieval caches start
+### cold. The JSON report can be diffed against a previous run with -b.
+ASPECTS = ("plot", "characters", "theme", "setting", "moral", "ending")
+THROUGHPUT_METRICS = ("docs_per_sec", "qps")
+retrieval_timings = []
+
+def timed_retrieval():
+    ### wraps the agents' retrieval step, the chains are built afterwards and pick up the wrappers;
+    ### calls handed prefetched documents are not searches and are not timed
+    retrieve_documents, aretrieve_documents = agentTemplates.retrieve_documents, agentTemplates.aretrieve_documents
+
+    def timed(inputs):
+        if inputs.get("documents") is not None:
+            return retrieve_documents(inputs)
+        start_time = time.perf_counter()
+        try:
+            return retrieve_documents(inputs)
+        finally:
+            retrieval_timings.append(time.perf_counter() - start_time)
+
+    async def atimed(inputs):
+        if inputs.get("documents") is not None:
+            return await aretrieve_documents(inputs)
+        start_time = time.perf_counter()
+        try:
+            return await aretrieve_documents(inputs)
+        finally:
+            retrieval_timings.append(time.perf_counter() - start_time)
+
+    agentTemplates.retrieve_documents, agentTemplates.aretrieve_documents = timed, atimed
+
+def setup_stand_ins(llm_latency, tokens_per_second, search_latency, asr_rtf, backend):
+    endpoint, fake_es, server = start_fake_elasticsearch(search_latency)
+    os.environ["ELASTIC_ENDPOINT"] = endpoint
+    ### ingestion and the retriever read the backend from utility
+    core.utility.retrieval_backend = backend
+    reset_resource("es_client")
+    set_resource("llm", FakeChatModel(latency=llm_latency, tokens_per_second=tokens_per_second))
+    set_resource("asr_pipeline", fake_speech2text(rtf=asr_rtf))
+    timed_retrieval()
+    return fake_es, server
+
+def write_audio_feeds(directory, count):
+    os.makedirs(directory, exist_ok=True)
+    for number in range(count):
+        with open(os.path.join(directory, f"story-{number:03d}.wav"), "wb") as f:
+            f.write(os.urandom(1024))
+
+def generate_questions(count, stories, offset=0):
+    ### 1 compare for every 3 analyze, no (subject, aspect) pair repeats within a run
+    questions = []
+    for number in range(offset, offset + count):
+        story, aspect = number % stories, ASPECTS[(number // stories) % len(ASPECTS)]
+        if number % 4 == 3:
+            questions.append(f"compare story {story:03d} and story {(story + 1) % stories:03d} on {aspect}")
+        else:
+            questions.append(f"analyze the {aspect} of story {story:03d}")
+    return questions
+
+def percentiles(seconds):
+    if not seconds:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    values = sorted(seconds)
+    pick = lambda percentile: round(values[min(len(values) - 1, int(len(values) * percentile))] * 1000, 1)
+    return {"count": len(values), "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def reset_caches():
+    clear_answer_cache()
+    clear_retrieval_cache()
+
+@contextlib.contextmanager
+def quiet(verbose):
+    if verbose:
+        yield
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+
+###----------------------------------------------
+### - Scenarios
+###----------------------------------------------
+def run_ingestion(fake_es, workdir, documents, modes, verbose):
+    report = {}
+    for mode in modes:
+        ### fresh manifest and transcript cache, so every mode transcribes and indexes everything
+        mode_dir = os.path.join(workdir, f"ingest-{mode}")
+        write_audio_feeds(os.path.join(mode_dir, "audio"), documents)
+        os.chdir(mode_dir)
+        fake_es.clear()
+        with quiet(verbose):
+            summary = ingestAudio("audio", bulk_mode=(mode != "sequential"), pipeline_mode=False, process_workers=0,
+                                  incremental=False, longform_mode=False, batch_size=1, bulk_load=(mode == "bulk-load"))
+        report[mode] = {"documents": summary["indexed"], "failed": summary["failed"],
+                        "elapsed_seconds": summary["elapsed_seconds"], "docs_per_sec": summary["docs_per_sec"]}
+        print(f"Ingestion ({mode}): {summary['indexed']} docs, {summary['docs_per_sec']} docs/sec")
+    return report
+
+def run_latency(questions, verbose):
+    reset_caches()
+    reset_llm_timings()
+    retrieval_timings.clear()
+    totals = []
+    with quiet(verbose):
+        for question in questions:
+            start_time = time.perf_counter()
+            processflow_graph_invoke(question)
+            totals.append(time.perf_counter() - start_time)
+    report = {"router": percentiles(llm_timings["router"]),
+              "retrieval": percentiles(retrieval_timings),
+              "generation": percentiles(llm_timings["generation"]),
+              "end_to_end": percentiles(totals)}
+    for stage, stats in report.items():
+        print(f"Latency {stage:<11} p50 {stats['p50_ms']:>8} ms, p95 {stats['p95_ms']:>8} ms, p99 {stats['p99_ms']:>8} ms")
+    return report
+
+def run_streaming(questions, verbose):
+    reset_caches()
+    first_tokens, totals = [], []
+    with quiet(verbose):
+        for question in questions:
+            metrics = {}
+            for _ in stream_processflow_graph(question, metrics):
+                pass
+            first_tokens.append(metrics["time_to_first_token"])
+            totals.append(metrics["total_seconds"])
+    report = {"time_to_first_token": percentiles(first_tokens), "total": percentiles(totals)}
+    print(f"Streaming TTFT p50 {report['time_to_first_token']['p50_ms']} ms, p95 {report['time_to_first_token']['p95_ms']} ms")
+    return report
+
+def run_concurrency(questions, levels, verbose):
+    report = {}
+    for level in levels:
+        reset_caches()
+        start_time = time.perf_counter()
+        with quiet(verbose):
+            results = processflow_graph_batch(questions, max_concurrency=level)
+        elapsed = time.perf_counter() - start_time
+        failed = sum(1 for result in results if result["error"] is not None)
+        report[str(level)] = {"questions": len(questions), "failed": failed, "elapsed_seconds": round(elapsed, 3),
+                              "qps": round(len(questions) / elapsed, 2) if elapsed > 0 else 0.0,
+                              "latency": percentiles([result["elapsed_seconds"] for result in results])}
+        print(f"Concurrency {level:>3}: {report[str(level)]['qps']} questions/sec, {failed} failed")
+    return report
+
+###----------------------------------------------
+### - Baseline Comparison
+###----------------------------------------------
+def flatten(report, prefix=""):
+    values = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and (key.endswith("_ms") or key in THROUGHPUT_METRICS):
+            values[f"{prefix}{key}"] = value
+    return values
+
+def compare_with_baseline(report, baseline, threshold):
+    ### latencies regress when they grow, throughputs when they shrink, by more than threshold
+    current, previous = flatten(report["results"]), flatten(baseline["results"])
+    regressions = []
+    print(f"\n{'metric':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric in sorted(current.keys() & previous.keys()):
+        before, after = previous[metric], current[metric]
+        change = (after - before) / before if before else 0.0
+        worse = -change if metric.rsplit(".", 1)[-1] in THROUGHPUT_METRICS else change
+        flag = " <-- regression" if worse > threshold else ""
+        if flag: regressions.append(metric)
+        print(f"{metric:<48} {before:>10} {after:>10} {change:>+8.1%}{flag}")
+    return regressions
+
+###----------------------------------------------
+### - Main Module
+###----------------------------------------------
+def print_help():
+    help_text = """
+    Usage: python3 -m benchmarks.end_to_end [options]
+
+    Options:
+    -n, --questions <count>         Questions per latency/concurrency run (default: 40).
+    -d, --documents <count>         Audio files ingested per ingestion mode (default: 50).
+    -c, --concurrency <levels>      Comma separated concurrency levels (default: 1,4,16).
+    -l, --llm-latency <seconds>     Fake LLM time to first token (default: 0.05).
+    -t, --tokens-per-second <rate>  Fake LLM decode rate (default: 400).
+    -s, --search-latency <seconds>  Fake Elasticsearch time per search (default: 0.005).
+    -a, --asr-rtf <factor>          Fake ASR real time factor for 60s of audio (default: 0.002).
+    -x, --backend <name>            Retrieval backend, elasticsearch or local (default: BACKEND in config.ini).
+    -o, --output <file>             Write the report as JSON.
+    -b, --baseline <file>           Compare with a previous JSON report, exit 1 on regression.
+    -r, --threshold <fraction>      Allowed change before a metric counts as regressed (default: 0.1).
+    -v, --verbose                   Keep the application output.
+    -h, --help                      Show this help message and exit.
+
+    Run from the repository root. Nothing leaves the machine : no Azure OpenAI,
+    Elasticsearch or Whisper model is needed.
+    """
+    print(help_text)
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "n:d:c:l:t:s:a:x:o:b:r:vh",
+                                   ["questions=", "documents=", "concurrency=", "llm-latency=", "tokens-per-second=",
+                                    "search-latency=", "asr-rtf=", "backend=", "output=", "baseline=", "threshold=", "verbose", "help"])
+    except getopt.GetoptError as err:
+        print(f"Error: {err}")
+        print_help()
+        sys.exit(1)
+
+    settings = {"questions": 40, "documents": 50, "concurrency": [1, 4, 16], "llm_latency": 0.05,
+                "tokens_per_second": 400.0, "search_latency": 0.005, "asr_rtf": 0.002, "backend": retrieval_backend}
+    output, baseline, threshold, verbose = None, None, 0.1, False
+    for opt, arg in opts:
+        if opt in ("-n", "--questions"):
+            settings["questions"] = int(arg)
+        elif opt in ("-d", "--documents"):
+            settings["documents"] = int(arg)
+        elif opt in ("-c", "--concurrency"):
+            settings["concurrency"] = [int(level) for level in arg.split(",")]
+        elif opt in ("-l", "--llm-latency"):
+            settings["llm_latency"] = float(arg)
+        elif opt in ("-t", "--tokens-per-second"):
+            settings["tokens_per_second"] = float(arg)
+        elif opt in ("-s", "--search-latency"):
+            settings["search_latency"] = float(arg)
+        elif opt in ("-a", "--asr-rtf"):
+            settings["asr_rtf"] = float(arg)
+        elif opt in ("-x", "--backend"):
+            if arg not in ("elasticsearch", "local"):
+                print(f"Error: Unknown retrieval backend '{arg}', choose elasticsearch or local")
+                sys.exit(1)
+            settings["backend"] = arg
+        elif opt in ("-o", "--output"):
+            output = os.path.abspath(arg)
+        elif opt in ("-b", "--baseline"):
+            baseline = os.path.abspath(arg)
+        elif opt in ("-r", "--threshold"):
+            threshold = float(arg)
+        elif opt in ("-v", "--verbose"):
+            verbose = True
+        elif opt in ("-h", "--help"):
+            print_help()
+            sys.exit(0)
+
+    fake_es, server = setup_stand_ins(settings["llm_latency"], settings["tokens_per_second"],
+                                      settings["search_latency"], settings["asr_rtf"], settings["backend"])
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory(prefix="e2e-benchmark-") as workdir:
+            results = {"ingestion": run_ingestion(fake_es, workdir, settings["documents"], ("bulk", "sequential", "bulk-load"), verbose)}
+            ### queries run against the index left by the last ingestion mode
+            stories, count = settings["documents"], settings["questions"]
+            results["latency"] = run_latency(generate_questions(count, stories), verbose)
+            results["streaming"] = run_streaming(generate_questions(max(1, count // 4), stories, offset=count), verbose)
+            results["concurrency"] = run_concurrency(generate_questions(count, stories, offset=2 * count),
+                                                     settings["concurrency"], verbose)
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+
+    report = {"settings": settings, "results": results, "elasticsearch_requests": fake_es.requests,
+              "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}")
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {threshold:.0%}")
+            sys.exit(1)
+        print(f"\nNo regression beyond {threshold:.0%}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
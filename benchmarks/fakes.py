@@ -0,0 +1,312 @@
+###----------------------------------
+###  Python Modules
+###----------------------------------
+import re, json, time, random, asyncio, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+###----------------------------------------------
+### - Local Stand-ins for Benchmarks
+###----------------------------------------------
+### Deterministic replacements for Azure OpenAI, Elasticsearch and Whisper so the
+### whole flow (ingestion, router, retrieval, generation) can be timed offline.
+### The ES stand-in is a real HTTP server, so the elasticsearch client, its pool
+### and the bulk helpers run unmodified against it.
+_VOCABULARY = ("sailor island treasure merchant storm ship king palace thief lamp genie desert market "
+               "forest wolf river village mountain dragon knight journey secret promise courage").split()
+_timings_lock = threading.Lock()
+llm_timings = {"router": [], "generation": []}
+
+def synthetic_transcript(audio_id, words=300):
+    ### same audio id, same transcript : runs are comparable
+    generator = random.Random(audio_id)
+    title = re.sub(r"\.\w+$", "", audio_id).replace("-", " ")
+    return f"{title}. " + " ".join(generator.choice(_VOCABULARY) for _ in range(words))
+
+def reset_llm_timings():
+    with _timings_lock:
+        for timings in llm_timings.values():
+            timings.clear()
+
+###----------------------------------------------
+### - Chat Model
+###----------------------------------------------
+def _router_decision(prompt):
+    question = prompt.split("Question :", 1)[1].split("\n", 1)[0].strip().lower()
+    match = re.match(r"compare (.+?) and (.+?)(?: on (\w+))?\??$", question)
+    if match:
+        return f"compare,{match.group(1)} | {match.group(2)},{match.group(3) or 'plot'}"
+    match = re.match(r"analy[sz]e the (\w+) of (.+?)\??$", question)
+    if match:
+        return f"analyze,{match.group(2)},{match.group(1)}"
+    return "unknown"
+
+class FakeChatModel(BaseChatModel):
+    ### latency : seconds before the first token; tokens_per_second : decode rate
+    latency: float = 0.2
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark-chat"
+
+    def _response(self, messages):
+        prompt = messages[-1].content
+        if "routing agent" in prompt:
+            return "router", _router_decision(prompt).split(" ")
+        words = re.findall(r"\w+", prompt.rsplit("Question:", 1)[-1])
+        return "generation", [words[i % len(words)] if words else "answer" for i in range(self.answer_tokens)]
+
+    def _record(self, kind, start_time):
+        with _timings_lock:
+            llm_timings[kind].append(time.perf_counter() - start_time)
+
+    def _tokens(self, tokens):
+        return [token if i == len(tokens) - 1 else token + " " for i, token in enumerate(tokens)]
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        start_time = time.perf_counter()
+        kind, tokens = self._response(messages)
+        time.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        self._record(kind, start_time)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self._tokens(tokens))))])
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        start_time = time.perf_counter()
+        kind, tokens = self._response(messages)
+        await asyncio.sleep(self.latency + len(tokens) / self.tokens_per_second)
+        self._record(kind, start_time)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(self._tokens(tokens))))])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs):
+        start_time = time.perf_counter()
+        kind, tokens = self._response(messages)
+        time.sleep(self.latency)
+        for token in self._tokens(tokens):
+            time.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager: run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        self._record(kind, start_time)
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs):
+        start_time = time.perf_counter()
+        kind, tokens = self._response(messages)
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(tokens):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager: await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        self._record(kind, start_time)
+
+###----------------------------------------------
+### - Speech2Text
+###----------------------------------------------
+def fake_speech2text(rtf=0.05, audio_seconds=60, words=300):
+    ### (pipeline, forced_decoder_ids) like speech2Text; sleeps rtf * audio_seconds per file
+    def transcribe(audio_in, generate_kwargs=None):
+        time.sleep(rtf * audio_seconds)
+        return {"text": synthetic_transcript(str(audio_in).rsplit("/", 1)[-1], words)}
+    return transcribe, None
+
+###----------------------------------------------
+### - Elasticsearch
+###----------------------------------------------
+def _terms(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class FakeElasticsearch:
+    ### documents per index; search scores by query-term overlap and returns chunk inner_hits
+    def __init__(self, search_latency=0.02, chunk_words=50):
+        self.search_latency = search_latency
+        self.chunk_words = chunk_words
+        self.indices = {}
+        self.settings = {}
+        self.aliases = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def clear(self):
+        with self.lock:
+            self.indices.clear()
+            self.settings.clear()
+            self.aliases.clear()
+
+    def resolve(self, name):
+        ### an alias stands for its (single) index, like a read through an alias
+        indices = sorted(self.aliases.get(name, ()))
+        return indices[0] if indices else name
+
+    def update_aliases(self, actions):
+        with self.lock:
+            for action in actions:
+                op, params = next(iter(action.items()))
+                if op == "add":
+                    self.aliases.setdefault(params["alias"], set()).add(params["index"])
+                elif op == "remove":
+                    self.aliases.get(params["alias"], set()).discard(params["index"])
+                elif op == "remove_index":
+                    self.indices.pop(params["index"], None)
+                    self.settings.pop(params["index"], None)
+                    for indices in self.aliases.values(): indices.discard(params["index"])
+            self.aliases = {alias: indices for alias, indices in self.aliases.items() if indices}
+        return {"acknowledged": True}
+
+    def _chunks(self, content):
+        words = content.split()
+        return [" ".join(words[i:i + self.chunk_words]) for i in range(0, len(words), self.chunk_words)] or [""]
+
+    def put(self, index, doc_id, source):
+        with self.lock:
+            documents = self.indices.setdefault(index, {})
+            result = "updated" if doc_id in documents else "created"
+            documents[doc_id] = source
+        return result
+
+    def search(self, index, body):
+        time.sleep(self.search_latency)
+        documents = self.indices.get(index, {})
+        size = body.get("size", 10)
+        try:
+            query = body["retriever"]["rrf"]["retrievers"][1]["standard"]["query"]["match"]["content"]
+        except (KeyError, IndexError, TypeError):
+            query = None
+        if query is None:
+            ranked = [(0, doc_id) for doc_id in sorted(documents)]
+        else:
+            query_terms = set(_terms(query))
+            ranked = sorted(((-len(query_terms & set(_terms(source.get("content", "")))), doc_id)
+                             for doc_id, source in documents.items()))
+        hits = []
+        for score, doc_id in ranked[:size]:
+            source = dict(documents[doc_id])
+            chunks = self._chunks(source.get("content", ""))
+            hit = {"_index": index, "_id": doc_id, "_score": -score,
+                   "_source": {**source, "semantic_data": {"inference": {"chunks": [{"text": chunk} for chunk in chunks]}}}}
+            if query is not None:
+                matched = sorted(range(len(chunks)), key=lambda offset: -len(set(_terms(chunks[offset])) & set(_terms(query))))[:3]
+                hit["inner_hits"] = {"semantic_data": {"hits": {"hits": [
+                    {"_nested": {"field": "semantic_data.inference.chunks", "offset": offset}, "_source": {"text": chunks[offset]}}
+                    for offset in matched]}}}
+            hits.append(hit)
+        return {"took": 1, "timed_out": False, "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+                "hits": {"total": {"value": len(documents), "relation": "eq"}, "hits": hits}}
+
+    def delete_by_query(self, index, body):
+        query = body.get("query", {})
+        hashes = set(query.get("terms", {}).get("audio_hash", []))
+        ### legacy documents : audio_id in the list and no audio_hash
+        legacy_ids = {audio_id for clause in query.get("bool", {}).get("filter", [])
+                      for audio_id in clause.get("terms", {}).get("audio_id", [])}
+        with self.lock:
+            documents = self.indices.get(self.resolve(index), {})
+            doomed = [doc_id for doc_id, source in documents.items()
+                      if source.get("audio_hash") in hashes or ("audio_hash" not in source and source.get("audio_id") in legacy_ids)]
+            for doc_id in doomed:
+                del documents[doc_id]
+        return {"deleted": len(doomed)}
+
+    def bulk(self, lines, default_index=None):
+        items = []
+        for action_line, source_line in zip(lines[::2], lines[1::2]):
+            op, meta = next(iter(action_line.items()))
+            index = self.resolve(meta.get("_index", default_index))
+            doc_id = meta.get("_id") or f"auto-{len(self.indices.get(index, {}))}"
+            result = self.put(index, doc_id, source_line)
+            items.append({op: {"_index": index, "_id": doc_id, "result": result, "status": 201 if result == "created" else 200}})
+        return {"took": 1, "errors": False, "items": items}
+
+def _handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, payload=None):
+            data = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            self.send_header("X-elastic-product", "Elasticsearch")
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            if self.command != "HEAD": self.wfile.write(data)
+
+        def _body(self):
+            raw = self.rfile.read(int(self.headers.get("content-length", 0) or 0)).decode()
+            if "ndjson" in self.headers.get("content-type", ""):
+                return [json.loads(line) for line in raw.splitlines() if line.strip()]
+            return json.loads(raw) if raw.strip() else {}
+
+        def _route(self):
+            fake.requests += 1
+            path, _, query_string = self.path.partition("?")
+            parts = [part for part in path.split("/") if part]
+            body = self._body()
+            if not parts:
+                return self._reply(200, {"name": "fake", "cluster_name": "benchmark", "version": {"number": "8.15.0"},
+                                         "tagline": "You Know, for Search"})
+            if parts[-1] == "_bulk":
+                return self._reply(200, fake.bulk(body, parts[0] if len(parts) > 1 else None))
+            if parts[0] == "_aliases":
+                return self._reply(200, fake.update_aliases(body["actions"]))
+            if parts[0] == "_alias":
+                indices = fake.aliases.get(parts[1], ())
+                return self._reply(200 if indices else 404, {index: {"aliases": {parts[1]: {}}} for index in indices})
+            if parts[0] == "_cluster":
+                return self._reply(200, {"status": "green", "timed_out": False})
+            if parts[0] == "_search":
+                ### scroll continuation : the first page already held every document
+                return self._reply(200, {"_scroll_id": "fake-scroll", "succeeded": True,
+                                         "hits": {"total": {"value": 0, "relation": "eq"}, "hits": []}})
+            index = fake.resolve(parts[0])
+            if len(parts) == 1:
+                if self.command == "HEAD":
+                    return self._reply(200 if index in fake.indices else 404)
+                if self.command == "DELETE":
+                    found = fake.indices.pop(index, None) is not None
+                    fake.settings.pop(index, None)
+                    return self._reply(200 if found else 404, {"acknowledged": found})
+                fake.indices.setdefault(index, {})
+                fake.settings[index] = {"number_of_shards": "1", "number_of_replicas": "1", **body.get("settings", {})}
+                return self._reply(200, {"acknowledged": True, "index": index})
+            operation = parts[1]
+            if operation == "_search":
+                if "size=" in query_string: body["size"] = int(re.search(r"size=(\d+)", query_string).group(1))
+                response = fake.search(index, body)
+                if "scroll=" in query_string: response["_scroll_id"] = "fake-scroll"
+                return self._reply(200, response)
+            if operation == "_msearch":
+                return self._reply(200, {"took": 1, "responses": [fake.search(index, search) for search in body[1::2]]})
+            if operation == "_count":
+                return self._reply(200, {"count": len(fake.indices.get(index, {}))})
+            if operation == "_doc":
+                doc_id = parts[2] if len(parts) > 2 else f"auto-{len(fake.indices.get(index, {}))}"
+                result = fake.put(index, doc_id, body)
+                return self._reply(201 if result == "created" else 200, {"_index": index, "_id": doc_id, "result": result})
+            if operation == "_delete_by_query":
+                return self._reply(200, fake.delete_by_query(index, body))
+            if operation in ("_refresh", "_forcemerge"):
+                return self._reply(200, {"_shards": {"total": 1, "successful": 1, "failed": 0}})
+            if operation == "_settings":
+                if self.command == "PUT":
+                    fake.settings.setdefault(index, {}).update(body.get("index", body))
+                    return self._reply(200, {"acknowledged": True})
+                return self._reply(200, {index: {"settings": {"index": fake.settings.get(index, {})}}})
+            return self._reply(404, {"error": f"unsupported {self.command} {self.path}", "status": 404})
+
+        do_GET = do_POST = do_PUT = do_HEAD = do_DELETE = _route
+    return Handler
+
+def start_fake_elasticsearch(search_latency=0.02):
+    ### returns (endpoint url, fake, server); server.shutdown() stops it
+    fake = FakeElasticsearch(search_latency=search_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-elasticsearch", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", fake, server
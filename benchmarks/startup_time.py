@@ -0,0 +1,109 @@
+###----------------------------------
+###  Python Modules
+###----------------------------------
+import os, sys, time, json, getopt, statistics, subprocess
+
+###----------------------------------------------
+### - Cold Start Benchmark
+###----------------------------------------------
+### Each entry point is started in a fresh interpreter with -X importtime. Wall
+### time covers interpreter start + imports (+ the help text for console.py);
+### the import breakdown lists the top-level modules that cost the most.
+ENTRY_POINTS = {
+    "import core":             ["-c", "import core"],
+    "console.py -h":           ["console.py", "-h"],
+    "page: architecture":      ["-c", "import webApp.architecture"],
+    "page: ingestionLayer":    ["-c", "import webApp.ingestionLayer"],
+    "page: multiAgent":        ["-c", "import importlib; importlib.import_module('webApp.multiAgent-inferenceLayer')"],
+    "agent stack (first use)": ["-c", "import core; core.get_agent_chain"],
+    "tracing (first use)":     ["-c", "import core; core.tracing_stats"],
+    "streamlit (baseline)":    ["-c", "import streamlit"],
+}
+
+def parse_importtime(stderr):
+    ### "import time: self [us] | cumulative | imported package", nesting shown by indentation
+    top_level = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if not module.startswith("  "):
+            top_level[module.strip()] = int(cumulative) / 1000
+    return top_level
+
+def measure_entry_point(args, repeats):
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    ### no client is built during startup, placeholders keep config validation quiet
+    env.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    env.setdefault("AZURE_OPENAI_ENDPOINT", "https://benchmark.openai.azure.com")
+    wall_times, imports = [], {}
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        process = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True, env=env)
+        wall_times.append((time.perf_counter() - start_time) * 1000)
+        imports = parse_importtime(process.stderr)
+    return {"wall_ms": round(statistics.median(wall_times), 1),
+            "import_ms": round(sum(imports.values()), 1),
+            "top_imports": {module: round(ms, 1) for module, ms in sorted(imports.items(), key=lambda item: -item[1])[:5]}}
+
+def print_report(reports):
+    print(f"\n{'entry point':<26} {'wall ms':>9} {'import ms':>10}  heaviest top-level imports (ms)")
+    for name, report in reports.items():
+        heaviest = ", ".join(f"{module} {ms}" for module, ms in report["top_imports"].items())
+        print(f"{name:<26} {report['wall_ms']:>9} {report['import_ms']:>10}  {heaviest}")
+
+###----------------------------------------------
+### - Main Module
+###----------------------------------------------
+def print_help():
+    help_text = """
+    Usage: python3 -m benchmarks.startup_time [options]
+
+    Options:
+    -r, --repeats <count>       Cold starts per entry point, the median is reported (default: 5).
+    -e, --entry <name>          Only measure this entry point (repeatable).
+    -o, --output <file>         Write the report as JSON.
+    -h, --help                  Show this help message and exit.
+
+    Run from the repository root.
+    """
+    print(help_text)
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "r:e:o:h", ["repeats=", "entry=", "output=", "help"])
+    except getopt.GetoptError as err:
+        print(f"Error: {err}")
+        print_help()
+        sys.exit(1)
+
+    repeats, entries, output = 5, [], None
+    for opt, arg in opts:
+        if opt in ("-r", "--repeats"):
+            repeats = int(arg)
+        elif opt in ("-e", "--entry"):
+            entries.append(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-h", "--help"):
+            print_help()
+            sys.exit(0)
+
+    unknown = [entry for entry in entries if entry not in ENTRY_POINTS]
+    if unknown:
+        print(f"Error: Unknown entry point(s) {unknown}, choose from {list(ENTRY_POINTS)}")
+        sys.exit(1)
+
+    reports = {}
+    for name in entries or ENTRY_POINTS:
+        print(f"Measuring {name}")
+        reports[name] = measure_entry_point(ENTRY_POINTS[name], repeats)
+    print_report(reports)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(reports, f, indent=2)
+        print(f"Report written to {output}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
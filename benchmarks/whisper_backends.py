@@ -0,0 +1,138 @@
+###----------------------------------
+###  Python Modules
+###----------------------------------
+import sys, time, json, getopt, resource, platform, multiprocessing
+
+###----------------------------------------------
+### - Whisper Inference Backend Benchmark
+###----------------------------------------------
+### Each configuration runs in a fresh process so its peak RSS is measured in
+### isolation. RTF (real-time factor) = transcription time / audio duration;
+### below 1.0 means faster than real time.
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ### ru_maxrss is bytes on macOS and kilobytes on Linux
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+def run_configuration(configuration, audio_in, repeats, results):
+    from core.utility import speech2Text
+    from core.ingestionPipeline import decode_audio
+
+    load_start_time = time.time()
+    transcribe_pipe, forced_decoder_ids = speech2Text(**configuration)
+    load_seconds = time.time() - load_start_time
+
+    sampling_rate = transcribe_pipe.feature_extractor.sampling_rate
+    audio = decode_audio(audio_in, sampling_rate)
+    audio_seconds = len(audio) / sampling_rate
+
+    ### warm-up pass : first call pays for lazy init (and compilation with torch.compile)
+    transcribe_pipe({"raw": audio[:sampling_rate * 5], "sampling_rate": sampling_rate},
+                    generate_kwargs={"forced_decoder_ids": forced_decoder_ids})
+
+    timings = []
+    for _ in range(repeats):
+        start_time = time.time()
+        text = transcribe_pipe({"raw": audio, "sampling_rate": sampling_rate},
+                               generate_kwargs={"forced_decoder_ids": forced_decoder_ids})['text']
+        timings.append(time.time() - start_time)
+
+    best = min(timings)
+    results.put({**configuration,
+                 "load_seconds": round(load_seconds, 2),
+                 "audio_seconds": round(audio_seconds, 2),
+                 "transcribe_seconds": round(best, 2),
+                 "rtf": round(best / audio_seconds, 3),
+                 "peak_rss_mb": peak_rss_mb(),
+                 "text_preview": text[:80]})
+
+def benchmark_configurations(configurations, audio_in, repeats=1):
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for configuration in configurations:
+        print(f"Benchmarking {configuration}")
+        results = context.Queue()
+        worker = context.Process(target=run_configuration, args=(configuration, audio_in, repeats, results))
+        worker.start()
+        worker.join()
+        if worker.exitcode != 0:
+            reports.append({**configuration, "error": f"exit code {worker.exitcode}"})
+        else:
+            reports.append(results.get())
+    return reports
+
+def print_report(reports):
+    columns = ["model_id", "quantize", "num_threads", "compile_model", "load_seconds", "transcribe_seconds", "rtf", "peak_rss_mb"]
+    print("\n" + " | ".join(columns))
+    for report in reports:
+        if "error" in report:
+            print(f"{report['model_id']} | {report['quantize']} | {report['num_threads']} | {report['compile_model']} | {report['error']}")
+        else:
+            print(" | ".join(str(report[column]) for column in columns))
+
+###----------------------------------------------
+### - Main Module
+###----------------------------------------------
+def print_help():
+    help_text = """
+    Usage: python3 -m benchmarks.whisper_backends -a <audio-file> [options]
+
+    Options:
+    -a, --audio <file>          Audio file to transcribe.
+    -m, --models <ids>          Comma separated Whisper model ids (default: openai/whisper-base,openai/whisper-small,openai/whisper-medium).
+    -q, --quantize              Also benchmark each model with dynamic int8 quantization.
+    -t, --threads <count>       Torch intra-op threads per run (default: torch default).
+    -c, --compile               Also benchmark each configuration with torch.compile.
+    -r, --repeats <count>       Timed runs per configuration, best one is reported (default: 1).
+    -o, --output <file>         Write the report as JSON.
+    -h, --help                  Show this help message and exit.
+    """
+    print(help_text)
+
+def main(argv):
+    try:
+        opts, args = getopt.getopt(argv, "a:m:qt:cr:o:h", ["audio=", "models=", "quantize", "threads=", "compile", "repeats=", "output=", "help"])
+    except getopt.GetoptError as err:
+        print(f"Error: {err}")
+        print_help()
+        sys.exit(1)
+
+    audio_in, output = None, None
+    models = ["openai/whisper-base", "openai/whisper-small", "openai/whisper-medium"]
+    quantize_options, compile_options, num_threads, repeats = [False], [False], 0, 1
+
+    for opt, arg in opts:
+        if opt in ("-a", "--audio"):
+            audio_in = arg
+        elif opt in ("-m", "--models"):
+            models = [model.strip() for model in arg.split(",") if model.strip()]
+        elif opt in ("-q", "--quantize"):
+            quantize_options = [False, True]
+        elif opt in ("-t", "--threads"):
+            num_threads = int(arg)
+        elif opt in ("-c", "--compile"):
+            compile_options = [False, True]
+        elif opt in ("-r", "--repeats"):
+            repeats = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-h", "--help"):
+            print_help()
+            sys.exit(0)
+
+    if not audio_in:
+        print("Error: Audio file not provided.")
+        print_help()
+        sys.exit(1)
+
+    configurations = [{"model_id": model, "quantize": quantize, "num_threads": num_threads, "compile_model": compile_model}
+                      for model in models for quantize in quantize_options for compile_model in compile_options]
+    reports = benchmark_configurations(configurations, audio_in, repeats)
+    print_report(reports)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
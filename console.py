@@ -4,7 +4,6 @@
 from core import *
 import getopt
 from typing import TypedDict
-from langgraph.graph import StateGraph, END
 
 ###----------------------------------------------
 ### - User Dialogue Graph
@@ -21,13 +20,18 @@ def input_prompt(state: input_dataType) -> input_dataType:
     }
 
 def prompt_handler(state: input_dataType):
-    processflow_graph = create_processflow_graph()
-    response = processflow_graph.invoke({"input": state["input"]})
+    from core import stream_processflow_graph, processflow_graph_invoke
     print("\nAI Response")
-    print(response["output"])
+    if streaming_enabled:
+        for token in stream_processflow_graph(state["input"]):
+            print(token, end="", flush=True)
+    else:
+        response = processflow_graph_invoke(state["input"])
+        print(response["output"])
     return state
 
 def create_dialogue_graph():
+    from langgraph.graph import StateGraph, END
     workflow = StateGraph(input_dataType)
 
     workflow.add_node("input_prompt", input_prompt)
@@ -56,11 +60,24 @@ def print_help():
 
     Options:
     -i, --ingest <directory>    Ingest audio data from the specified directory.
+    -b, --bulk                  Use the Elasticsearch bulk API when ingesting (with --ingest).
+    -p, --pipeline              Overlap decode, transcribe and index stages when ingesting (with --ingest).
+    -w, --workers <count>       Transcribe in a pool of <count> worker processes (with --ingest).
+    -f, --full                  Re-ingest every file, not only new or modified ones (with --ingest).
+    -d, --prune                 Remove documents of deleted audio files from the index (with --ingest).
+    -l, --longform              Transcribe in overlapping windows, one document per segment (with --ingest).
+    -n, --batch-size <size>     Transcribe length-sorted batches of <size> files (with --ingest).
+    -r, --rebuild-index         Load every file into a new versioned index, then swap the index alias to it (with --ingest).
     -g, --invoke                Invoke the dialogue graph.
+    -q, --questions <file>      Answer every question in a JSONL file ({"question": ...} per line) concurrently.
+    -o, --output <file>         JSONL file to write answers to (with --questions, default: answers.jsonl).
+    -c, --concurrency <count>   Maximum questions in flight (with --questions, default: MAX_CONCURRENCY in config.ini).
+    -t, --train-router          Train the local fast-path router from the logged LLM router decisions.
+    -x, --build-local-index     Rebuild the embedded retrieval index (BACKEND=local) from the Elasticsearch index.
     -h, --help                  Show this help message and exit.
 
     Notes:
-    - You cannot use both --ingest and --invoke options together.
+    - You cannot combine --ingest, --invoke, --questions, --train-router and --build-local-index.
     - If using the --ingest option, the directory path is required.
     """
     print(help_text)
@@ -71,7 +88,8 @@ def main(argv):
         sys.exit(1)
         
     try:
-        opts, args = getopt.getopt(argv, "i:g", ["ingest=", "invoke"])
+        opts, args = getopt.getopt(argv, "i:gbpw:fdln:rq:o:c:tx", ["ingest=", "invoke", "bulk", "pipeline", "workers=", "full", "prune", "longform", "batch-size=", "rebuild-index",
+                                                       "questions=", "output=", "concurrency=", "train-router", "build-local-index"])
     except getopt.GetoptError as err:
         print(f"Error: {err}")
         print_help()
@@ -79,29 +97,104 @@ def main(argv):
 
     ingest_option = None
     invoke_option = False
+    bulk_option = None
+    pipeline_option = None
+    workers_option = None
+    incremental_option = None
+    prune_option = None
+    longform_option = None
+    batch_size_option = None
+    bulk_load_option = None
+    questions_option = None
+    output_option = "answers.jsonl"
+    concurrency_option = None
+    train_router_option = False
+    build_local_index_option = False
 
     for opt, arg in opts:
         if opt in ("-i", "--ingest"):
             ingest_option = arg  # Store the directory path
         elif opt in ("-g", "--invoke"):
             invoke_option = True
+        elif opt in ("-b", "--bulk"):
+            bulk_option = True
+        elif opt in ("-p", "--pipeline"):
+            pipeline_option = True
+        elif opt in ("-w", "--workers"):
+            if not arg.isdigit():
+                print(f"Error: Invalid worker count '{arg}'.")
+                sys.exit(1)
+            workers_option = int(arg)
+        elif opt in ("-f", "--full"):
+            incremental_option = False
+        elif opt in ("-d", "--prune"):
+            prune_option = True
+        elif opt in ("-l", "--longform"):
+            longform_option = True
+        elif opt in ("-n", "--batch-size"):
+            if not arg.isdigit() or int(arg) < 1:
+                print(f"Error: Invalid batch size '{arg}'.")
+                sys.exit(1)
+            batch_size_option = int(arg)
+        elif opt in ("-r", "--rebuild-index"):
+            bulk_load_option = True
+        elif opt in ("-q", "--questions"):
+            questions_option = arg
+        elif opt in ("-o", "--output"):
+            output_option = arg
+        elif opt in ("-c", "--concurrency"):
+            if not arg.isdigit() or int(arg) < 1:
+                print(f"Error: Invalid concurrency '{arg}'.")
+                sys.exit(1)
+            concurrency_option = int(arg)
+        elif opt in ("-t", "--train-router"):
+            train_router_option = True
+        elif opt in ("-x", "--build-local-index"):
+            build_local_index_option = True
 
-    if ingest_option and invoke_option:
-        print("Error: Cannot ingest data and invoke graph at the same time.")
+    if sum(bool(option) for option in (ingest_option, invoke_option, questions_option, train_router_option, build_local_index_option)) > 1:
+        print("Error: Cannot ingest data, invoke graph, answer a question file, train the router or build the local index at the same time.")
         sys.exit(1)
 
-    if ingest_option:
+    if train_router_option:
+        if not os.path.isfile(local_router_decision_log):
+            print(f"Error: No router decisions logged yet at {local_router_decision_log}.")
+            sys.exit(1)
+        from core import train_local_router
+        train_local_router()
+    elif build_local_index_option:
+        from core import build_local_index
+        build_local_index()
+    elif ingest_option:
         if not ingest_option:  # Path must be provided with the ingest option
             print("Error: Input path not provided for ingest.")
             sys.exit(1)
         else:
             dataSourceDir = ingest_option
-            ingestAudio(dataSourceDir)
+            summary = ingestAudio(dataSourceDir, bulk_mode=bulk_option, pipeline_mode=pipeline_option,
+                                  process_workers=workers_option, incremental=incremental_option,
+                                  prune=prune_option, longform_mode=longform_option,
+                                  batch_size=batch_size_option, bulk_load=bulk_load_option)
+            if summary["failed"] > 0:
+                print(f"Failed documents: {summary['errors']}")
+    elif questions_option:
+        if not os.path.isfile(questions_option):
+            print(f"Error: Question file {questions_option} not found.")
+            sys.exit(1)
+        from core import processflow_graph_batch_file, answer_cache_stats, retrieval_cache_stats, context_builder_stats
+        processflow_graph_batch_file(questions_option, output_option, max_concurrency=concurrency_option)
+        print(f"Answers written to {output_option}")
+        if answer_cache_enabled: print(f"Answer cache: {answer_cache_stats()}")
+        if retrieval_cache_enabled: print(f"Retrieval cache: {retrieval_cache_stats()}")
+        if context_builder_enabled: print(f"Context builder: {context_builder_stats()}")
+        if retrieval_backend == "local":
+            from core import local_index_stats
+            print(f"Local index: {local_index_stats()}")
     elif invoke_option:
         dialogue_graph = create_dialogue_graph()
         dialogue_graph.invoke({"input": "", "isUserEngaged": True})
     else:
-        print("Error: No valid option selected. Use -i for ingest or -g for invoke.")
+        print("Error: No valid option selected. Use -i for ingest, -g for invoke or -q for a question file.")
         sys.exit(1)
 
 if __name__ == "__main__":
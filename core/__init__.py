@@ -1,3 +1,64 @@
+import importlib
 from .promptTemplates import *
-from .agentTemplates import *
 from .utility import *
+
+###------------------------------------------------------------------------------
+###   Lazy Module Loading
+###------------------------------------------------------------------------------
+### Only configuration and the shared helpers load with the package. The agent
+### stack (langchain, langgraph, LLM client) and the ingestion extras load the
+### first time one of their names is used, e.g. core.processflow_graph_invoke or
+### `from core import processflow_graph_invoke`. `from core import *` therefore
+### only brings in the eager names; import the rest by name.
+### _LAZY_EXPORTS repeats each lazy module's __all__ (keep them in step), so a
+### name leads straight to its one module : tracing_stats does not pull in the
+### agent stack, and an unknown name imports nothing.
+_LAZY_EXPORTS = {
+    "agentTemplates": ("create_llm", "create_prompt_templates", "get_llm", "get_prompt_template", "agent_dataType",
+                       "create_processflow_graph", "processflow_graph_invoke", "debug_prompt",
+                       "retrieve_per_subject", "aretrieve_per_subject", "retrieve_documents", "aretrieve_documents",
+                       "create_rag_chain", "create_agent_chains", "get_agent_chain", "router_output",
+                       "local_router_output", "rag_input", "retrieval_attributes", "generation_attributes",
+                       "rag_output", "cached_rag_agent", "acached_rag_agent", "routerAgent", "ragAnalyzerAgent",
+                       "ragComparerAgent", "arouterAgent", "aragAnalyzerAgent", "aragComparerAgent"),
+    "batchInference": ("aprocessflow_graph_batch", "processflow_graph_batch", "processflow_graph_batch_file"),
+    "responseStreaming": ("streaming_stats", "stream_processflow_graph"),
+    "elasticConnection": ("create_pooled_es_client", "get_async_es_client", "close_async_es_client",
+                          "es_connection_stats"),
+    "ingestionManifest": ("file_content_hash", "manifest_path", "load_manifest", "save_manifest", "generation_path",
+                          "index_generation", "bump_index_generation", "plan_incremental_ingestion",
+                          "delete_documents_by_hash", "delete_legacy_documents", "clear_reprocessed_documents",
+                          "update_manifest"),
+    "transcriptCache": ("transcript_cache_key", "get_cached_transcript", "put_cached_transcript",
+                        "evict_transcripts", "split_cached_feeds"),
+    "ingestionPipeline": ("decode_audio", "run_ingestion_pipeline", "run_process_pool_ingestion",
+                          "generate_batched_actions"),
+    "longformTranscription": ("stream_audio_windows", "transcribe_segments", "generate_segment_actions"),
+    "tracing": ("tracing_stats", "flush_spans", "trace", "span", "record_span", "in_current_trace", "question_attributes",
+                "token_usage", "load_spans", "summarize_traces", "stage_breakdown", "slowest_traces", "trace_spans"),
+    "localIndex": ("local_index_stats", "local_index_exists", "build_index", "save_index", "scan_elastic_documents",
+                   "build_local_index", "load_local_index", "local_search", "local_retriever"),
+    "ingestionJobs": ("start_ingestion_job", "resume_ingestion_job", "cancel_ingestion_job", "get_ingestion_job",
+                      "active_ingestion_job", "list_ingestion_jobs", "wait_for_ingestion_job"),
+    "indexLifecycle": ("versioned_index_name", "alias_indices", "serving_settings", "begin_bulk_load",
+                       "finish_bulk_load", "swap_alias", "abort_bulk_load"),
+    "answerCache": ("answer_cache_stats", "normalize_router_decision", "document_fingerprint", "answer_cache_key",
+                    "clear_answer_cache", "get_cached_answer", "put_cached_answer"),
+    "retrievalCache": ("retrieval_cache_stats", "retrieval_cache_key", "clear_retrieval_cache", "cached_retriever",
+                       "cached_multi_search", "acached_multi_search"),
+    "contextBuilder": ("count_tokens", "context_builder_stats", "build_context", "context_formatter"),
+    "localRouter": ("local_router_stats", "route_by_rules", "log_router_decision", "train_local_router",
+                    "classify_task", "route_locally"),
+    "speculativeRetrieval": ("speculative_retrieval_stats", "subject_match_score", "start_speculative_retrieval",
+                             "astart_speculative_retrieval", "use_speculative_documents",
+                             "ause_speculative_documents"),
+}
+_LAZY_NAMES = {name: module_name for module_name, names in _LAZY_EXPORTS.items() for name in names}
+
+def __getattr__(name):
+    module_name = _LAZY_NAMES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
@@ -1,13 +1,45 @@
-import os
-from langchain_openai import AzureChatOpenAI
-from langchain.prompts import PromptTemplate
+import os, time
+from langchain_core.prompts import PromptTemplate
 from .utility import *
 from .promptTemplates import *
+from .speculativeRetrieval import *
+from .localRouter import *
+from .answerCache import *
+from .contextBuilder import *
+from .retrievalCache import *
+from .tracing import trace, span, token_usage, question_attributes
 from langchain_core.runnables import RunnableLambda
+from operator import itemgetter
 from typing import TypedDict
 from langgraph.graph import StateGraph, END
 
-llm = AzureChatOpenAI(azure_deployment=azure_openai_model_id, api_version=azure_openai_api_version,temperature=azure_openai_temperature)
+__all__ = ["create_llm", "create_prompt_templates", "get_llm", "get_prompt_template", "agent_dataType",
+           "create_processflow_graph", "processflow_graph_invoke", "debug_prompt", "retrieve_per_subject",
+           "aretrieve_per_subject", "retrieve_documents", "aretrieve_documents", "create_rag_chain",
+           "create_agent_chains", "get_agent_chain", "router_output", "local_router_output", "rag_input",
+           "retrieval_attributes", "generation_attributes", "rag_output", "cached_rag_agent", "acached_rag_agent",
+           "routerAgent", "ragAnalyzerAgent", "ragComparerAgent", "arouterAgent", "aragAnalyzerAgent",
+           "aragComparerAgent"]
+
+###----------------------------------------------
+### - Shared Resources
+###----------------------------------------------
+def create_llm():
+    from langchain_openai import AzureChatOpenAI
+    ### the client retries 429 / 5xx itself, honouring retry-after
+    return AzureChatOpenAI(azure_deployment=azure_openai_model_id, api_version=azure_openai_api_version,temperature=azure_openai_temperature,
+                           max_retries=azure_openai_max_retries)
+
+def create_prompt_templates():
+    return {"router":   PromptTemplate.from_template(routerPrompt()),
+            "analyzer": PromptTemplate.from_template(ragAnalyzerPrompt()),
+            "comparer": PromptTemplate.from_template(ragComparerPrompt())}
+
+def get_llm():
+    return get_resource("llm")
+
+def get_prompt_template(name):
+    return get_resource("prompt_templates")[name]
 
 ###----------------------------------------------
 ### - ProcessFlow Graph
@@ -15,13 +47,15 @@ llm = AzureChatOpenAI(azure_deployment=azure_openai_model_id, api_version=azure_
 class agent_dataType(TypedDict):
     input: str
     output: str
+    documents: list
 
 def create_processflow_graph():
     workflow = StateGraph(agent_dataType)
 
-    workflow.add_node("router",      routerAgent)
-    workflow.add_node("raganalyzer", ragAnalyzerAgent)
-    workflow.add_node("ragcomparer", ragComparerAgent)
+    ### each node has a sync and an async body : invoke() runs the first, ainvoke() the second
+    workflow.add_node("router",      RunnableLambda(routerAgent, afunc=arouterAgent, name="router"))
+    workflow.add_node("raganalyzer", RunnableLambda(ragAnalyzerAgent, afunc=aragAnalyzerAgent, name="raganalyzer"))
+    workflow.add_node("ragcomparer", RunnableLambda(ragComparerAgent, afunc=aragComparerAgent, name="ragcomparer"))
 
     workflow.add_conditional_edges(
         "router",
@@ -40,46 +74,202 @@ def create_processflow_graph():
     return workflow.compile()
 
 def processflow_graph_invoke(question):
-    processflow_graph = create_processflow_graph()
-    return processflow_graph.invoke({"input": question})
+    processflow_graph = get_resource("processflow_graph")
+    with trace("question", **question_attributes(question)) as attributes:
+        response = processflow_graph.invoke({"input": question})
+        attributes["answer_chars"] = len(response.get("output") or "")
+    return response
+
+###----------------------------------------------
+### - Agent Chains
+###----------------------------------------------
+### Built once and reused; everything that varies per question (question text,
+### search query, result size) travels in the chain input instead of closures.
+def debug_prompt(prompt):
+    if debug_mode: print(f"Prompt passed to LLM: {prompt}")
+    return prompt
+
+def _subject_searches(inputs):
+    subjects = inputs["subjects"]
+    return [{"search_query": subject, "size": inputs["subject_size"] + len(subjects) - 1} for subject in subjects]
+
+def _dedupe_subject_documents(inputs, results):
+    ### a story found for one subject is not handed out again for another
+    documents, seen_audio_ids = [], set()
+    for subject, subject_documents in zip(inputs["subjects"], results):
+        kept = 0
+        for document in subject_documents:
+            audio_id = document.metadata.get("_source", {}).get("audio_id", document.metadata.get("_id"))
+            if kept == inputs["subject_size"] or audio_id in seen_audio_ids:
+                continue
+            seen_audio_ids.add(audio_id)
+            documents.append(document)
+            kept += 1
+        if debug_mode: print(f"Subject '{subject}': {kept} docs")
+    return documents
+
+def retrieve_per_subject(inputs):
+    ### each compared subject gets its own search, all in one round trip
+    return _dedupe_subject_documents(inputs, cached_multi_search(_subject_searches(inputs)))
+
+async def aretrieve_per_subject(inputs):
+    return _dedupe_subject_documents(inputs, await acached_multi_search(_subject_searches(inputs)))
+
+def retrieve_documents(inputs):
+    ### a compare searches per subject : hits for the raw question may cover only one of them
+    if len(inputs.get("subjects", ())) > 1:
+        return retrieve_per_subject(inputs)
+    ### documents prefetched by speculative retrieval skip the search
+    if inputs.get("documents") is not None:
+        return inputs["documents"][:inputs["size"]]
+    return getOrCreate_retriever().invoke(inputs)
+
+async def aretrieve_documents(inputs):
+    if len(inputs.get("subjects", ())) > 1:
+        return await aretrieve_per_subject(inputs)
+    if inputs.get("documents") is not None:
+        return inputs["documents"][:inputs["size"]]
+    return await getOrCreate_retriever().ainvoke(inputs)
+
+def create_rag_chain(prompt_name):
+    return (
+        {"context": RunnableLambda(retrieve_documents, afunc=aretrieve_documents) | context_formatter(prompt_name),
+         "question": itemgetter("question")}
+        | get_prompt_template(prompt_name)
+        | RunnableLambda(debug_prompt)
+        | get_llm()
+        )
+
+def create_agent_chains():
+    return {"router":   get_prompt_template("router") | get_llm(),
+            "analyzer": create_rag_chain("analyzer"),
+            "comparer": create_rag_chain("comparer")}
+
+def get_agent_chain(name):
+    return get_resource("agent_chains")[name]
+
+register_resource("llm", create_llm)
+register_resource("prompt_templates", create_prompt_templates)
+register_resource("agent_chains", create_agent_chains, depends_on=("llm", "prompt_templates", "retriever"))
+register_resource("processflow_graph", create_processflow_graph)
 
 ###----------------------------------------------
 ### - Agent Template
 ###----------------------------------------------
-def routerAgent(state):
-    prompt = PromptTemplate.from_template(routerPrompt())
-    chain = prompt | llm
-    response = chain.invoke({"input": state["input"]})
+def router_output(state, response):
     output = response.content.strip().lower()
     print(f"Router decision: {output}")
+    log_router_decision(state["input"], output)
     return {"input": state["input"], "output": output}
 
-def ragAnalyzerAgent(state):
-    prompt = PromptTemplate.from_template(ragAnalyzerPrompt())
-    chain = (
-        {"context": getOrCreate_retriever() | format_docs,
-        "question": RunnableLambda(lambda x: state["input"])}
-        | prompt
-        | RunnableLambda(lambda x: (print(f"Prompt passed to LLM: {x}") if debug_mode else None) or x)
-        | llm  
-        )
-    if debug_mode: print(f'Rag input: {state["output"].split(",")[1].strip()}')
-    response = chain.invoke({"search_query" : state["output"].split(",")[1].strip(), "size" : 1})
-    if debug_mode: print(f"ragAnalyzerAgent Output: {response}")
+def local_router_output(state):
+    ### confident local decisions skip the LLM router (and speculative retrieval with it)
+    if not local_router_enabled:
+        return None
+    with span("router", local=True) as attributes:
+        output = route_locally(state["input"])
+        attributes["decision"] = output
+    if output is None:
+        return None
+    print(f"Router decision (local): {output}")
+    return {"input": state["input"], "output": output}
+
+def rag_input(state, size):
+    task, search_query = [field.strip() for field in state["output"].split(",")[:2]]
+    if debug_mode: print(f'Rag input: {search_query}')
+    inputs = {"question": state["input"], "search_query": search_query, "size": size,
+              "documents": state.get("documents")}
+    if task == "compare":
+        subjects = split_compare_subjects(search_query)
+        if len(subjects) > 1:
+            inputs.update({"search_query": " ".join(subjects), "subjects": subjects, "documents": None,
+                           "subject_size": comparer_size_per_subject, "size": comparer_size_per_subject * len(subjects)})
+    return inputs
+
+def retrieval_attributes(documents):
+    return {"documents": len(documents), "chars": sum(len(document.page_content) for document in documents)}
+
+def generation_attributes(response):
+    content = getattr(response, "content", response)
+    ### streamed responses carry no usage : count the answer locally
+    return {"chars": len(content), **(token_usage(response) or {"output_tokens": count_tokens(content)})}
+
+def rag_output(agent_name, response):
+    if debug_mode: print(f"{agent_name} Output: {response}")
     output_content = response.content if hasattr(response, 'content') else response
     return {"output": output_content}
 
+def cached_rag_agent(agent_name, chain_name, state, size):
+    ### retrieval runs first so the cache key can include the documents the answer is built on
+    inputs = rag_input(state, size)
+    with span("retrieval", agent=chain_name, prefetched=inputs["documents"] is not None) as attributes:
+        inputs["documents"] = retrieve_documents(inputs)
+        attributes.update(retrieval_attributes(inputs["documents"]))
+    key = answer_cache_key(chain_name, state["output"], inputs["documents"])
+    answer = get_cached_answer(key)
+    if answer is not None:
+        return rag_output(agent_name, answer)
+    start_time = time.time()
+    with span("generation", agent=chain_name) as attributes:
+        response = get_agent_chain(chain_name).invoke(inputs)
+        attributes.update(generation_attributes(response))
+    put_cached_answer(key, getattr(response, "content", response), time.time() - start_time)
+    return rag_output(agent_name, response)
+
+async def acached_rag_agent(agent_name, chain_name, state, size):
+    inputs = rag_input(state, size)
+    with span("retrieval", agent=chain_name, prefetched=inputs["documents"] is not None) as attributes:
+        inputs["documents"] = await aretrieve_documents(inputs)
+        attributes.update(retrieval_attributes(inputs["documents"]))
+    key = answer_cache_key(chain_name, state["output"], inputs["documents"])
+    answer = get_cached_answer(key)
+    if answer is not None:
+        return rag_output(agent_name, answer)
+    start_time = time.time()
+    with span("generation", agent=chain_name) as attributes:
+        response = await get_agent_chain(chain_name).ainvoke(inputs)
+        attributes.update(generation_attributes(response))
+    put_cached_answer(key, getattr(response, "content", response), time.time() - start_time)
+    return rag_output(agent_name, response)
+
+def routerAgent(state):
+    local_result = local_router_output(state)
+    if local_result is not None:
+        return local_result
+    speculation = start_speculative_retrieval(state["input"]) if speculative_retrieval_enabled else None
+    with span("router") as attributes:
+        response = get_agent_chain("router").invoke({"input": state["input"]})
+        attributes.update({"decision": response.content.strip().lower(), **token_usage(response)})
+    result = router_output(state, response)
+    if speculation is not None:
+        result["documents"] = use_speculative_documents(state["input"], result["output"], speculation)
+    return result
+
+def ragAnalyzerAgent(state):
+    return cached_rag_agent("ragAnalyzerAgent", "analyzer", state, 1)
+
 def ragComparerAgent(state):
-    prompt = PromptTemplate.from_template(ragComparerPrompt())
-    chain = (
-        {"context": getOrCreate_retriever() | format_docs,
-         "question": RunnableLambda(lambda x: state["input"])}
-        | prompt
-        | RunnableLambda(lambda x: (print(f"Prompt passed to LLM: {x}") if debug_mode else None) or x)
-        | llm  
-        )
-    if debug_mode: print(f'Rag input: {state["output"].split(",")[1].strip()}')
-    response = chain.invoke({"search_query" : state["output"].split(",")[1].strip(), "size" : 2})
-    if debug_mode: print(f"ragComparerAgent Output: {response}")
-    output_content = response.content if hasattr(response, 'content') else response
-    return {"output": output_content}
\ No newline at end of file
+    return cached_rag_agent("ragComparerAgent", "comparer", state, 2)
+
+async def arouterAgent(state):
+    local_result = local_router_output(state)
+    if local_result is not None:
+        return local_result
+    speculation = astart_speculative_retrieval(state["input"]) if speculative_retrieval_enabled else None
+    try:
+        with span("router") as attributes:
+            response = await get_agent_chain("router").ainvoke({"input": state["input"]})
+            attributes.update({"decision": response.content.strip().lower(), **token_usage(response)})
+    except BaseException:
+        if speculation is not None: speculation.cancel()
+        raise
+    result = router_output(state, response)
+    if speculation is not None:
+        result["documents"] = await ause_speculative_documents(state["input"], result["output"], speculation)
+    return result
+
+async def aragAnalyzerAgent(state):
+    return await acached_rag_agent("ragAnalyzerAgent", "analyzer", state, 1)
+
+async def aragComparerAgent(state):
+    return await acached_rag_agent("ragComparerAgent", "comparer", state, 2)
@@ -0,0 +1,157 @@
+import os, re, json, time, sqlite3, hashlib, threading
+from collections import OrderedDict
+from .utility import *
+from .ingestionManifest import index_generation
+
+__all__ = ["answer_cache_stats", "normalize_router_decision", "document_fingerprint", "answer_cache_key",
+           "clear_answer_cache", "get_cached_answer", "put_cached_answer"]
+
+###------------------------------------------------------------------------------
+###   Semantic Answer Cache
+###------------------------------------------------------------------------------
+### Differently worded questions that the router maps to the same decision
+### (task, subject, key element) and that retrieve the same documents get the
+### same answer, so only the first one pays for LLM generation. Entries are
+### evicted least recently used / after TTL_SECONDS, and the whole cache is
+### dropped when ingestion bumps the index generation.
+_answer_lock = threading.Lock()
+_answer_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0, "seconds_saved": 0.0}
+_memory_entries = OrderedDict()
+_sqlite_connection = None
+_cache_generation = None
+
+def answer_cache_stats():
+    with _answer_lock:
+        stats = dict(_answer_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    stats["seconds_saved"] = round(stats["seconds_saved"], 3)
+    stats["backend"] = answer_cache_backend
+    return stats
+
+def _normalize_field(field):
+    field = re.sub(r"[^a-z0-9 ]+", " ", field.lower())
+    return re.sub(r"\s+", " ", re.sub(r"^\s*the\s+", "", field)).strip()
+
+def normalize_router_decision(decision):
+    fields = decision.lower().split(",")
+    task = _normalize_field(fields[0]) if fields else ""
+    subject = fields[1] if len(fields) > 1 else ""
+    element = re.sub(r"(?<!s)s$", "", _normalize_field(fields[2])) if len(fields) > 2 else "overall"
+    ### "a | b" and "b vs a" ask for the same comparison
+    subject = " | ".join(sorted(_normalize_field(part) for part in split_compare_subjects(subject))) \
+              if task == "compare" else _normalize_field(subject)
+    return task, subject, element
+
+def document_fingerprint(documents):
+    ids = sorted(str(document.metadata.get("_id", document.page_content)) for document in documents)
+    return hashlib.sha256("\n".join(ids).encode()).hexdigest()
+
+def answer_cache_key(agent_name, decision, documents):
+    key = {"agent": agent_name, "decision": normalize_router_decision(decision),
+           "documents": document_fingerprint(documents)}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+###----------------------------------------------
+### - Backends
+###----------------------------------------------
+def _sqlite():
+    global _sqlite_connection
+    if _sqlite_connection is None:
+        os.makedirs(os.path.dirname(answer_cache_sqlite_path) or ".", exist_ok=True)
+        _sqlite_connection = sqlite3.connect(answer_cache_sqlite_path, check_same_thread=False)
+        _sqlite_connection.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, "
+                                   "generation INTEGER, created_at REAL, last_used REAL, generation_seconds REAL)")
+    return _sqlite_connection
+
+def _lookup(key, now):
+    if answer_cache_backend == "sqlite":
+        connection = _sqlite()
+        row = connection.execute("SELECT answer, generation, created_at, generation_seconds FROM answers WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] != _cache_generation or now - row[2] > answer_cache_ttl:
+            connection.execute("DELETE FROM answers WHERE key = ?", (key,))
+            connection.commit()
+            return None
+        connection.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+        connection.commit()
+        return {"answer": row[0], "generation_seconds": row[3]}
+
+    entry = _memory_entries.get(key)
+    if entry is None:
+        return None
+    if now - entry["created_at"] > answer_cache_ttl:
+        del _memory_entries[key]
+        return None
+    _memory_entries.move_to_end(key)
+    return entry
+
+def _store(key, answer, generation_seconds, now):
+    if answer_cache_backend == "sqlite":
+        connection = _sqlite()
+        connection.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                           (key, answer, _cache_generation, now, now, generation_seconds))
+        overflow = connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - answer_cache_max_entries
+        if overflow > 0:
+            connection.execute("DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_used LIMIT ?)", (overflow,))
+        connection.commit()
+        return max(overflow, 0)
+
+    _memory_entries[key] = {"answer": answer, "created_at": now, "generation_seconds": generation_seconds}
+    _memory_entries.move_to_end(key)
+    evicted = 0
+    while len(_memory_entries) > answer_cache_max_entries:
+        _memory_entries.popitem(last=False)
+        evicted += 1
+    return evicted
+
+def _check_generation():
+    ### called with _answer_lock held
+    global _cache_generation
+    generation = index_generation()
+    if generation == _cache_generation:
+        return
+    if _cache_generation is not None:
+        _answer_stats["invalidations"] += 1
+        print(f"Index generation {_cache_generation} -> {generation}, answer cache cleared")
+    _memory_entries.clear()
+    if answer_cache_backend == "sqlite":
+        _sqlite().execute("DELETE FROM answers WHERE generation != ?", (generation,))
+        _sqlite().commit()
+    _cache_generation = generation
+
+def clear_answer_cache():
+    global _cache_generation
+    with _answer_lock:
+        _memory_entries.clear()
+        if answer_cache_backend == "sqlite":
+            _sqlite().execute("DELETE FROM answers")
+            _sqlite().commit()
+        _cache_generation = None
+
+###----------------------------------------------
+### - Lookup / Store
+###----------------------------------------------
+def get_cached_answer(key):
+    if not answer_cache_enabled:
+        return None
+    with _answer_lock:
+        _check_generation()
+        entry = _lookup(key, time.time())
+        if entry is None:
+            _answer_stats["misses"] += 1
+            return None
+        _answer_stats["hits"] += 1
+        _answer_stats["seconds_saved"] += entry["generation_seconds"]
+    if debug_mode: print(f"Answer served from cache, key: {key}")
+    return entry["answer"]
+
+def put_cached_answer(key, answer, generation_seconds):
+    if not answer_cache_enabled or not answer:
+        return
+    with _answer_lock:
+        _check_generation()
+        evicted = _store(key, answer, generation_seconds, time.time())
+        _answer_stats["stores"] += 1
+        _answer_stats["evictions"] += evicted
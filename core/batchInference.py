@@ -0,0 +1,66 @@
+import time, json, asyncio
+from .utility import *
+from .agentTemplates import *
+from .elasticConnection import close_async_es_client
+from .tracing import trace, question_attributes
+
+__all__ = ["aprocessflow_graph_batch", "processflow_graph_batch", "processflow_graph_batch_file"]
+
+###------------------------------------------------------------------------------
+###   Concurrent Batch Queries for the ProcessFlow Graph
+###------------------------------------------------------------------------------
+### Questions run through the graph's async path (ainvoke) with at most
+### max_concurrency in flight. Rate-limit (429) and transient errors are retried
+### by the clients themselves (MAX_RETRIES in [AZURE_OPENAI] and [ELASTIC]), not
+### again per question, so one question never multiplies the two retry budgets.
+### processflow_graph_batch runs on the process-wide event loop, so the async
+### LLM and ES clients stay warm from one batch (or streamed answer) to the next.
+async def aprocessflow_graph_batch(questions, max_concurrency=None):
+    processflow_graph = get_resource("processflow_graph")
+    semaphore = asyncio.Semaphore(max_concurrency or batch_max_concurrency)
+
+    async def run_question(index, question):
+        async with semaphore:
+            start_time = time.time()
+            result = {"index": index, "question": question, "output": None, "error": None}
+            try:
+                with trace("question", **question_attributes(question), batch=True) as attributes:
+                    response = await processflow_graph.ainvoke({"input": question})
+                    result["output"] = response.get("output")
+                    attributes["answer_chars"] = len(result["output"] or "")
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["elapsed_seconds"] = round(time.time() - start_time, 3)
+            return result
+
+    ### gather keeps input order regardless of completion order
+    try:
+        return await asyncio.gather(*(run_question(index, question) for index, question in enumerate(questions)))
+    finally:
+        ### a caller's own loop goes away after the batch, its ES client with it
+        if asyncio.get_running_loop() is not shared_event_loop():
+            await close_async_es_client()
+
+def processflow_graph_batch(questions, max_concurrency=None):
+    start_time = time.time()
+    results = run_on_shared_loop(aprocessflow_graph_batch(questions, max_concurrency))
+    elapsed = time.time() - start_time
+    print(f"Answered {sum(1 for r in results if r['error'] is None)}/{len(results)} questions, "
+          f"ElaspedTime: {round(elapsed, 2)} seconds, Throughput: {round(len(results) / elapsed, 2) if elapsed > 0 else 0} questions/sec")
+    return results
+
+def processflow_graph_batch_file(questions_path, answers_path, max_concurrency=None):
+    records = []
+    with open(questions_path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records.append(record if isinstance(record, dict) else {"question": record})
+
+    questions = [record.get("question", record.get("input", "")) for record in records]
+    results = processflow_graph_batch(questions, max_concurrency)
+
+    with open(answers_path, "w") as f:
+        for record, result in zip(records, results):
+            f.write(json.dumps({**record, **result}) + "\n")
+    return results
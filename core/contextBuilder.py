@@ -0,0 +1,125 @@
+import re, threading
+from .utility import *
+from .tracing import span
+
+__all__ = ["count_tokens", "context_builder_stats", "build_context", "context_formatter"]
+
+###------------------------------------------------------------------------------
+###   Token-budgeted Context Builder
+###------------------------------------------------------------------------------
+### Instead of joining every retrieved transcript in full, the prompt context is
+### packed from the ELSER chunks that matched the query (inner_hits), best first
+### and interleaved across documents, then each document's opening chunk (its
+### title) and the neighbours of the matched chunks, until the agent's token
+### budget is spent. Chunks are emitted in transcript order per document.
+_context_lock = threading.Lock()
+_context_stats = {"requests": 0, "full_tokens": 0, "context_tokens": 0}
+_token_encoder = None
+
+def _encoder():
+    global _token_encoder
+    if _token_encoder is None:
+        try:
+            import tiktoken
+            try:
+                _token_encoder = tiktoken.encoding_for_model(azure_openai_model_id)
+            except KeyError:
+                _token_encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            ### tiktoken missing or its vocabulary cannot be downloaded : estimate from words
+            _token_encoder = False
+    return _token_encoder
+
+def count_tokens(text):
+    encoder = _encoder()
+    if encoder:
+        return len(encoder.encode(text, disallowed_special=()))
+    return int(len(re.findall(r"\S+", text)) * 1.3) + 1
+
+def context_builder_stats():
+    with _context_lock:
+        stats = dict(_context_stats)
+    stats["tokens_saved"] = stats["full_tokens"] - stats["context_tokens"]
+    stats["saved_rate"] = round(stats["tokens_saved"] / stats["full_tokens"], 3) if stats["full_tokens"] else 0.0
+    return stats
+
+def _document_chunks(document):
+    ### semantic_text keeps its chunks in _source (embeddings are excluded by the query)
+    source = document.metadata.get("_source", {})
+    chunks = source.get("semantic_data", {}).get("inference", {}).get("chunks", []) if isinstance(source.get("semantic_data"), dict) else []
+    return [chunk.get("text", "") for chunk in chunks]
+
+def _matched_chunks(document, chunks):
+    inner_hits = document.metadata.get("inner_hits", {}).get("semantic_data", {}).get("hits", {}).get("hits", [])
+    matched = []
+    for hit in inner_hits:
+        offset = hit.get("_nested", {}).get("offset")
+        text = hit.get("_source", {}).get("text")
+        if text is None and offset is not None and offset < len(chunks):
+            text = chunks[offset]
+        matched.append((offset, text or ""))
+    return matched
+
+def _truncate(text, max_tokens):
+    encoder = _encoder()
+    if encoder:
+        return encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    return " ".join(re.findall(r"\S+", text)[:int(max_tokens / 1.3)])
+
+def _candidates(documents):
+    ### (document rank, offset, text) in the order they should claim the budget
+    matched, openings, neighbours = [], [], []
+    for rank, document in enumerate(documents):
+        chunks = _document_chunks(document)
+        hits = _matched_chunks(document, chunks)
+        for position, (offset, text) in enumerate(hits):
+            matched.append((position, rank, offset, text))
+            for neighbour in (offset - 1, offset + 1) if offset is not None else ():
+                if 0 <= neighbour < len(chunks):
+                    neighbours.append((position, rank, neighbour, chunks[neighbour]))
+        if chunks:
+            openings.append((0, rank, 0, chunks[0]))
+        elif not hits:
+            ### nothing to pick from : the whole transcript competes for the budget
+            openings.append((0, rank, None, document.page_content))
+    return [candidate[1:] for candidate in sorted(matched) + openings + sorted(neighbours)]
+
+def build_context(documents, token_budget):
+    with span("context", documents=len(documents), token_budget=token_budget) as attributes:
+        context, used_tokens, full_tokens = _build_context(documents, token_budget)
+        attributes.update({"tokens": used_tokens, "full_tokens": full_tokens, "chars": len(context)})
+    with _context_lock:
+        _context_stats["requests"] += 1
+        _context_stats["full_tokens"] += full_tokens
+        _context_stats["context_tokens"] += used_tokens
+    print(f"Context: {used_tokens}/{token_budget} tokens from {len(documents)} docs, {max(full_tokens - used_tokens, 0)} tokens saved")
+    return context
+
+def _build_context(documents, token_budget):
+    full_tokens = sum(count_tokens(document.page_content) for document in documents)
+    selected, seen_offsets, seen_texts, used_tokens = {}, set(), set(), 0
+
+    for rank, offset, text in _candidates(documents):
+        text = text.strip()
+        if not text or (rank, offset) in seen_offsets or text in seen_texts:
+            continue
+        tokens = count_tokens(text)
+        if offset is None and tokens > token_budget // len(documents):
+            ### a transcript without chunks is cut to its share of the budget rather than dropped
+            text = _truncate(text, min(token_budget // len(documents), token_budget - used_tokens))
+            tokens = count_tokens(text)
+        if not text or used_tokens + tokens > token_budget:
+            continue
+        seen_offsets.add((rank, offset))
+        seen_texts.add(text)
+        selected.setdefault(rank, []).append((offset if offset is not None else 0, text))
+        used_tokens += tokens
+
+    context = "\n\n".join(" ... ".join(text for _, text in sorted(selected[rank])) for rank in sorted(selected))
+    return context, used_tokens, full_tokens
+
+def context_formatter(agent_name):
+    if not context_builder_enabled:
+        return format_docs
+    token_budget = context_token_budgets.get(agent_name, context_default_token_budget)
+    return lambda documents: build_context(documents, token_budget)
@@ -0,0 +1,121 @@
+import os, time, asyncio, threading, weakref
+from collections import deque
+from .utility import *
+from .tracing import span
+
+__all__ = ["create_pooled_es_client", "get_async_es_client", "close_async_es_client", "es_connection_stats"]
+
+###------------------------------------------------------------------------------
+###   Elasticsearch Connection Manager
+###------------------------------------------------------------------------------
+### Clients are built with explicit pool size, request timeout and retries on
+### transient errors (429/502/503/504, timeouts). Liveness is checked by the
+### resource registry's background thread, not per call, and nodes are sniffed
+### at most every SNIFF_INTERVAL seconds when sniffing is on. Every request is
+### timed so pool usage and latency can be inspected with es_connection_stats(),
+### and traced as an "elasticsearch" span when it belongs to a traced request.
+_RETRY_ON_STATUS = (429, 502, 503, 504)
+_es_stats_lock = threading.Lock()
+_es_stats = {"sync": {"requests": 0, "errors": 0, "seconds": 0.0, "latencies": deque(maxlen=1000)},
+             "async": {"requests": 0, "errors": 0, "seconds": 0.0, "latencies": deque(maxlen=1000)}}
+_async_clients = weakref.WeakKeyDictionary()
+
+def _client_options():
+    options = {"api_key": os.environ.get("ELASTIC_API_KEY"),
+               "connections_per_node": elastic_pool_size,
+               "request_timeout": elastic_request_timeout,
+               "max_retries": elastic_max_retries,
+               "retry_on_timeout": True,
+               "retry_on_status": _RETRY_ON_STATUS}
+    if elastic_sniff_interval > 0:
+        ### not for Elastic Cloud : sniffed node addresses are not reachable from outside
+        options.update({"sniff_on_start": True, "sniff_before_requests": True, "sniff_on_node_failure": True,
+                        "min_delay_between_sniffing": elastic_sniff_interval})
+    return options
+
+def _record_request(kind, seconds, failed):
+    with _es_stats_lock:
+        stats = _es_stats[kind]
+        stats["requests"] += 1
+        stats["errors"] += failed
+        stats["seconds"] += seconds
+        stats["latencies"].append(seconds)
+
+def _span_attributes(method, target, body):
+    attributes = {"method": method, "target": target.split("?", 1)[0]}
+    if isinstance(body, (list, tuple)):
+        ### bulk and msearch bodies are NDJSON : a header line per document or search
+        attributes["items"] = len(body) // 2
+    return attributes
+
+def _instrument(client, kind):
+    transport = client.transport
+    perform_request = transport.perform_request
+
+    if kind == "async":
+        async def timed_request(method, target, **kwargs):
+            start_time, failed = time.perf_counter(), True
+            try:
+                with span("elasticsearch", **_span_attributes(method, target, kwargs.get("body"))) as attributes:
+                    response = await perform_request(method, target, **kwargs)
+                    attributes["status"] = response.meta.status
+                failed = False
+                return response
+            finally:
+                _record_request(kind, time.perf_counter() - start_time, failed)
+    else:
+        def timed_request(method, target, **kwargs):
+            start_time, failed = time.perf_counter(), True
+            try:
+                with span("elasticsearch", **_span_attributes(method, target, kwargs.get("body"))) as attributes:
+                    response = perform_request(method, target, **kwargs)
+                    attributes["status"] = response.meta.status
+                failed = False
+                return response
+            finally:
+                _record_request(kind, time.perf_counter() - start_time, failed)
+
+    transport.perform_request = timed_request
+    return client
+
+def create_pooled_es_client() -> "Elasticsearch":
+    from elasticsearch import Elasticsearch
+    return _instrument(Elasticsearch(os.environ.get("ELASTIC_ENDPOINT"), **_client_options()), "sync")
+
+def get_async_es_client() -> "AsyncElasticsearch":
+    from elasticsearch import AsyncElasticsearch
+    ### aiohttp sessions belong to one event loop : one async client per running loop
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _instrument(AsyncElasticsearch(os.environ.get("ELASTIC_ENDPOINT"), **_client_options()), "async")
+        _async_clients[loop] = client
+    return client
+
+async def close_async_es_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+def _percentile(values, percentile):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+def es_connection_stats():
+    stats = {"pool": {"connections_per_node": elastic_pool_size, "request_timeout": elastic_request_timeout,
+                      "max_retries": elastic_max_retries, "sniff_interval": elastic_sniff_interval,
+                      "async_clients": len(_async_clients)}}
+    client = registry_status().get("es_client", {})
+    if client.get("loaded"):
+        stats["pool"]["nodes"] = len(get_resource("es_client").transport.node_pool.all())
+    with _es_stats_lock:
+        for kind, kind_stats in _es_stats.items():
+            latencies = list(kind_stats["latencies"])
+            requests = kind_stats["requests"]
+            stats[kind] = {"requests": requests, "errors": kind_stats["errors"],
+                           "avg_ms": round(kind_stats["seconds"] / requests * 1000, 1) if requests else 0.0,
+                           "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+                           "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1)}
+    return stats
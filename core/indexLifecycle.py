@@ -0,0 +1,93 @@
+import time
+from datetime import datetime
+from .utility import *
+
+__all__ = ["versioned_index_name", "alias_indices", "serving_settings", "begin_bulk_load", "finish_bulk_load",
+           "swap_alias", "abort_bulk_load"]
+
+###------------------------------------------------------------------------------
+###   Bulk-load Index Lifecycle
+###------------------------------------------------------------------------------
+### A backfill writes into a new versioned index (<alias>-<timestamp>) created with
+### refresh disabled and no replicas, so indexing pays for neither periodic
+### refreshes nor replica writes. Once loaded, the index gets the serving settings
+### of the index it replaces back, is refreshed and force-merged, and the alias is
+### moved onto it in a single update_aliases call. Queries go through the alias,
+### so they keep hitting the previous index until the new one is complete.
+_BULK_LOAD_SETTINGS = {"number_of_replicas": 0, "refresh_interval": "-1"}
+
+def versioned_index_name(alias):
+    return f"{alias}-{datetime.now().strftime('%Y%m%d%H%M%S%f')[:-3]}"
+
+def alias_indices(alias=None):
+    ### concrete indices behind the alias; [] when the name is a plain index or missing
+    es_client=getOrCreate_es_client()
+    alias = alias or elastic_index_name
+    if not es_client.indices.exists_alias(name=alias):
+        return []
+    return sorted(es_client.indices.get_alias(name=alias).keys())
+
+def serving_settings(alias=None):
+    ### replicas and refresh interval of the live index, config.ini values for a first load
+    es_client=getOrCreate_es_client()
+    alias = alias or elastic_index_name
+    settings = {"number_of_replicas": index_lifecycle_replicas, "refresh_interval": index_lifecycle_refresh_interval}
+    if es_client.indices.exists(index=alias):
+        current = next(iter(es_client.indices.get_settings(index=alias).values()))["settings"]["index"]
+        settings.update({key: current[key] for key in settings if key in current})
+    return settings
+
+def begin_bulk_load(alias=None):
+    alias = alias or elastic_index_name
+    index_name = versioned_index_name(alias)
+    ### create_index_in_elastic() leaves an existing index as it is : never load into one
+    if getOrCreate_es_client().indices.exists(index=index_name):
+        raise ValueError(f"index {index_name} already exists")
+    create_index_in_elastic(index_name, settings=_BULK_LOAD_SETTINGS)
+    print(f"Bulk load into {index_name}, refresh disabled and no replicas until it replaces '{alias}'")
+    return index_name
+
+def finish_bulk_load(index_name, alias=None):
+    alias = alias or elastic_index_name
+    es_client=getOrCreate_es_client()
+    start_time = time.time()
+    settings = serving_settings(alias)
+    es_client.indices.put_settings(index=index_name, settings=settings)
+    es_client.indices.refresh(index=index_name)
+    if index_lifecycle_force_merge_segments > 0:
+        es_client.options(request_timeout=index_lifecycle_merge_timeout).indices.forcemerge(
+            index=index_name, max_num_segments=index_lifecycle_force_merge_segments)
+    ### replicas allocated before the swap, so the new index takes queries at full capacity;
+    ### a single-node cluster never allocates them, hence the timeout rather than a hard wait
+    health = es_client.options(ignore_status=408).cluster.health(
+        index=index_name, wait_for_status="green" if int(settings["number_of_replicas"]) > 0 else "yellow",
+        timeout=f"{index_lifecycle_health_timeout}s")
+    if health.get("timed_out"):
+        print(f"Index {index_name} is {health.get('status')} after {index_lifecycle_health_timeout} seconds, swapping anyway")
+    replaced = swap_alias(index_name, alias)
+    print(f"Alias '{alias}' now on {index_name} ({', '.join(replaced) or 'no previous index'} "
+          f"{'deleted' if index_lifecycle_delete_old_index or replaced == [alias] else 'detached'}), "
+          f"settings {settings}, ElaspedTime: {round(time.time() - start_time, 2)} seconds")
+    return replaced
+
+def swap_alias(index_name, alias=None):
+    ### one update_aliases call : readers see either the old index or the new one, never neither
+    es_client=getOrCreate_es_client()
+    alias = alias or elastic_index_name
+    actions = [{"add": {"index": index_name, "alias": alias}}]
+    current = alias_indices(alias)
+    replaced = [old_index for old_index in current if old_index != index_name]
+    if current:
+        actions += [{"remove_index": {"index": old_index}} if index_lifecycle_delete_old_index
+                    else {"remove": {"index": old_index, "alias": alias}} for old_index in replaced]
+    elif es_client.indices.exists(index=alias):
+        ### first bulk load : the name is still a concrete index, it has to go in the same call
+        replaced = [alias]
+        actions.append({"remove_index": {"index": alias}})
+    es_client.indices.update_aliases(actions=actions)
+    return replaced
+
+def abort_bulk_load(index_name):
+    ### the alias never pointed at it, dropping it leaves the live index untouched
+    getOrCreate_es_client().options(ignore_status=404).indices.delete(index=index_name)
+    print(f"Bulk load aborted, {index_name} deleted")
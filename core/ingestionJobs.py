@@ -0,0 +1,143 @@
+import os, time, uuid, threading
+from .utility import *
+
+__all__ = ["start_ingestion_job", "resume_ingestion_job", "cancel_ingestion_job", "get_ingestion_job",
+           "active_ingestion_job", "list_ingestion_jobs", "wait_for_ingestion_job"]
+
+###------------------------------------------------------------------------------
+###   Background Ingestion Jobs
+###------------------------------------------------------------------------------
+### ingestAudio runs in a worker thread of the process rather than inside the
+### Streamlit script run, so reruns and other sessions only poll its progress.
+### One job is active per index, whatever its directory : runs load and save the
+### index's single manifest, so two at once would drop each other's entries.
+### Starting another one returns the running job. A cancelled job stops at the
+### next file boundary and records in the manifest only the files that reached
+### the index, so resuming it (an incremental run over the same directory)
+### carries on with the rest. A cancelled bulk load keeps nothing, its new index
+### is dropped, so it can only be restarted (transcripts come from the cache).
+_jobs_lock = threading.Lock()
+_jobs = {}
+_JOB_FIELDS = ("job_id", "index", "source", "options", "bulk_load", "status", "resumed_from", "created_at", "started_at",
+               "finished_at", "files", "skipped", "transcribed", "indexed", "current_file", "summary", "error")
+
+
+def _is_active(job):
+    return job["status"] in ("queued", "running", "cancelling")
+
+def _active_job(index):
+    return next((job for job in _jobs.values() if _is_active(job) and job["index"] == index), None)
+
+def _snapshot(job):
+    ### plain copy for the UI, with throughput and ETA from the files transcribed so far
+    snapshot = {field: job[field] for field in _JOB_FIELDS}
+    snapshot["recent_files"] = list(job["file_log"][-10:])
+    end_time = job["finished_at"] or time.time()
+    elapsed = end_time - job["started_at"] if job["started_at"] else 0.0
+    files_per_sec = job["transcribed"] / elapsed if elapsed > 0 else 0.0
+    remaining = max(0, job["files"] - job["transcribed"])
+    snapshot.update({"elapsed_seconds": round(elapsed, 2),
+                     "files_per_sec": round(files_per_sec, 3),
+                     "docs_per_sec": round(job["indexed"] / elapsed, 2) if elapsed > 0 else 0.0,
+                     "eta_seconds": round(remaining / files_per_sec) if files_per_sec > 0 and _is_active(job) else None,
+                     "progress": min(1.0, job["transcribed"] / job["files"]) if job["files"] else (0.0 if _is_active(job) else 1.0)})
+    return snapshot
+
+def _on_progress(job, event, fields):
+    with _jobs_lock:
+        if event == "planned":
+            job.update({"files": fields["files"], "skipped": fields["skipped"], "started_at": time.time()})
+        elif event == "transcribed":
+            job["transcribed"] += 1
+            job["current_file"] = fields.get("audio_id")
+            job["file_log"].append({"audio_id": fields.get("audio_id"), "cached": fields.get("cached", False),
+                                    "seconds": round(time.time() - job["started_at"], 2)})
+        elif event == "indexed":
+            job["indexed"] += 1
+    if event == "checkpoint" and job["cancel"].is_set():
+        raise IngestionCancelled(f"ingestion job {job['job_id']} cancelled")
+
+def _run_job(job):
+    with _jobs_lock:
+        if job["status"] == "queued": job["status"] = "running"
+    try:
+        ### checked here : abortProcess() would exit or write to a Streamlit page from this thread
+        if not os.path.isdir(job["source"]):
+            raise FileNotFoundError(f"Path-{job['source']} does not exists")
+        summary = ingestAudio(job["source"], **job["options"],
+                              progress=lambda event, fields: _on_progress(job, event, fields))
+        status = "cancelled" if summary["cancelled"] else "completed"
+        error = None
+    except Exception as e:
+        print(f"Ingestion job {job['job_id']} failed: {e}")
+        summary, status, error = None, "failed", str(e)
+    with _jobs_lock:
+        job.update({"status": status, "summary": summary, "error": error, "current_file": None, "finished_at": time.time()})
+
+def _prune_jobs():
+    finished = sorted((job for job in _jobs.values() if not _is_active(job)), key=lambda job: job["created_at"])
+    for job in finished[:max(0, len(_jobs) - ingestion_jobs_max_history)]:
+        del _jobs[job["job_id"]]
+
+def start_ingestion_job(dataSourceDir, resumed_from=None, **options):
+    ### options : ingestAudio keyword arguments (bulk_mode, incremental, batch_size ...)
+    ### returns the running job of the index instead if there is one, check its "source"
+    index, source = elastic_index_name, os.path.abspath(dataSourceDir)
+    with _jobs_lock:
+        job = _active_job(index)
+        if job is not None:
+            return _snapshot(job)
+        job = {"job_id": uuid.uuid4().hex[:12], "index": index, "source": source, "options": options,
+               "bulk_load": index_lifecycle_bulk_load if options.get("bulk_load") is None else options["bulk_load"],
+               "status": "queued", "resumed_from": resumed_from, "created_at": time.time(), "started_at": None,
+               "finished_at": None, "files": 0, "skipped": 0, "transcribed": 0, "indexed": 0, "current_file": None,
+               "file_log": [], "summary": None, "error": None, "cancel": threading.Event()}
+        _jobs[job["job_id"]] = job
+        _prune_jobs()
+        threading.Thread(target=_run_job, args=(job,), name=f"ingestion-job-{job['job_id']}", daemon=True).start()
+        return _snapshot(job)
+
+def resume_ingestion_job(job_id):
+    ### same directory and options as an incremental run : files already in the manifest are skipped;
+    ### a bulk load always reloads every file into a new index, so it starts over
+    with _jobs_lock:
+        job = _jobs[job_id]
+        source, options = job["source"], dict(job["options"])
+        if not job["bulk_load"]: options["incremental"] = True
+    return start_ingestion_job(source, resumed_from=job_id, **options)
+
+def cancel_ingestion_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or not _is_active(job):
+            return False
+        job["status"] = "cancelling"
+        job["cancel"].set()
+    return True
+
+def get_ingestion_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return _snapshot(job) if job is not None else None
+
+def active_ingestion_job(index_name=None):
+    with _jobs_lock:
+        job = _active_job(index_name or elastic_index_name)
+        return _snapshot(job) if job is not None else None
+
+def list_ingestion_jobs(dataSourceDir=None):
+    ### newest first, optionally only the jobs of one directory
+    source = os.path.abspath(dataSourceDir) if dataSourceDir else None
+    with _jobs_lock:
+        jobs = [_snapshot(job) for job in _jobs.values() if source is None or job["source"] == source]
+    return sorted(jobs, key=lambda job: -job["created_at"])
+
+def wait_for_ingestion_job(job_id, timeout=None, poll_interval=None):
+    deadline = time.time() + timeout if timeout else None
+    while True:
+        job = get_ingestion_job(job_id)
+        if job is None or job["status"] in ("completed", "cancelled", "failed"):
+            return job
+        if deadline and time.time() >= deadline:
+            return job
+        time.sleep(poll_interval or ingestion_jobs_poll_interval)
@@ -0,0 +1,147 @@
+import os, json, hashlib
+from .utility import *
+
+__all__ = ["file_content_hash", "manifest_path", "load_manifest", "save_manifest", "generation_path",
+           "index_generation", "bump_index_generation", "plan_incremental_ingestion", "delete_documents_by_hash",
+           "delete_legacy_documents", "clear_reprocessed_documents", "update_manifest"]
+
+###------------------------------------------------------------------------------
+###   Incremental Ingestion Manifest
+###------------------------------------------------------------------------------
+### One manifest per index records what has been ingested from each audio file
+### (path, size, mtime, content hash, whisper model). The content hash doubles as
+### the Elasticsearch _id, so a re-run only decodes/transcribes what changed.
+def file_content_hash(audio_in, block_size=1024*1024):
+    digest = hashlib.sha256()
+    with open(audio_in, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def manifest_path(index_name):
+    return os.path.join(ingest_manifest_dir, f"{index_name}.manifest.json")
+
+def load_manifest(index_name):
+    path = manifest_path(index_name)
+    if not os.path.isfile(path):
+        return {"index": index_name, "entries": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(index_name, manifest):
+    os.makedirs(ingest_manifest_dir, exist_ok=True)
+    path = manifest_path(index_name)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+###----------------------------------------------
+### - Index Generation
+###----------------------------------------------
+### Bumped by every ingestion that writes to or deletes from the index; caches
+### built on search results compare it to tell whether they are still valid.
+### Kept on disk so the Streamlit app sees bumps made by console runs.
+def generation_path(index_name):
+    return os.path.join(ingest_manifest_dir, f"{index_name}.generation")
+
+def index_generation(index_name=None):
+    try:
+        with open(generation_path(index_name or elastic_index_name)) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def bump_index_generation(index_name=None):
+    index_name = index_name or elastic_index_name
+    generation = index_generation(index_name) + 1
+    os.makedirs(ingest_manifest_dir, exist_ok=True)
+    path = generation_path(index_name)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(str(generation))
+    os.replace(f"{path}.tmp", path)
+    return generation
+
+def plan_incremental_ingestion(dataSourceDir, manifest, model_version, force=False):
+    entries = manifest["entries"]
+    pending, unchanged, seen = [], 0, set()
+
+    for audio_in in list_audio_feeds(dataSourceDir):
+        path = os.path.abspath(audio_in)
+        seen.add(path)
+        stat = os.stat(audio_in)
+        entry = entries.get(path)
+        same_model = not force and entry is not None and entry["model"] == model_version
+
+        ### size + mtime match : trust the manifest without reading the file
+        if same_model and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            unchanged += 1
+            continue
+
+        content_hash = file_content_hash(audio_in)
+        if same_model and entry["hash"] == content_hash:
+            entry["mtime"] = stat.st_mtime
+            unchanged += 1
+            continue
+
+        feed = make_feed(audio_in, doc_id=content_hash)
+        feed.update({"path": path, "size": stat.st_size, "mtime": stat.st_mtime,
+                     "previous_hash": entry["hash"] if entry else None,
+                     "previous_model": entry["model"] if entry else None})
+        pending.append(feed)
+
+    source_dir = os.path.abspath(dataSourceDir)
+    missing = [path for path in entries if os.path.dirname(path) == source_dir and path not in seen]
+    return pending, unchanged, missing
+
+def delete_documents_by_hash(index_name, content_hashes):
+    if not content_hashes:
+        return 0
+    es_client=getOrCreate_es_client()
+    resp = es_client.delete_by_query(index=index_name, conflicts="proceed", refresh=True,
+                                     query={"terms": {"audio_hash": sorted(content_hashes)}})
+    return resp.get("deleted", 0)
+
+def delete_legacy_documents(index_name, audio_ids):
+    ### documents indexed before content-hash ids have a random _id and no audio_hash :
+    ### the new documents of the same file would otherwise sit next to them
+    if not audio_ids:
+        return 0
+    es_client=getOrCreate_es_client()
+    resp = es_client.delete_by_query(index=index_name, conflicts="proceed", refresh=True,
+                                     query={"bool": {"filter": [{"terms": {"audio_id": sorted(audio_ids)}}],
+                                                     "must_not": [{"exists": {"field": "audio_hash"}}]}})
+    return resp.get("deleted", 0)
+
+def clear_reprocessed_documents(index_name, audio_feeds, model_version):
+    ### same audio, new transcription settings : drop the old docs first, the new
+    ### run may produce a different number of (segment) documents
+    return delete_documents_by_hash(index_name, {feed["doc_id"] for feed in audio_feeds
+                                                 if feed["previous_hash"] == feed["doc_id"]
+                                                 and feed["previous_model"] != model_version})
+
+def update_manifest(index_name, manifest, audio_feeds, errors, missing, model_version, prune=False):
+    entries = manifest["entries"]
+    ### long-form segment ids are <content hash>-<ordinal>
+    failed_ids = {(e.get("_id") or "").split("-")[0] for e in errors} | {e.get("audio_id") for e in errors}
+    stale_hashes, legacy_ids = set(), set()
+
+    for feed in audio_feeds:
+        if feed["doc_id"] in failed_ids or feed["audio_id"] in failed_ids:
+            continue
+        if feed["previous_hash"] and feed["previous_hash"] != feed["doc_id"]:
+            stale_hashes.add(feed["previous_hash"])
+        ### first time in the manifest : it may also have been indexed before there was one
+        if feed["previous_hash"] is None:
+            legacy_ids.add(feed["audio_id"])
+        entries[feed["path"]] = {"audio_id": feed["audio_id"], "size": feed["size"], "mtime": feed["mtime"],
+                                 "hash": feed["doc_id"], "model": model_version}
+
+    if prune:
+        for path in missing:
+            stale_hashes.add(entries.pop(path)["hash"])
+
+    ### identical audio under another name shares the same document; keep it
+    stale_hashes -= {entry["hash"] for entry in entries.values()}
+    deleted = delete_documents_by_hash(index_name, stale_hashes) + delete_legacy_documents(index_name, legacy_ids)
+    save_manifest(index_name, manifest)
+    return deleted
@@ -0,0 +1,221 @@
+import os, time, queue, threading, multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from .utility import *
+from .tracing import span, record_span, in_current_trace
+
+__all__ = ["decode_audio", "run_ingestion_pipeline", "run_process_pool_ingestion", "generate_batched_actions"]
+
+###------------------------------------------------------------------------------
+###   Staged Ingestion Pipeline : decode -> transcribe -> index
+###------------------------------------------------------------------------------
+### Each stage runs in its own pool of worker threads and hands items to the next
+### stage through a bounded queue, so ffmpeg decoding, Whisper inference and the
+### Elasticsearch bulk requests overlap instead of running back to back.
+_STAGE_DONE = object()
+
+def decode_audio(audio_in, sampling_rate):
+    from transformers.pipelines.audio_utils import ffmpeg_read
+    with span("decode", audio_id=os.path.basename(audio_in)) as attributes:
+        with open(audio_in, "rb") as f:
+            data = f.read()
+        audio = ffmpeg_read(data, sampling_rate)
+        attributes.update({"bytes": len(data), "audio_seconds": round(len(audio) / sampling_rate, 2)})
+    return audio
+
+def _stage_worker(stage, work, inbox, outbox, stage_stats, errors, lock):
+    cancelled = False
+    while True:
+        item = inbox.get()
+        if item is _STAGE_DONE:
+            break
+        if cancelled:
+            ### keep draining so upstream stages never block on a full queue, but skip the work
+            continue
+        start_time = time.time()
+        try:
+            outbox.put(work(item))
+        except IngestionCancelled:
+            cancelled = True
+        except Exception as e:
+            print(f"{stage} failed for {item['audio_id']}: {e}")
+            with lock: errors.append({"audio_id": item['audio_id'], "stage": stage, "error": str(e)})
+        with lock: stage_stats[stage] += time.time() - start_time
+
+def _drain_into_actions(inbox, stage_stats, lock):
+    while True:
+        start_time = time.time()
+        item = inbox.get()
+        if item is _STAGE_DONE:
+            break
+        with lock: stage_stats["index"] -= time.time() - start_time
+        yield bulk_action(item, item["doc"])
+
+def _index_worker(inbox, results, stage_stats, lock):
+    start_time = time.time()
+    actions = _drain_into_actions(inbox, stage_stats, lock)
+    try:
+        indexed, errors = bulk_ingest_into_elastic(actions)
+    except Exception as e:
+        ### keep draining so upstream stages never block on a full queue
+        print(f"index failed: {e}")
+        indexed, errors = 0, [{"stage": "index", "error": str(e)}]
+        for _ in actions: pass
+    with lock:
+        stage_stats["index"] += time.time() - start_time
+        results["indexed"] += indexed
+        results["errors"].extend(errors)
+
+def _start_workers(count, target, *args):
+    ### workers record their spans under the trace of the ingestion run that started them
+    workers = [threading.Thread(target=in_current_trace(target), args=args, daemon=True) for _ in range(max(1, count))]
+    for worker in workers: worker.start()
+    return workers
+
+def _close_stage(workers, outbox, consumers):
+    for worker in workers: worker.join()
+    for _ in consumers: outbox.put(_STAGE_DONE)
+
+def run_ingestion_pipeline(audio_feeds, transcribe_pipe, forced_decoder_ids,
+                           decode_workers=None, transcribe_workers=None, index_workers=None, queue_size=None):
+    decode_workers = decode_workers or ingest_decode_workers
+    transcribe_workers = transcribe_workers or ingest_transcribe_workers
+    index_workers = index_workers or ingest_index_workers
+    queue_size = queue_size or ingest_queue_size
+    sampling_rate = transcribe_pipe.feature_extractor.sampling_rate
+
+    feed_q, decoded_q, transcribed_q = queue.Queue(), queue.Queue(maxsize=queue_size), queue.Queue(maxsize=queue_size)
+
+    lock = threading.Lock()
+    errors, results = [], {"indexed": 0, "errors": []}
+    stage_stats = {"decode": 0.0, "transcribe": 0.0, "index": 0.0}
+
+    def decode(feed):
+        check_ingest_cancelled()
+        return {**feed, "audio": decode_audio(feed["audio_in"], sampling_rate)}
+
+    def transcribe(item):
+        doc = transcribe_audio({"raw": item.pop("audio"), "sampling_rate": sampling_rate},
+                               transcribe_pipe, forced_decoder_ids, audio_id=item["audio_id"], content_hash=item["doc_id"])
+        return {**item, "doc": doc}
+
+    decoders = _start_workers(decode_workers, _stage_worker, "decode", decode, feed_q, decoded_q, stage_stats, errors, lock)
+    transcribers = _start_workers(transcribe_workers, _stage_worker, "transcribe", transcribe, decoded_q, transcribed_q, stage_stats, errors, lock)
+    indexers = _start_workers(index_workers, _index_worker, transcribed_q, results, stage_stats, lock)
+
+    for feed in audio_feeds:
+        feed_q.put(feed)
+    for _ in decoders: feed_q.put(_STAGE_DONE)
+
+    _close_stage(decoders, decoded_q, transcribers)
+    _close_stage(transcribers, transcribed_q, indexers)
+    for indexer in indexers: indexer.join()
+
+    print("Stage busy time (seconds) : " + ", ".join(f"{stage}={round(busy, 2)}" for stage, busy in stage_stats.items()))
+    return results["indexed"], errors + results["errors"]
+
+###------------------------------------------------------------------------------
+###   Process Pool Ingestion : one Whisper model per worker process
+###------------------------------------------------------------------------------
+### Torch intra-op threads are split across the pool so N workers together use
+### the machine's cores instead of each one trying to grab all of them.
+_worker_transcriber = None
+
+def _init_transcribe_worker(num_threads):
+    global _worker_transcriber
+    import torch
+    torch.set_num_interop_threads(1)
+    _worker_transcriber = speech2Text(num_threads=num_threads)
+
+def _transcribe_in_worker(feed):
+    ### the worker has no trace to add spans to : its timing goes back with the result
+    transcribe_pipe, forced_decoder_ids = _worker_transcriber
+    start_time = time.time()
+    try:
+        action = bulk_action(feed, transcribe_audio(feed["audio_in"], transcribe_pipe, forced_decoder_ids,
+                                                    content_hash=feed["doc_id"]))
+        content = action["_source"]["content"]
+        timing = {"start": start_time, "duration_ms": (time.time() - start_time) * 1000,
+                  "chars": len(content), "words": len(content.split())}
+        return True, action, timing
+    except Exception as e:
+        timing = {"start": start_time, "duration_ms": (time.time() - start_time) * 1000, "error": f"{type(e).__name__}: {e}"}
+        return False, {"audio_id": feed["audio_id"], "stage": "transcribe", "error": str(e)}, timing
+
+def run_process_pool_ingestion(audio_feeds, process_workers=None):
+    process_workers = process_workers or ingest_process_workers or os.cpu_count() or 1
+    num_threads = max(1, (os.cpu_count() or 1) // process_workers)
+    print(f"Starting {process_workers} transcription workers with {num_threads} torch threads each")
+    errors = []
+
+    ### spawn, not fork : forking a parent that already initialised torch threads can deadlock
+    with multiprocessing.get_context("spawn").Pool(process_workers,
+                                                  initializer=_init_transcribe_worker,
+                                                  initargs=(num_threads,)) as pool:
+        def pool_actions():
+            ### workers run outside this process's ingestion run, so progress is reported here
+            for ok, result, timing in pool.imap_unordered(_transcribe_in_worker, audio_feeds):
+                record_span("transcribe", audio_id=result["_source"]["audio_id"] if ok else result["audio_id"], worker=True, **timing)
+                check_ingest_cancelled()
+                if ok:
+                    report_ingest_progress("transcribed", doc_id=result.get("_id"), audio_id=result["_source"]["audio_id"])
+                    yield result
+                else: errors.append(result)
+
+        indexed, bulk_errors = bulk_ingest_into_elastic(pool_actions())
+    return indexed, errors + bulk_errors
+
+###------------------------------------------------------------------------------
+###   Length-sorted Batched Transcription
+###------------------------------------------------------------------------------
+### Files are decoded BATCH_SORT_WINDOW batches at a time, sorted by duration and
+### fed to the ASR pipeline in batches of BATCH_SIZE, so clips of similar length
+### share a forward pass and per-call overhead is paid once per batch.
+def _transcribe_batch(batch_number, batch, transcribe_pipe, forced_decoder_ids, sampling_rate, errors):
+    from .transcriptCache import put_cached_transcript
+    check_ingest_cancelled()
+    lengths = [len(audio) for _, audio in batch]
+    start_time = time.time()
+    try:
+        with span("transcribe", batch=batch_number, files=len(batch), audio_seconds=round(sum(lengths) / sampling_rate, 2)):
+            outputs = transcribe_pipe([{"raw": audio, "sampling_rate": sampling_rate} for _, audio in batch],
+                                      batch_size=len(batch),
+                                      generate_kwargs={"forced_decoder_ids": forced_decoder_ids})
+    except Exception as e:
+        print(f"Batch {batch_number} failed: {e}")
+        errors.extend({"audio_id": feed["audio_id"], "stage": "transcribe", "error": str(e)} for feed, _ in batch)
+        return
+    elapsed = time.time() - start_time
+    padding = 1 - sum(lengths) / (max(lengths) * len(lengths))
+    print(f"Batch {batch_number}: {len(batch)} files, {round(sum(lengths) / sampling_rate, 1)} seconds of audio, "
+          f"padding {round(padding * 100)}%, Speech2Text ElaspedTime: {round(elapsed, 2)} seconds "
+          f"({round(elapsed / len(batch), 2)} seconds/file)")
+
+    for (feed, _), output in zip(batch, outputs):
+        put_cached_transcript(feed["doc_id"], output["text"])
+        report_ingest_progress("transcribed", doc_id=feed["doc_id"], audio_id=feed["audio_id"])
+        yield bulk_action(feed, {"audio_id": feed["audio_id"], "content": output["text"]})
+
+def generate_batched_actions(audio_feeds, transcribe_pipe, forced_decoder_ids, errors, batch_size=None):
+    batch_size = batch_size or ingest_batch_size
+    sampling_rate = transcribe_pipe.feature_extractor.sampling_rate
+    sort_window = batch_size * max(1, ingest_batch_sort_window)
+    batch_number = 0
+
+    with ThreadPoolExecutor(max(1, ingest_decode_workers)) as decoder:
+        for window_start in range(0, len(audio_feeds), sort_window):
+            check_ingest_cancelled()
+            window_feeds = audio_feeds[window_start:window_start + sort_window]
+            futures = [(feed, decoder.submit(in_current_trace(decode_audio), feed["audio_in"], sampling_rate)) for feed in window_feeds]
+            decoded = []
+            for feed, future in futures:
+                try:
+                    decoded.append((feed, future.result()))
+                except Exception as e:
+                    print(f"decode failed for {feed['audio_id']}: {e}")
+                    errors.append({"audio_id": feed["audio_id"], "stage": "decode", "error": str(e)})
+
+            decoded.sort(key=lambda item: len(item[1]))
+            for batch_start in range(0, len(decoded), batch_size):
+                batch_number += 1
+                yield from _transcribe_batch(batch_number, decoded[batch_start:batch_start + batch_size],
+                                             transcribe_pipe, forced_decoder_ids, sampling_rate, errors)
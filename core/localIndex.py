@@ -0,0 +1,267 @@
+import os, re, json, math, time, shutil, threading
+from collections import Counter
+import numpy as np
+from .utility import *
+
+__all__ = ["local_index_stats", "local_index_exists", "build_index", "save_index", "scan_elastic_documents",
+           "build_local_index", "load_local_index", "local_search", "local_retriever"]
+
+###------------------------------------------------------------------------------
+###   Embedded Retrieval Index
+###------------------------------------------------------------------------------
+### For a corpus of a few dozen transcripts the Elasticsearch round trip and the
+### ELSER inference behind it dominate retrieval. This index keeps the two legs of
+### semanting_search_with_rrf in local files : BM25 over whole transcripts (the
+### 'match' leg) and TF-IDF sparse vectors over the transcript chunks (standing in
+### for the ELSER leg, its best chunks become the inner_hits), fused with the same
+### reciprocal rank fusion. Postings are numpy arrays opened with mmap, so only
+### the pages a query touches are read. Elasticsearch stays the system of record :
+### the index is rebuilt from it after every ingestion that changed it.
+_BM25_K1, _BM25_B = 1.2, 0.75
+_RRF_RANK_CONSTANT, _RRF_WINDOW_SIZE = 60, 10
+_ARRAYS = ("doc_lengths", "doc_chunk_start", "bm25_docs", "bm25_tf", "chunk_ids", "chunk_weights", "chunk_doc", "chunk_offset")
+_local_index_lock = threading.Lock()
+_loaded_index = None
+_local_index_stats = {"searches": 0, "seconds": 0.0, "builds": 0, "loads": 0}
+
+def local_index_stats():
+    with _local_index_lock:
+        stats = dict(_local_index_stats)
+        loaded = _loaded_index
+    searches = stats["searches"]
+    stats["avg_ms"] = round(stats.pop("seconds") / searches * 1000, 3) if searches else 0.0
+    if loaded is not None:
+        stats.update({"documents": len(loaded["documents"]), "chunks": loaded["meta"]["chunk_count"],
+                      "generation": loaded["meta"]["generation"], "path": loaded["path"]})
+    return stats
+
+def _terms(text):
+    return re.findall(r"\w+", text.lower())
+
+def _pointer_path(index_name):
+    return os.path.join(local_index_dir, f"{index_name}.current")
+
+def local_index_exists(index_name=None):
+    return os.path.isfile(_pointer_path(index_name or elastic_index_name))
+
+###----------------------------------------------
+### - Build
+###----------------------------------------------
+def _document_chunks(source):
+    ### ELSER's own chunks when Elasticsearch returned them, else word windows sized like ELSER's
+    semantic_data = source.get("semantic_data")
+    chunks = semantic_data.get("inference", {}).get("chunks", []) if isinstance(semantic_data, dict) else []
+    if chunks:
+        return [chunk.get("text", "") for chunk in chunks]
+    words = source.get("content", "").split()
+    step = max(1, local_index_chunk_words - local_index_chunk_overlap)
+    return [" ".join(words[start:start + local_index_chunk_words])
+            for start in range(0, max(len(words) - local_index_chunk_overlap, 1), step)]
+
+def _postings(term_rows):
+    ### {term: [(row, value)]} -> vocabulary {term: [offset, count]} + row / value arrays
+    vocabulary, rows, values = {}, [], []
+    for term in sorted(term_rows):
+        vocabulary[term] = [len(rows), len(term_rows[term])]
+        for row, value in term_rows[term]:
+            rows.append(row)
+            values.append(value)
+    return vocabulary, np.array(rows, dtype=np.int32), np.array(values, dtype=np.float32)
+
+def build_index(documents, generation=0):
+    ### documents : [{"_id": ..., "_source": {...}}] -> (meta, documents, arrays)
+    doc_terms, chunk_terms, chunk_doc, chunk_offset, stored = [], [], [], [], []
+    for number, document in enumerate(documents):
+        source = {key: value for key, value in document["_source"].items() if key != "semantic_data"}
+        chunks = _document_chunks(document["_source"])
+        stored.append({"_id": document["_id"], "_source": source, "chunks": chunks})
+        doc_terms.append(Counter(_terms(source.get("content", ""))))
+        for offset, chunk in enumerate(chunks):
+            chunk_terms.append(Counter(_terms(chunk)))
+            chunk_doc.append(number)
+            chunk_offset.append(offset)
+
+    bm25_rows = {}
+    for number, counts in enumerate(doc_terms):
+        for term, count in counts.items():
+            bm25_rows.setdefault(term, []).append((number, count))
+    bm25_vocabulary, bm25_docs, bm25_tf = _postings(bm25_rows)
+
+    ### chunk vectors : (1 + log tf) * idf, L2-normalised so the dot product is a cosine
+    chunk_df = Counter(term for counts in chunk_terms for term in counts)
+    chunk_idf = {term: math.log(1 + len(chunk_terms) / df) for term, df in chunk_df.items()}
+    chunk_rows = {}
+    for number, counts in enumerate(chunk_terms):
+        weights = {term: (1 + math.log(count)) * chunk_idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        for term, weight in weights.items():
+            chunk_rows.setdefault(term, []).append((number, weight / norm))
+    chunk_vocabulary, chunk_ids, chunk_weights = _postings(chunk_rows)
+
+    doc_lengths = np.array([sum(counts.values()) for counts in doc_terms], dtype=np.float32)
+    ### a document's chunks are consecutive rows : doc_chunk_start[n]:doc_chunk_start[n + 1]
+    doc_chunk_start = np.searchsorted(np.array(chunk_doc, dtype=np.int32), np.arange(len(stored) + 1)).astype(np.int32)
+    meta = {"generation": generation, "built_at": time.time(), "doc_count": len(stored), "chunk_count": len(chunk_terms),
+            "avg_doc_length": float(doc_lengths.mean()) if len(stored) else 0.0,
+            "bm25_vocabulary": bm25_vocabulary, "chunk_vocabulary": chunk_vocabulary, "chunk_idf": chunk_idf}
+    arrays = {"doc_lengths": doc_lengths, "doc_chunk_start": doc_chunk_start, "bm25_docs": bm25_docs, "bm25_tf": bm25_tf,
+              "chunk_ids": chunk_ids, "chunk_weights": chunk_weights,
+              "chunk_doc": np.array(chunk_doc, dtype=np.int32), "chunk_offset": np.array(chunk_offset, dtype=np.int32)}
+    return meta, stored, arrays
+
+def save_index(index_name, meta, documents, arrays):
+    ### each build goes to its own directory and the pointer file is swapped atomically,
+    ### so searches in other processes never see a half-written index. The build the
+    ### pointer named before stays on disk for processes still loading it; only the
+    ### ones before it are deleted
+    path = os.path.join(local_index_dir, f"{index_name}-{int(meta['built_at'] * 1000)}")
+    os.makedirs(f"{path}.tmp", exist_ok=True)
+    with open(os.path.join(f"{path}.tmp", "meta.json"), "w") as f:
+        json.dump(meta, f)
+    with open(os.path.join(f"{path}.tmp", "documents.json"), "w") as f:
+        json.dump(documents, f)
+    for name in _ARRAYS:
+        np.save(os.path.join(f"{path}.tmp", f"{name}.npy"), arrays[name])
+    os.replace(f"{path}.tmp", path)
+
+    pointer = _pointer_path(index_name)
+    previous = None
+    if os.path.isfile(pointer):
+        with open(pointer) as f:
+            previous = f.read().strip()
+    with open(f"{pointer}.tmp", "w") as f:
+        f.write(os.path.basename(path))
+    os.replace(f"{pointer}.tmp", pointer)
+    keep = {os.path.basename(path), previous}
+    build_pattern = re.compile(rf"{re.escape(index_name)}-\d+")
+    for name in os.listdir(local_index_dir):
+        if build_pattern.fullmatch(name) and name not in keep:
+            shutil.rmtree(os.path.join(local_index_dir, name), ignore_errors=True)
+    return path
+
+def scan_elastic_documents(index_name):
+    from elasticsearch.helpers import scan
+    ### chunk texts come along, their sparse embeddings do not
+    return [{"_id": hit["_id"], "_source": hit["_source"]}
+            for hit in scan(getOrCreate_es_client(), index=index_name, query={"query": {"match_all": {}}},
+                            _source_excludes=["semantic_data.inference.chunks.embeddings"])]
+
+def build_local_index(index_name=None):
+    from .ingestionManifest import index_generation
+    index_name = index_name or elastic_index_name
+    start_time = time.time()
+    documents = scan_elastic_documents(index_name)
+    meta, stored, arrays = build_index(documents, index_generation(index_name))
+    path = save_index(index_name, meta, stored, arrays)
+    with _local_index_lock:
+        _local_index_stats["builds"] += 1
+    print(f"Local index: {meta['doc_count']} docs, {meta['chunk_count']} chunks written to {path}, "
+          f"ElaspedTime: {round(time.time() - start_time, 2)} seconds")
+    return meta
+
+###----------------------------------------------
+### - Search
+###----------------------------------------------
+def _read_index(pointer):
+    with open(pointer) as f:
+        path = os.path.join(local_index_dir, f.read().strip())
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    with open(os.path.join(path, "documents.json")) as f:
+        documents = json.load(f)
+    ### plain ndarray views over the mapped files : np.memmap slicing overhead dominates tiny queries
+    arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")) for name in _ARRAYS}
+    return path, meta, documents, arrays
+
+def load_local_index(index_name=None):
+    ### reloaded when another process (an ingestion run) swapped the pointer
+    global _loaded_index
+    pointer = _pointer_path(index_name or elastic_index_name)
+    try:
+        pointer_mtime = os.stat(pointer).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No local index at {pointer}, ingest audio or run console.py -x with BACKEND=local")
+    with _local_index_lock:
+        if _loaded_index is not None and _loaded_index["pointer_mtime"] == pointer_mtime:
+            return _loaded_index
+    try:
+        path, meta, documents, arrays = _read_index(pointer)
+    except FileNotFoundError:
+        ### the build was deleted while being read (two swaps since the pointer was read) : read the new pointer once more
+        pointer_mtime = os.stat(pointer).st_mtime_ns
+        path, meta, documents, arrays = _read_index(pointer)
+    length_norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * arrays["doc_lengths"] / (meta["avg_doc_length"] or 1.0))
+    index = {"path": path, "pointer_mtime": pointer_mtime, "meta": meta, "documents": documents,
+             "length_norm": length_norm, **arrays}
+    with _local_index_lock:
+        _loaded_index = index
+        _local_index_stats["loads"] += 1
+    return index
+
+def _bm25_scores(index, query_terms):
+    meta, doc_count = index["meta"], index["meta"]["doc_count"]
+    scores = np.zeros(doc_count, dtype=np.float32)
+    for term in set(query_terms):
+        if term not in meta["bm25_vocabulary"]:
+            continue
+        offset, count = meta["bm25_vocabulary"][term]
+        docs, tf = index["bm25_docs"][offset:offset + count], index["bm25_tf"][offset:offset + count]
+        idf = math.log(1 + (doc_count - count + 0.5) / (count + 0.5))
+        scores[docs] += idf * tf * (_BM25_K1 + 1) / (tf + index["length_norm"][docs])
+    return scores
+
+def _chunk_scores(index, query_terms):
+    meta = index["meta"]
+    scores = np.zeros(meta["chunk_count"], dtype=np.float32)
+    for term, count in Counter(query_terms).items():
+        if term not in meta["chunk_vocabulary"]:
+            continue
+        offset, length = meta["chunk_vocabulary"][term]
+        scores[index["chunk_ids"][offset:offset + length]] += (1 + math.log(count)) * meta["chunk_idf"][term] \
+                                                             * index["chunk_weights"][offset:offset + length]
+    return scores
+
+def _ranked(scores, window):
+    candidates = np.flatnonzero(scores > 0)
+    return candidates[np.argsort(-scores[candidates], kind="stable")][:window].tolist()
+
+def _hit(index, number, score, chunk_scores):
+    document = index["documents"][number]
+    chunks = document["chunks"]
+    start, end = index["doc_chunk_start"][number], index["doc_chunk_start"][number + 1]
+    scores = chunk_scores[start:end]
+    order = np.argsort(-scores, kind="stable")
+    matched = index["chunk_offset"][start:end][order[scores[order] > 0][:context_inner_hits_size]].tolist()
+    return {"_index": elastic_index_name, "_id": document["_id"], "_score": score,
+            "_source": {**document["_source"], "semantic_data": {"inference": {"chunks": [{"text": chunk} for chunk in chunks]}}},
+            "inner_hits": {"semantic_data": {"hits": {"hits": [
+                {"_nested": {"field": "semantic_data.inference.chunks", "offset": offset}, "_source": {"text": chunks[offset]}}
+                for offset in matched]}}}}
+
+def local_search(params):
+    ### same inputs and result shape as the Elasticsearch retriever : search_query, size -> Documents
+    start_time = time.perf_counter()
+    index = load_local_index()
+    query_terms = _terms(params["search_query"])
+    chunk_scores = _chunk_scores(index, query_terms)
+    ### a document scores as its best chunk; every document has at least one chunk row
+    semantic_scores = np.maximum.reduceat(chunk_scores, index["doc_chunk_start"][:-1]) if len(chunk_scores) else chunk_scores
+
+    fused = {}
+    for ranking in (_ranked(semantic_scores, _RRF_WINDOW_SIZE), _ranked(_bm25_scores(index, query_terms), _RRF_WINDOW_SIZE)):
+        for rank, number in enumerate(ranking, start=1):
+            fused[number] = fused.get(number, 0.0) + 1 / (_RRF_RANK_CONSTANT + rank)
+    top = sorted(fused.items(), key=lambda item: -item[1])[:params["size"]]
+    documents = [hit_to_document(_hit(index, number, score, chunk_scores)) for number, score in top]
+
+    with _local_index_lock:
+        _local_index_stats["searches"] += 1
+        _local_index_stats["seconds"] += time.perf_counter() - start_time
+    return documents
+
+def local_retriever():
+    from langchain_core.runnables import RunnableLambda
+    ### searches take well under a millisecond : the async body runs them inline, no executor hop
+    async def alocal_search(params):
+        return local_search(params)
+    return RunnableLambda(local_search, afunc=alocal_search, name="local_retriever")
@@ -0,0 +1,173 @@
+import os, re, json, math, threading
+from .utility import *
+
+__all__ = ["local_router_stats", "route_by_rules", "log_router_decision", "train_local_router", "classify_task",
+           "route_locally"]
+
+###------------------------------------------------------------------------------
+###   Local Fast-path Router
+###------------------------------------------------------------------------------
+### Sits in front of the LLM router. Obvious questions ("compare the plot of X
+### and Y", "analyze the character of Z") are routed by patterns; the rest go through a
+### naive Bayes classifier trained on logged LLM router decisions. Either path
+### emits the router's "<task>,<subject>,<key-element>" format, and anything that
+### is not confident enough falls through to the LLM.
+_ELEMENT = (r"(?:main\s+)?(?:characters?|characteri[sz]ation|protagonists?|villains?|heroe?s?|plot|themes?|setting|tone|style|"
+            r"ending|conflicts?|morals?|lessons?|tools|techniques|devices|narrative|symbolism|structure)")
+_END = r"\s*[?.!]*$"
+_COMPARE_PATTERNS = [
+    re.compile(rf"^(?:compare|contrast)\s+(?:the\s+)?(?:(?P<element>{_ELEMENT})\s+(?:of|in|between)\s+)?(?P<subject>.+?)"
+               rf"(?:\s+(?:in terms of|on|by|regarding|with respect to)\s+(?:the\s+|their\s+)?(?P<element2>{_ELEMENT}))?{_END}"),
+    re.compile(rf"^(?:what\s+are\s+)?(?:the\s+)?(?:differences?|similarities)\s+(?:in\s+(?:the\s+)?(?P<element>{_ELEMENT})\s+)?"
+               rf"between\s+(?P<subject>.+?){_END}"),
+    re.compile(rf"^(?:the\s+)?(?P<element>{_ELEMENT})\s+(?:of|in)\s+(?P<subject>.+?\s+(?:vs\.?|versus)\s+.+?){_END}"),
+]
+_ANALYZE_PATTERNS = [
+    re.compile(rf"^(?:analy[sz]e|describe|explain|discuss|examine)\s+(?:the\s+)?(?P<element>{_ELEMENT})\s+(?:of|in)\s+(?P<subject>.+?){_END}"),
+    re.compile(rf"^what\s+(?:is|are)\s+the\s+(?P<element>{_ELEMENT})\s+(?:of|in)\s+(?P<subject>.+?){_END}"),
+]
+### every rule needs a literary element : without one "describe the weather in Paris" or
+### "compare python and java" look like stories, and the LLM router answers "unknown" for them
+_SUBJECT_PREFIX = re.compile(r"^(?:the\s+)?(?:(?:short\s+)?stor(?:y|ies)|tales?|books?)\s+(?:of|about|called|titled)\s+|^the\s+")
+_SUBJECT_STOPWORDS = {"a", "an", "the", "of", "in", "on", "to", "for", "about", "please", "can", "you", "me", "what", "is", "are",
+                      "how", "does", "do", "story", "stories", "compare", "contrast", "analyze", "analyse", "describe", "explain",
+                      "discuss", "examine", "summarize", "summarise", "between", "differences", "difference", "similarities",
+                      "differ", "different", "tell", "give", "show", "look", "at"}
+
+_router_lock = threading.Lock()
+_router_model = None
+_router_stats = {"rule": 0, "classifier": 0, "llm": 0}
+
+def _record(route):
+    with _router_lock:
+        _router_stats[route] += 1
+
+def local_router_stats():
+    with _router_lock:
+        stats = dict(_router_stats)
+    total = sum(stats.values())
+    stats["llm_calls_avoided"] = stats["rule"] + stats["classifier"]
+    stats["avoided_rate"] = round(stats["llm_calls_avoided"] / total, 3) if total else 0.0
+    return stats
+
+def _normalize_element(element):
+    element = re.sub(r"^main\s+", "", element.strip())
+    return {"characters": "character", "protagonists": "protagonist", "villains": "villain", "themes": "theme",
+            "conflicts": "conflict", "morals": "moral", "lessons": "lesson", "heroes": "hero"}.get(element, element)
+
+def _normalize_subject(subject):
+    subject = _SUBJECT_PREFIX.sub("", subject.strip().strip("\"'"))
+    return re.sub(r"[,\s]+", " ", subject).strip()
+
+def _decision(task, subject, element):
+    if task == "compare":
+        ### "beauty and the beast and aladdin" or "a, b and c" split no clear way : the LLM router decides
+        parts = split_compare_subjects(subject.strip())
+        if len(parts) < 2 or any("," in part for part in parts):
+            return None
+        subject = " | ".join(_normalize_subject(part) for part in parts)
+    else:
+        subject = _normalize_subject(subject)
+    return f"{task},{subject},{_normalize_element(element)}" if subject else None
+
+def route_by_rules(question):
+    text = question.strip().lower()
+    for task, patterns in (("compare", _COMPARE_PATTERNS), ("analyze", _ANALYZE_PATTERNS)):
+        for pattern in patterns:
+            match = pattern.match(text)
+            if match:
+                groups = match.groupdict()
+                element = groups.get("element") or groups.get("element2")
+                decision = _decision(task, groups["subject"], element) if element else None
+                if decision:
+                    return decision
+    return None
+
+###----------------------------------------------
+### - Naive Bayes classifier over logged decisions
+###----------------------------------------------
+def _features(text):
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+def log_router_decision(question, decision):
+    if not local_router_log_decisions:
+        return
+    os.makedirs(os.path.dirname(local_router_decision_log) or ".", exist_ok=True)
+    with _router_lock:
+        ### enough to train on; past the cap new decisions are dropped rather than growing the file
+        if os.path.isfile(local_router_decision_log) and os.path.getsize(local_router_decision_log) >= local_router_decision_log_max_bytes:
+            return
+        with open(local_router_decision_log, "a") as f:
+            f.write(json.dumps({"input": question, "output": decision}) + "\n")
+
+def train_local_router(decision_log=None, model_path=None):
+    global _router_model
+    decision_log, model_path = decision_log or local_router_decision_log, model_path or local_router_model_path
+    labels = {}
+    with open(decision_log) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            label = labels.setdefault(record["output"].split(",")[0].strip(), {"docs": 0, "tokens": 0, "counts": {}})
+            label["docs"] += 1
+            for feature in _features(record["input"]):
+                label["counts"][feature] = label["counts"].get(feature, 0) + 1
+                label["tokens"] += 1
+
+    vocabulary = {feature for label in labels.values() for feature in label["counts"]}
+    model = {"labels": labels, "vocab_size": len(vocabulary), "docs": sum(label["docs"] for label in labels.values())}
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    with open(model_path, "w") as f:
+        json.dump(model, f)
+    _router_model = model
+    print(f"Local router trained on {model['docs']} decisions: " + ", ".join(f"{name}={label['docs']}" for name, label in labels.items()))
+    return model
+
+def _load_router_model():
+    global _router_model
+    if _router_model is None and os.path.isfile(local_router_model_path):
+        with open(local_router_model_path) as f:
+            _router_model = json.load(f)
+    return _router_model
+
+def classify_task(question):
+    model = _load_router_model()
+    if not model or not model["labels"]:
+        return None, 0.0
+    features = _features(question)
+    scores = {}
+    for name, label in model["labels"].items():
+        score = math.log(label["docs"] / model["docs"])
+        denominator = label["tokens"] + model["vocab_size"] + 1
+        for feature in features:
+            score += math.log((label["counts"].get(feature, 0) + 1) / denominator)
+        scores[name] = score
+    best = max(scores, key=scores.get)
+    total = sum(math.exp(score - scores[best]) for score in scores.values())
+    return best, 1 / total
+
+def _extract_subject_and_element(question):
+    text = question.lower()
+    element = re.search(rf"\b{_ELEMENT}\b", text)
+    words = [word for word in re.findall(r"[a-z0-9']+", text)
+             if word not in _SUBJECT_STOPWORDS and not (element and word in element.group(0).split())]
+    return " ".join(words), element.group(0) if element else None
+
+def route_locally(question):
+    decision = route_by_rules(question)
+    if decision:
+        _record("rule")
+        return decision
+
+    task, confidence = classify_task(question)
+    if task in ("analyze", "compare") and confidence >= local_router_confidence_threshold:
+        decision = _decision(task, *_extract_subject_and_element(question))
+        if decision:
+            if debug_mode: print(f"Local router classifier confidence: {round(confidence, 3)}")
+            _record("classifier")
+            return decision
+
+    _record("llm")
+    return None
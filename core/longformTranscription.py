@@ -0,0 +1,69 @@
+import os, subprocess, time
+import numpy as np
+from .utility import *
+from .tracing import span
+
+__all__ = ["stream_audio_windows", "transcribe_segments", "generate_segment_actions"]
+
+###------------------------------------------------------------------------------
+###   Long-form Transcription : fixed windows with overlap, one document per segment
+###------------------------------------------------------------------------------
+### ffmpeg streams raw 32-bit PCM on stdout and only one window is held in memory
+### at a time, so peak memory does not grow with the length of the recording.
+def stream_audio_windows(audio_in, sampling_rate, window_seconds=None, overlap_seconds=None):
+    window = int((window_seconds or ingest_longform_window_seconds) * sampling_rate)
+    overlap = int((ingest_longform_overlap_seconds if overlap_seconds is None else overlap_seconds) * sampling_rate)
+    step = window - overlap
+    if step <= 0:
+        raise ValueError("LONGFORM_OVERLAP_SECONDS must be smaller than LONGFORM_WINDOW_SECONDS")
+
+    ffmpeg_command = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-i", audio_in,
+                      "-ac", "1", "-ar", str(sampling_rate), "-f", "f32le", "pipe:1"]
+    with subprocess.Popen(ffmpeg_command, stdout=subprocess.PIPE) as ffmpeg_process:
+        samples, offset = np.zeros(0, dtype=np.float32), 0
+        while True:
+            data = ffmpeg_process.stdout.read((window - len(samples)) * 4)
+            samples = np.concatenate([samples, np.frombuffer(data, dtype=np.float32)])
+            eof = len(samples) < window
+            ### at EOF, a leftover that is only the previous window's overlap is already transcribed
+            if len(samples) > (overlap if offset else 0):
+                yield offset / sampling_rate, samples
+            if eof:
+                break
+            samples, offset = samples[step:], offset + step
+    if ffmpeg_process.returncode not in (0, None):
+        raise RuntimeError(f"ffmpeg failed to decode {audio_in} (exit code {ffmpeg_process.returncode})")
+
+def transcribe_segments(audio_in, transcribe_pipe, forced_decoder_ids, audio_id=None):
+    sampling_rate = transcribe_pipe.feature_extractor.sampling_rate
+    audio_id = audio_id or os.path.basename(audio_in)
+    for ordinal, (start_time, samples) in enumerate(stream_audio_windows(audio_in, sampling_rate)):
+        speech2text_start_time = time.time()
+        with span("transcribe", audio_id=audio_id, segment=ordinal, audio_seconds=round(len(samples) / sampling_rate, 2)) as attributes:
+            textContent = transcribe_pipe({"raw": samples, "sampling_rate": sampling_rate},
+                                          generate_kwargs={"forced_decoder_ids": forced_decoder_ids})['text'].strip()
+            attributes["chars"] = len(textContent)
+        if debug_mode: print(f"Feed: {audio_id}, segment {ordinal}, Speech2Text ElaspedTime: {round(time.time() - speech2text_start_time, 2)} seconds")
+        yield {"ordinal": ordinal,
+               "start_time": round(start_time, 2),
+               "end_time": round(start_time + len(samples) / sampling_rate, 2),
+               "content": textContent}
+
+def generate_segment_actions(audio_feeds, transcribe_pipe, forced_decoder_ids, errors):
+    from .transcriptCache import put_cached_transcript
+    for feed in audio_feeds:
+        check_ingest_cancelled()
+        print(f"Feed: {feed['audio_in']}")
+        speech2text_start_time = time.time()
+        segments = []
+        try:
+            for segment in transcribe_segments(feed["audio_in"], transcribe_pipe, forced_decoder_ids, feed["audio_id"]):
+                segments.append(segment)
+                yield segment_action(feed, segment)
+        except Exception as e:
+            print(f"long-form transcription failed for {feed['audio_id']}: {e}")
+            errors.append({"audio_id": feed["audio_id"], "stage": "transcribe", "error": str(e)})
+            continue
+        print(f"Feed: {feed['audio_id']}, {len(segments)} segments, Speech2Text ElaspedTime: {round(time.time() - speech2text_start_time)} seconds")
+        put_cached_transcript(feed["doc_id"], segments, settings=transcription_settings(longform=True))
+        report_ingest_progress("transcribed", doc_id=feed["doc_id"], audio_id=feed["audio_id"], segments=len(segments))
@@ -14,10 +14,11 @@ def routerPrompt():
       Your output should be one of the following 3 formats:
 
       analyze,<Identified subject>,<Identified Key-Element>
-      compare,<Identified subject>,<Identified Key-Element>
+      compare,<Identified subject 1> | <Identified subject 2>,<Identified Key-Element>
       unknown
 
       Note: The identified subject should be based on the main idea or keyword of the question, even if additional details are present.
+      For a comparison, list every subject being compared, separated by ' | '.
 
       Do not attempt to answer questions outside of these rules.
       """
@@ -31,7 +32,7 @@ def ragAnalyzerPrompt():
    return prompt
 
 def ragComparerPrompt():
-   prompt="""compare the 2 stories in the context in view of the question provided
+   prompt="""compare the stories in the context in view of the question provided
       {context}
       Question: {question}
       
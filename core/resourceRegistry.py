@@ -0,0 +1,129 @@
+import time, asyncio, threading
+
+###------------------------------------------------------------------------------
+###   Process-wide Resource Registry
+###------------------------------------------------------------------------------
+### Long-lived objects (ASR pipeline, ES client, LLM client, compiled graphs,
+### prompt templates) are created lazily, once per process, and shared by every
+### Streamlit session and console run. A background thread health-checks them,
+### drops the unhealthy ones so the next get_resource() rebuilds them, and
+### refreshes resources registered with a max_age (e.g. cached index status).
+_registry_lock = threading.Lock()
+_resources = {}
+_health_check_thread = None
+_event_loop = None
+health_check_interval = 60
+
+def register_resource(name, factory, health_check=None, max_age=None, depends_on=()):
+    ### depends_on : resources built from another one (e.g. a retriever holding the
+    ### ES client) are reset together with it
+    with _registry_lock:
+        entry = _resources.setdefault(name, {"value": None, "created_at": None, "load_seconds": None,
+                                             "loads": 0, "failures": 0, "lock": threading.Lock()})
+        entry.update({"factory": factory, "health_check": health_check, "max_age": max_age,
+                      "depends_on": tuple(depends_on)})
+
+def set_health_check_interval(interval):
+    global health_check_interval
+    health_check_interval = interval
+
+def _load(entry):
+    start_time = time.time()
+    value = entry["factory"]()
+    entry.update({"value": value, "created_at": time.time(),
+                  "load_seconds": round(time.time() - start_time, 3), "loads": entry["loads"] + 1})
+    return value
+
+def get_resource(name):
+    entry = _resources[name]
+    _start_health_checks()
+    value = entry["value"]
+    if value is not None:
+        return value
+    with entry["lock"]:
+        return entry["value"] if entry["value"] is not None else _load(entry)
+
+def set_resource(name, value):
+    ### lets callers (benchmarks, tests) swap in a pre-built or stand-in object
+    if name not in _resources:
+        register_resource(name, lambda: value)
+    reset_resource(name)
+    with _resources[name]["lock"]:
+        _resources[name].update({"value": value, "created_at": time.time()})
+
+def reset_resource(name):
+    entry = _resources.get(name)
+    if entry is not None:
+        with entry["lock"]:
+            entry["value"] = None
+    for dependent, dependent_entry in list(_resources.items()):
+        if name in dependent_entry["depends_on"]:
+            reset_resource(dependent)
+
+def refresh_resource(name):
+    entry = _resources[name]
+    with entry["lock"]:
+        return _load(entry)
+
+def registry_status():
+    return {name: {"loaded": entry["value"] is not None,
+                   "created_at": entry["created_at"],
+                   "load_seconds": entry["load_seconds"],
+                   "loads": entry["loads"],
+                   "health_check_failures": entry["failures"]}
+            for name, entry in list(_resources.items())}
+
+def run_health_checks():
+    now = time.time()
+    for name, entry in list(_resources.items()):
+        if entry["value"] is None:
+            continue
+        if entry["max_age"] is not None and now - entry["created_at"] >= entry["max_age"]:
+            try:
+                refresh_resource(name)
+            except Exception as e:
+                entry["failures"] += 1
+                print(f"Resource '{name}' refresh failed, keeping the previous value: {e}")
+        elif entry["health_check"] is not None:
+            try:
+                healthy = entry["health_check"](entry["value"])
+            except Exception:
+                healthy = False
+            if not healthy:
+                entry["failures"] += 1
+                print(f"Resource '{name}' failed its health check, it will be rebuilt on next use")
+                reset_resource(name)
+
+def _health_check_loop():
+    while True:
+        max_ages = [entry["max_age"] for entry in _resources.values() if entry["max_age"]]
+        time.sleep(min([health_check_interval] + max_ages))
+        run_health_checks()
+
+def _start_health_checks():
+    global _health_check_thread
+    if _health_check_thread is not None:
+        return
+    with _registry_lock:
+        if _health_check_thread is None:
+            _health_check_thread = threading.Thread(target=_health_check_loop, name="resource-health-check", daemon=True)
+            _health_check_thread.start()
+
+###------------------------------------------------------------------------------
+###   Shared Event Loop
+###------------------------------------------------------------------------------
+### The async LLM and Elasticsearch clients hold connections bound to the loop
+### they were first used on, so every async request of the process (streamed
+### answers, batch queries) runs on this one long-lived loop instead of a fresh
+### asyncio.run() loop per call.
+def shared_event_loop():
+    global _event_loop
+    with _registry_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever, name="shared-event-loop", daemon=True).start()
+    return _event_loop
+
+def run_on_shared_loop(coroutine):
+    ### blocks until done; not to be called from a coroutine already running on the loop
+    return asyncio.run_coroutine_threadsafe(coroutine, shared_event_loop()).result()
@@ -0,0 +1,91 @@
+import time, queue, asyncio, threading
+from .utility import *
+from .agentTemplates import *
+from .tracing import trace, question_attributes
+
+__all__ = ["streaming_stats", "stream_processflow_graph"]
+
+###------------------------------------------------------------------------------
+###   Streaming Responses
+###------------------------------------------------------------------------------
+### The graph runs through astream_events, which makes the analyzer/comparer LLM
+### calls stream; their tokens are handed to a plain generator as they arrive so
+### both st.write_stream and the console can consume them. Router tokens are not
+### part of the answer and are skipped. Time to first token and total time are
+### recorded per request.
+_STREAMED_NODES = ("raganalyzer", "ragcomparer")
+_STREAM_DONE = object()
+_streaming_lock = threading.Lock()
+_streaming_stats = {"requests": 0, "streamed": 0, "time_to_first_token": 0.0, "total_seconds": 0.0}
+
+def streaming_stats():
+    with _streaming_lock:
+        stats = dict(_streaming_stats)
+    requests = stats["requests"]
+    stats["avg_time_to_first_token"] = round(stats.pop("time_to_first_token") / requests, 3) if requests else 0.0
+    stats["avg_total_seconds"] = round(stats.pop("total_seconds") / requests, 3) if requests else 0.0
+    return stats
+
+async def _produce_tokens(question, tokens):
+    processflow_graph = get_resource("processflow_graph")
+    final_state, start_time = None, time.perf_counter()
+    with trace("question", **question_attributes(question), streaming=True) as attributes:
+        async for event in processflow_graph.astream_events({"input": question}, version="v2"):
+            if event["event"] == "on_chat_model_stream" and event["metadata"].get("langgraph_node") in _STREAMED_NODES:
+                if event["data"]["chunk"].content:
+                    if "first_token_ms" not in attributes:
+                        attributes["first_token_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+                    tokens.put(("token", event["data"]["chunk"].content))
+            elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                final_state = event["data"].get("output")
+        attributes["answer_chars"] = len((final_state or {}).get("output") or "")
+    tokens.put(("state", final_state or {}))
+
+async def _run_producer(question, tokens):
+    try:
+        await _produce_tokens(question, tokens)
+    except Exception as e:
+        tokens.put(("error", e))
+    finally:
+        tokens.put((_STREAM_DONE, None))
+
+def stream_processflow_graph(question, metrics=None):
+    ### metrics (a dict) receives output, time_to_first_token, total_seconds and streamed once exhausted
+    metrics = {} if metrics is None else metrics
+    start_time = time.time()
+    first_token_time, pieces, final_state, error = None, [], {}, None
+    tokens = queue.Queue()
+    ### on the process-wide loop, so the async LLM and ES clients are reused across requests
+    asyncio.run_coroutine_threadsafe(_run_producer(question, tokens), shared_event_loop())
+
+    while True:
+        kind, value = tokens.get()
+        if kind is _STREAM_DONE:
+            break
+        if kind == "token":
+            if first_token_time is None: first_token_time = time.time()
+            pieces.append(value)
+            yield value
+        elif kind == "state":
+            final_state = value
+        else:
+            error = value
+
+    if error is not None:
+        raise error
+    output = final_state.get("output", "".join(pieces))
+    if not pieces and output:
+        ### cached answers and 'unknown' routes produce no tokens : hand over the whole output
+        first_token_time = time.time()
+        yield output
+
+    total_seconds = time.time() - start_time
+    time_to_first_token = (first_token_time or time.time()) - start_time
+    metrics.update({"output": output, "time_to_first_token": round(time_to_first_token, 3),
+                    "total_seconds": round(total_seconds, 3), "streamed": bool(pieces)})
+    with _streaming_lock:
+        _streaming_stats["requests"] += 1
+        _streaming_stats["streamed"] += bool(pieces)
+        _streaming_stats["time_to_first_token"] += time_to_first_token
+        _streaming_stats["total_seconds"] += total_seconds
+    print(f"\nTimeToFirstToken: {round(time_to_first_token, 2)} seconds, TotalTime: {round(total_seconds, 2)} seconds")
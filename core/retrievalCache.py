@@ -0,0 +1,186 @@
+import json, hashlib, threading, asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_core.runnables import RunnableLambda
+from .utility import *
+from .ingestionManifest import index_generation
+
+__all__ = ["retrieval_cache_stats", "retrieval_cache_key", "clear_retrieval_cache", "cached_retriever",
+           "cached_multi_search", "acached_multi_search"]
+
+###------------------------------------------------------------------------------
+###   Retrieval Result Cache
+###------------------------------------------------------------------------------
+### Search results are cached by the exact query body sent to Elasticsearch, so a
+### repeated search_query/size pair never runs the ELSER inference again. Memory
+### is bounded by MAX_ENTRIES and MAX_SIZE_MB (least recently used go first), the
+### cache is dropped when ingestion bumps the index generation, and concurrent
+### identical searches share the one request in flight.
+_retrieval_lock = threading.Lock()
+_retrieval_entries = OrderedDict()
+_retrieval_inflight = {}
+_retrieval_stats = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "invalidations": 0, "bytes": 0}
+_retrieval_generation = None
+
+def retrieval_cache_stats():
+    with _retrieval_lock:
+        stats = dict(_retrieval_stats)
+        stats["entries"] = len(_retrieval_entries)
+    lookups = stats["hits"] + stats["misses"] + stats["shared"]
+    stats["hit_rate"] = round((stats["hits"] + stats["shared"]) / lookups, 3) if lookups else 0.0
+    return stats
+
+def retrieval_cache_key(inputs):
+    body = semanting_search_with_rrf(inputs)
+    return hashlib.sha256(json.dumps({"index": elastic_index_name, "body": body}, sort_keys=True).encode()).hexdigest()
+
+def _entry_size(documents):
+    return sum(len(document.page_content) + len(json.dumps(document.metadata, default=str)) for document in documents)
+
+def _check_generation():
+    ### called with _retrieval_lock held
+    global _retrieval_generation
+    generation = index_generation()
+    if generation != _retrieval_generation:
+        if _retrieval_generation is not None:
+            _retrieval_stats["invalidations"] += 1
+        _retrieval_entries.clear()
+        _retrieval_stats["bytes"] = 0
+        _retrieval_generation = generation
+
+def clear_retrieval_cache():
+    global _retrieval_generation
+    with _retrieval_lock:
+        _retrieval_entries.clear()
+        _retrieval_stats["bytes"] = 0
+        _retrieval_generation = None
+
+def _claim(key):
+    ### returns (documents, None) on a hit, (None, future) when another caller is
+    ### already searching, or (None, None) when this caller has to search
+    with _retrieval_lock:
+        _check_generation()
+        entry = _retrieval_entries.get(key)
+        if entry is not None:
+            _retrieval_entries.move_to_end(key)
+            _retrieval_stats["hits"] += 1
+            return list(entry["documents"]), None
+        if key in _retrieval_inflight:
+            _retrieval_stats["shared"] += 1
+            return None, _retrieval_inflight[key]
+        _retrieval_stats["misses"] += 1
+        _retrieval_inflight[key] = Future()
+        return None, None
+
+def _release(key, generation, documents=None, error=None):
+    with _retrieval_lock:
+        future = _retrieval_inflight.pop(key)
+        ### results fetched across an ingestion are handed out but not kept
+        if error is None and generation == _retrieval_generation:
+            size = _entry_size(documents)
+            if size <= retrieval_cache_max_bytes:
+                _retrieval_entries[key] = {"documents": documents, "size": size}
+                _retrieval_stats["bytes"] += size
+            while _retrieval_entries and (len(_retrieval_entries) > retrieval_cache_max_entries
+                                          or _retrieval_stats["bytes"] > retrieval_cache_max_bytes):
+                _, evicted = _retrieval_entries.popitem(last=False)
+                _retrieval_stats["bytes"] -= evicted["size"]
+                _retrieval_stats["evictions"] += 1
+    if error is None:
+        future.set_result(documents)
+    else:
+        future.set_exception(error)
+
+def cached_retriever(retriever):
+    def retrieve(inputs):
+        key = retrieval_cache_key(inputs)
+        documents, pending = _claim(key)
+        if documents is not None:
+            return documents
+        if pending is not None:
+            return list(pending.result())
+        generation = _retrieval_generation
+        try:
+            documents = retriever.invoke(inputs)
+        except BaseException as e:
+            _release(key, generation, error=e)
+            raise
+        _release(key, generation, documents)
+        return list(documents)
+
+    async def aretrieve(inputs):
+        key = retrieval_cache_key(inputs)
+        documents, pending = _claim(key)
+        if documents is not None:
+            return documents
+        if pending is not None:
+            return list(await asyncio.wrap_future(pending))
+        generation = _retrieval_generation
+        try:
+            documents = await retriever.ainvoke(inputs)
+        except BaseException as e:
+            _release(key, generation, error=e)
+            raise
+        _release(key, generation, documents)
+        return list(documents)
+
+    return RunnableLambda(retrieve, afunc=aretrieve, name="cached_retriever")
+
+def _claim_many(keys, inputs_list):
+    found, pending, owned = {}, {}, {}
+    for key, inputs in zip(keys, inputs_list):
+        if key in found or key in pending or key in owned:
+            continue
+        documents, future = _claim(key)
+        if documents is not None:
+            found[key] = documents
+        elif future is not None:
+            pending[key] = future
+        else:
+            owned[key] = inputs
+    return found, pending, owned
+
+def cached_multi_search(inputs_list):
+    ### cached searches are served from memory, the rest go out together in one _msearch
+    if not retrieval_cache_enabled:
+        return semantic_multi_search(inputs_list)
+    keys = [retrieval_cache_key(inputs) for inputs in inputs_list]
+    found, pending, owned = _claim_many(keys, inputs_list)
+
+    if owned:
+        generation = _retrieval_generation
+        try:
+            searched = semantic_multi_search(list(owned.values()))
+        except BaseException as e:
+            for key in owned:
+                _release(key, generation, error=e)
+            raise
+        for key, documents in zip(owned, searched):
+            _release(key, generation, documents)
+            found[key] = documents
+
+    for key, future in pending.items():
+        found[key] = future.result()
+    return [list(found[key]) for key in keys]
+
+async def acached_multi_search(inputs_list):
+    if not retrieval_cache_enabled:
+        return await asemantic_multi_search(inputs_list)
+    keys = [retrieval_cache_key(inputs) for inputs in inputs_list]
+    found, pending, owned = _claim_many(keys, inputs_list)
+
+    if owned:
+        generation = _retrieval_generation
+        try:
+            searched = await asemantic_multi_search(list(owned.values()))
+        except BaseException as e:
+            for key in owned:
+                _release(key, generation, error=e)
+            raise
+        for key, documents in zip(owned, searched):
+            _release(key, generation, documents)
+            found[key] = documents
+
+    for key, future in pending.items():
+        found[key] = await asyncio.wrap_future(future)
+    return [list(found[key]) for key in keys]
@@ -0,0 +1,110 @@
+import re, time, threading, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from .utility import *
+
+__all__ = ["speculative_retrieval_stats", "subject_match_score", "start_speculative_retrieval",
+           "astart_speculative_retrieval", "use_speculative_documents", "ause_speculative_documents"]
+
+###------------------------------------------------------------------------------
+###   Speculative Retrieval
+###------------------------------------------------------------------------------
+### The hybrid RRF search for the raw question is launched alongside the router
+### LLM call. If the router's subject is (mostly) made of words from the question,
+### those hits are handed to the RAG agent; otherwise they are discarded and the
+### agent searches with the subject as usual. Hit/miss counters and the retrieval
+### time taken off the critical path are kept for tuning MATCH_THRESHOLD.
+_STOPWORDS = {"a", "an", "the", "of", "and", "or", "in", "on", "to", "for", "with", "about", "between",
+              "is", "are", "what", "how", "who", "which", "story", "stories"}
+_speculation_lock = threading.Lock()
+_speculation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative-retrieval")
+_speculation_stats = {"launched": 0, "hits": 0, "misses": 0, "unused": 0, "failed": 0, "seconds_saved": 0.0}
+
+def _record(counter, seconds_saved=0.0):
+    with _speculation_lock:
+        _speculation_stats[counter] += 1
+        _speculation_stats["seconds_saved"] += seconds_saved
+
+def speculative_retrieval_stats():
+    with _speculation_lock:
+        stats = dict(_speculation_stats)
+    resolved = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / resolved, 3) if resolved else 0.0
+    ### every launched search that was not used is extra load on the cluster
+    stats["extra_searches"] = stats["launched"] - stats["hits"]
+    stats["seconds_saved"] = round(stats["seconds_saved"], 3)
+    return stats
+
+def _terms(text):
+    return {term for term in re.findall(r"[a-z0-9]+", text.lower()) if term not in _STOPWORDS}
+
+def subject_match_score(subject, question):
+    subject_terms = _terms(subject)
+    if not subject_terms:
+        return 0.0
+    return len(subject_terms & _terms(question)) / len(subject_terms)
+
+def _speculation_applies(question, decision):
+    fields = decision.split(",")
+    ### a compare of several subjects searches each of them, the raw-question hits are not used
+    if fields[0].strip() not in ("analyze", "compare") or len(fields) < 2 or len(split_compare_subjects(fields[1])) > 1:
+        _record("unused")
+        return False
+    score = subject_match_score(fields[1], question)
+    if debug_mode: print(f"Speculative retrieval match score: {round(score, 2)}")
+    if score < speculative_match_threshold:
+        _record("misses")
+        return False
+    return True
+
+def _timed_retrieve(question):
+    start_time = time.time()
+    documents = getOrCreate_retriever().invoke({"search_query": question, "size": speculative_size})
+    return documents, time.time() - start_time
+
+async def _atimed_retrieve(question):
+    start_time = time.time()
+    documents = await getOrCreate_retriever().ainvoke({"search_query": question, "size": speculative_size})
+    return documents, time.time() - start_time
+
+def start_speculative_retrieval(question):
+    _record("launched")
+    return _speculation_executor.submit(_timed_retrieve, question)
+
+def _discard_exception(task):
+    ### a task dropped unawaited (no match, router failure) must not log "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+def astart_speculative_retrieval(question):
+    _record("launched")
+    task = asyncio.ensure_future(_atimed_retrieve(question))
+    task.add_done_callback(_discard_exception)
+    return task
+
+def use_speculative_documents(question, decision, speculation):
+    if not _speculation_applies(question, decision):
+        return None
+    wait_start_time = time.time()
+    try:
+        documents, retrieval_seconds = speculation.result()
+    except Exception as e:
+        print(f"Speculative retrieval failed: {e}")
+        _record("failed")
+        return None
+    ### only the part of the search that overlapped the router call is saved
+    _record("hits", max(0.0, retrieval_seconds - (time.time() - wait_start_time)))
+    return documents
+
+async def ause_speculative_documents(question, decision, speculation):
+    if not _speculation_applies(question, decision):
+        speculation.cancel()
+        return None
+    wait_start_time = time.time()
+    try:
+        documents, retrieval_seconds = await speculation
+    except Exception as e:
+        print(f"Speculative retrieval failed: {e}")
+        _record("failed")
+        return None
+    _record("hits", max(0.0, retrieval_seconds - (time.time() - wait_start_time)))
+    return documents
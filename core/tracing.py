@@ -0,0 +1,276 @@
+import os, json, time, uuid, random, atexit, threading, contextvars
+from collections import deque
+from contextlib import contextmanager
+from .utility import *
+
+__all__ = ["tracing_stats", "flush_spans", "trace", "span", "record_span", "in_current_trace", "question_attributes", "token_usage",
+           "load_spans", "summarize_traces", "stage_breakdown", "slowest_traces", "trace_spans"]
+
+###------------------------------------------------------------------------------
+###   Tracing : per-stage spans for ingestion and the agent graph
+###------------------------------------------------------------------------------
+### A trace is opened per question (or per ingestion run) with trace(); stages
+### inside it open span()s, which nest through a context variable so they follow
+### the request across LangGraph's worker threads and asyncio tasks. span()
+### outside any trace records nothing, so background calls (health checks) stay
+### out of the data. Finished spans carry their duration and attributes (token
+### counts, payload sizes) and go to the JSONL sink and/or OpenTelemetry.
+### Only SAMPLE_RATE of the traces are recorded; JSONL lines are buffered and
+### appended once per finished trace, and the file rolls over to <path>.1 past
+### MAX_FILE_MB.
+_current_span = contextvars.ContextVar("current_span", default=None)
+_UNSAMPLED = False
+_tracing_lock = threading.Lock()
+_write_lock = threading.Lock()
+_pending_lines = []
+_tracing_stats = {"traces": 0, "spans": 0, "export_errors": 0}
+_recent_spans = deque(maxlen=tracing_max_spans)
+_otel_tracer = None
+
+class _NoSpan(dict):
+    ### stands in for a span outside a trace : attributes set on it go nowhere
+    def __setitem__(self, key, value):
+        pass
+
+    def update(self, *args, **kwargs):
+        pass
+
+def tracing_stats():
+    with _tracing_lock:
+        stats = dict(_tracing_stats)
+    stats.update({"enabled": tracing_enabled, "exporter": tracing_exporter, "sample_rate": tracing_sample_rate,
+                  "buffered_spans": len(_recent_spans), "pending_lines": len(_pending_lines)})
+    return stats
+
+def _get_otel_tracer():
+    global _otel_tracer
+    if _otel_tracer is None:
+        try:
+            from opentelemetry import trace as otel_trace
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            print("Tracing: opentelemetry-sdk / opentelemetry-exporter-otlp not installed, spans go to JSONL only")
+            _otel_tracer = False
+            return None
+        provider = TracerProvider(resource=Resource.create({"service.name": tracing_service_name}))
+        ### endpoint from config, else the standard OTEL_EXPORTER_OTLP_* environment variables
+        exporter = OTLPSpanExporter(endpoint=tracing_otel_endpoint) if tracing_otel_endpoint else OTLPSpanExporter()
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        _otel_tracer = provider.get_tracer("voices-to-vectors")
+    return _otel_tracer or None
+
+def _otel_attribute(value):
+    return value if isinstance(value, (str, bool, int, float)) else json.dumps(value, default=str)
+
+def flush_spans():
+    with _write_lock:
+        with _tracing_lock:
+            lines = list(_pending_lines)
+            _pending_lines.clear()
+        if not lines:
+            return
+        try:
+            os.makedirs(os.path.dirname(tracing_jsonl_path) or ".", exist_ok=True)
+            if os.path.isfile(tracing_jsonl_path) and os.path.getsize(tracing_jsonl_path) >= tracing_max_file_bytes:
+                os.replace(tracing_jsonl_path, f"{tracing_jsonl_path}.1")
+            with open(tracing_jsonl_path, "a") as f:
+                f.write("".join(lines))
+        except OSError as e:
+            with _tracing_lock: _tracing_stats["export_errors"] += 1
+            if debug_mode: print(f"Tracing: export failed, {e}")
+
+atexit.register(flush_spans)
+
+def _export(record):
+    _recent_spans.append(record)
+    if tracing_exporter not in ("jsonl", "both"):
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _tracing_lock:
+        _pending_lines.append(line)
+        full = len(_pending_lines) >= tracing_buffer_spans
+    ### one append per finished trace (or full buffer) instead of an open() per span
+    if full or record["parent_id"] is None:
+        flush_spans()
+
+@contextmanager
+def _open_span(name, parent, attributes):
+    record = {"trace_id": parent["trace_id"] if parent else uuid.uuid4().hex,
+              "span_id": uuid.uuid4().hex[:16],
+              "parent_id": parent["span_id"] if parent else None,
+              "name": name, "start": time.time(), "duration_ms": None,
+              "status": "ok", "attributes": dict(attributes)}
+    otel_span = None
+    if tracing_exporter in ("otel", "both") and _get_otel_tracer():
+        from opentelemetry import trace as otel_trace
+        otel_parent = parent.get("_otel") if parent else None
+        otel_span = _get_otel_tracer().start_span(name, context=otel_trace.set_span_in_context(otel_parent) if otel_parent else None)
+        record["_otel"] = otel_span
+    token = _current_span.set(record)
+    start_time = time.perf_counter()
+    try:
+        yield record["attributes"]
+    except BaseException as e:
+        record["status"] = "error"
+        record["attributes"]["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start_time) * 1000, 2)
+        _current_span.reset(token)
+        record.pop("_otel", None)
+        if otel_span is not None:
+            for key, value in record["attributes"].items():
+                otel_span.set_attribute(key, _otel_attribute(value))
+            if record["status"] == "error":
+                from opentelemetry.trace import Status, StatusCode
+                otel_span.set_status(Status(StatusCode.ERROR, record["attributes"]["error"]))
+            otel_span.end()
+        with _tracing_lock:
+            _tracing_stats["spans"] += 1
+            _tracing_stats["traces"] += parent is None
+        _export(record)
+
+@contextmanager
+def trace(name, **attributes):
+    ### root of a request; inside another trace it is just a nested span
+    parent = _current_span.get()
+    if not tracing_enabled or parent is _UNSAMPLED:
+        yield _NoSpan()
+        return
+    if parent is None and random.random() >= tracing_sample_rate:
+        ### not sampled : spans and traces inside see _UNSAMPLED and record nothing either
+        token = _current_span.set(_UNSAMPLED)
+        try:
+            yield _NoSpan()
+        finally:
+            _current_span.reset(token)
+        return
+    with _open_span(name, parent, attributes) as span_attributes:
+        yield span_attributes
+
+@contextmanager
+def span(name, **attributes):
+    ### yields the attribute dict, so results (tokens, sizes) can be added before it closes
+    parent = _current_span.get()
+    if not tracing_enabled or not parent:
+        yield _NoSpan()
+        return
+    with _open_span(name, parent, attributes) as span_attributes:
+        yield span_attributes
+
+def record_span(name, start, duration_ms, error=None, **attributes):
+    ### a span timed elsewhere (a worker process has no trace of its own), added to the current trace
+    parent = _current_span.get()
+    if not tracing_enabled or not parent:
+        return
+    record = {"trace_id": parent["trace_id"], "span_id": uuid.uuid4().hex[:16], "parent_id": parent["span_id"],
+              "name": name, "start": start, "duration_ms": round(duration_ms, 2),
+              "status": "error" if error else "ok", "attributes": {**attributes, **({"error": error} if error else {})}}
+    if tracing_exporter in ("otel", "both") and _get_otel_tracer():
+        from opentelemetry import trace as otel_trace
+        otel_parent = parent.get("_otel")
+        otel_span = _get_otel_tracer().start_span(name, context=otel_trace.set_span_in_context(otel_parent) if otel_parent else None,
+                                                  start_time=int(start * 1e9))
+        for key, value in record["attributes"].items():
+            otel_span.set_attribute(key, _otel_attribute(value))
+        otel_span.end(end_time=int((start + duration_ms / 1000) * 1e9))
+    with _tracing_lock:
+        _tracing_stats["spans"] += 1
+    _export(record)
+
+def in_current_trace(function):
+    ### binds function to the caller's trace, for worker threads started with threading.Thread
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+def question_attributes(question):
+    ### the question text only with RECORD_QUESTIONS=True, its length otherwise
+    return {"question": question} if tracing_record_questions else {"question_chars": len(question)}
+
+def token_usage(response):
+    ### token counts reported by the model, if any (streamed responses usually have none)
+    usage = getattr(response, "usage_metadata", None) or {}
+    return {key: usage[key] for key in ("input_tokens", "output_tokens") if key in usage}
+
+###------------------------------------------------------------------------------
+###   Reading traces back : latency breakdown and slowest requests
+###------------------------------------------------------------------------------
+def _tail_lines(path, count, block_size=1 << 16):
+    ### the last count lines, reading blocks back from the end instead of the whole file
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    ### the first line may be cut in half unless the read went back to the start of the file
+    return lines[-count:] if position == 0 or len(lines) > count else lines[1:]
+
+def load_spans(path=None, max_spans=None):
+    ### the JSONL sink when there is one (all processes), else this process's buffer
+    path = path or tracing_jsonl_path
+    max_spans = max_spans or tracing_max_spans
+    flush_spans()
+    if not os.path.isfile(path):
+        return list(_recent_spans)
+    spans = []
+    for line in _tail_lines(path, max_spans):
+        try:
+            spans.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return spans
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))] if values else 0.0
+
+def summarize_traces(spans):
+    ### one row per complete trace, time per stage summed over its spans
+    by_trace = {}
+    for record in spans:
+        by_trace.setdefault(record["trace_id"], []).append(record)
+    summaries = []
+    for trace_id, records in by_trace.items():
+        root = next((record for record in records if record["parent_id"] is None), None)
+        if root is None:
+            continue
+        stages = {}
+        for record in records:
+            if record is not root:
+                stages[record["name"]] = round(stages.get(record["name"], 0.0) + record["duration_ms"], 2)
+        summaries.append({"trace_id": trace_id, "name": root["name"], "start": root["start"],
+                          "duration_ms": root["duration_ms"], "status": root["status"],
+                          "attributes": root["attributes"], "stages": stages, "spans": len(records)})
+    return sorted(summaries, key=lambda summary: summary["start"])
+
+def stage_breakdown(spans, trace_name=None):
+    ### latency per span name (p50/p95/total), optionally for one kind of trace
+    roots = {record["trace_id"]: record["name"] for record in spans if record["parent_id"] is None}
+    durations = {}
+    for record in spans:
+        if trace_name is None or roots.get(record["trace_id"]) == trace_name:
+            durations.setdefault(record["name"], []).append(record["duration_ms"])
+    return {name: {"count": len(values), "avg_ms": round(sum(values) / len(values), 2),
+                   "p50_ms": round(_percentile(values, 0.5), 2), "p95_ms": round(_percentile(values, 0.95), 2),
+                   "total_ms": round(sum(values), 2)}
+            for name, values in sorted(durations.items())}
+
+def slowest_traces(spans, count=10, trace_name=None):
+    summaries = [summary for summary in summarize_traces(spans) if trace_name is None or summary["name"] == trace_name]
+    return sorted(summaries, key=lambda summary: -summary["duration_ms"])[:count]
+
+def trace_spans(spans, trace_id):
+    ### spans of one trace in start order, with their depth for a waterfall view
+    records = sorted((record for record in spans if record["trace_id"] == trace_id), key=lambda record: record["start"])
+    depth = {}
+    for record in records:
+        depth[record["span_id"]] = depth.get(record["parent_id"], -1) + 1 if record["parent_id"] else 0
+        record["depth"] = depth[record["span_id"]]
+    return records
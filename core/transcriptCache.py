@@ -0,0 +1,100 @@
+import os, json, hashlib, threading
+from .utility import *
+
+__all__ = ["transcript_cache_key", "get_cached_transcript", "put_cached_transcript", "evict_transcripts",
+           "split_cached_feeds"]
+
+###------------------------------------------------------------------------------
+###   Transcript Cache (content addressed, on disk)
+###------------------------------------------------------------------------------
+### Transcripts are keyed by audio content hash + whisper model + decoding
+### settings, so rebuilding an index (new mapping, name or inference_id) reuses
+### them instead of re-running Whisper. Least recently read entries are evicted
+### once the cache grows past MAX_SIZE_MB.
+_cache_lock = threading.Lock()
+_cache_size = None
+
+def transcript_cache_key(content_hash, model_id=None, settings=None):
+    key = {"audio": content_hash,
+           "model": model_id or whisper_model_id,
+           "settings": settings or transcription_settings()}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def _cache_file(key):
+    return os.path.join(transcript_cache_dir, key[:2], f"{key}.json")
+
+def _cache_files():
+    for root, _, files in os.walk(transcript_cache_dir):
+        for name in files:
+            if name.endswith(".json"):
+                yield os.path.join(root, name)
+
+def get_cached_transcript(content_hash, settings=None):
+    if not transcript_cache_enabled or not content_hash:
+        return None
+    path = _cache_file(transcript_cache_key(content_hash, settings=settings))
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+        os.utime(path)  ### mtime doubles as the LRU timestamp
+        return entry["content"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+def put_cached_transcript(content_hash, content, settings=None):
+    global _cache_size
+    if not transcript_cache_enabled or not content_hash:
+        return
+    settings = settings or transcription_settings()
+    path = _cache_file(transcript_cache_key(content_hash, settings=settings))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = json.dumps({"audio_hash": content_hash, "model": whisper_model_id,
+                          "settings": settings, "content": content})
+    with open(f"{path}.tmp", "w") as f:
+        f.write(payload)
+
+    with _cache_lock:
+        ### an overwritten entry (re-transcribed file) only changes the size by the difference
+        previous_size = os.path.getsize(path) if os.path.isfile(path) else 0
+        os.replace(f"{path}.tmp", path)
+        if _cache_size is None:
+            _cache_size = sum(os.path.getsize(p) for p in _cache_files())
+        else:
+            _cache_size += os.path.getsize(path) - previous_size
+        if _cache_size > transcript_cache_max_bytes:
+            _cache_size = evict_transcripts(transcript_cache_max_bytes)
+
+def evict_transcripts(max_bytes):
+    entries = []
+    for path in _cache_files():
+        try:
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        except FileNotFoundError:
+            pass
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+def split_cached_feeds(audio_feeds, longform=False):
+    cached_actions, uncached_feeds = [], []
+    for feed in audio_feeds:
+        content = get_cached_transcript(feed.get("doc_id"), settings=transcription_settings(longform))
+        if content is None:
+            uncached_feeds.append(feed)
+            continue
+        if longform:
+            ### long-form entries hold the list of segments rather than one transcript
+            cached_actions.extend(segment_action(feed, segment) for segment in content)
+        else:
+            cached_actions.append(bulk_action(feed, {"audio_id": feed["audio_id"], "content": content}))
+        report_ingest_progress("transcribed", doc_id=feed["doc_id"], audio_id=feed["audio_id"],
+                               segments=len(content) if longform else 1, cached=True)
+    return cached_actions, uncached_feeds
@@ -1,10 +1,8 @@
 import configparser
-import os, sys, time, json
+import os, re, sys, time, json, contextvars
 from dotenv import load_dotenv
-from elasticsearch import Elasticsearch
-from langchain_elasticsearch import ElasticsearchRetriever
 from typing import Dict, TypedDict
-from langgraph.graph import StateGraph, END
+from .resourceRegistry import *
 
 ###------------------------------------------------------------------------------
 ###   Set Environment and Application Variables 
@@ -22,17 +20,186 @@ def getConfigData():
    
     global elastic_index_name
     global elastic_model_id
+    global elastic_pool_size
+    global elastic_request_timeout
+    global elastic_max_retries
+    global elastic_sniff_interval
     global azure_openai_model_id
     global azure_openai_api_version
     global azure_openai_temperature
+    global azure_openai_max_retries
     global debug_mode
+    global ingest_bulk_mode
+    global ingest_bulk_chunk_size
+    global ingest_bulk_max_chunk_bytes
+    global ingest_bulk_max_retries
+    global ingest_bulk_initial_backoff
+    global ingest_pipeline_mode
+    global ingest_decode_workers
+    global ingest_transcribe_workers
+    global ingest_index_workers
+    global ingest_queue_size
+    global ingest_process_workers
+    global ingest_incremental
+    global ingest_prune_deleted
+    global ingest_manifest_dir
+    global whisper_model_id
+    global whisper_language
+    global whisper_task
+    global whisper_device
+    global whisper_quantize
+    global whisper_num_threads
+    global whisper_compile
+    global ingest_batch_size
+    global ingest_batch_sort_window
+    global ingest_longform_mode
+    global ingest_longform_window_seconds
+    global ingest_longform_overlap_seconds
+    global ingestion_jobs_poll_interval
+    global ingestion_jobs_max_history
+    global index_lifecycle_bulk_load
+    global index_lifecycle_replicas
+    global index_lifecycle_refresh_interval
+    global index_lifecycle_force_merge_segments
+    global index_lifecycle_merge_timeout
+    global index_lifecycle_health_timeout
+    global index_lifecycle_delete_old_index
+    global index_lifecycle_max_failed
+    global transcript_cache_enabled
+    global resource_health_check_interval
+    global local_router_enabled
+    global local_router_confidence_threshold
+    global local_router_log_decisions
+    global local_router_decision_log
+    global local_router_decision_log_max_bytes
+    global local_router_model_path
+    global speculative_retrieval_enabled
+    global speculative_match_threshold
+    global speculative_size
+    global batch_max_concurrency
+    global index_status_max_age
+    global transcript_cache_dir
+    global streaming_enabled
+    global context_builder_enabled
+    global context_token_budgets
+    global context_default_token_budget
+    global context_inner_hits_size
+    global comparer_size_per_subject
+    global retrieval_backend
+    global local_index_dir
+    global local_index_chunk_words
+    global local_index_chunk_overlap
+    global retrieval_cache_enabled
+    global retrieval_cache_max_entries
+    global retrieval_cache_max_bytes
+    global answer_cache_enabled
+    global answer_cache_backend
+    global answer_cache_max_entries
+    global answer_cache_ttl
+    global answer_cache_sqlite_path
+    global transcript_cache_max_bytes
+    global tracing_enabled
+    global tracing_exporter
+    global tracing_jsonl_path
+    global tracing_otel_endpoint
+    global tracing_service_name
+    global tracing_max_spans
+    global tracing_sample_rate
+    global tracing_record_questions
+    global tracing_buffer_spans
+    global tracing_max_file_bytes
 
     try:
         elastic_index_name = config.get('ELASTIC','INDEX_NAME')
         elastic_model_id = config.get('ELASTIC','MODEL_ID')
+        elastic_pool_size = config.getint('ELASTIC', 'POOL_SIZE', fallback=10)
+        elastic_request_timeout = config.getfloat('ELASTIC', 'REQUEST_TIMEOUT', fallback=30)
+        elastic_max_retries = config.getint('ELASTIC', 'MAX_RETRIES', fallback=3)
+        elastic_sniff_interval = config.getfloat('ELASTIC', 'SNIFF_INTERVAL', fallback=0)
         azure_openai_model_id = config.get('AZURE_OPENAI', 'MODEL_ID')
         azure_openai_api_version = config.get('AZURE_OPENAI', 'API_VERSION')
         azure_openai_temperature = config.get('AZURE_OPENAI', 'TEMPERATURE')
+        azure_openai_max_retries = config.getint('AZURE_OPENAI', 'MAX_RETRIES', fallback=2)
+        whisper_model_id = config.get('WHISPER', 'MODEL_ID', fallback='openai/whisper-medium')
+        whisper_language = config.get('WHISPER', 'LANGUAGE', fallback='en')
+        whisper_task = config.get('WHISPER', 'TASK', fallback='transcribe')
+        whisper_device = config.get('WHISPER', 'DEVICE', fallback='auto')
+        whisper_quantize = config.getboolean('WHISPER', 'QUANTIZE', fallback=False)
+        whisper_num_threads = config.getint('WHISPER', 'NUM_THREADS', fallback=0)
+        whisper_compile = config.getboolean('WHISPER', 'COMPILE', fallback=False)
+        ingest_bulk_mode = config.getboolean('INGESTION', 'BULK_MODE', fallback=False)
+        ingest_bulk_chunk_size = config.getint('INGESTION', 'BULK_CHUNK_SIZE', fallback=100)
+        ingest_bulk_max_chunk_bytes = config.getint('INGESTION', 'BULK_MAX_CHUNK_BYTES', fallback=10*1024*1024)
+        ingest_bulk_max_retries = config.getint('INGESTION', 'BULK_MAX_RETRIES', fallback=3)
+        ingest_bulk_initial_backoff = config.getfloat('INGESTION', 'BULK_INITIAL_BACKOFF', fallback=2)
+        ingest_pipeline_mode = config.getboolean('INGESTION', 'PIPELINE_MODE', fallback=False)
+        ingest_decode_workers = config.getint('INGESTION', 'DECODE_WORKERS', fallback=2)
+        ingest_transcribe_workers = config.getint('INGESTION', 'TRANSCRIBE_WORKERS', fallback=1)
+        ingest_index_workers = config.getint('INGESTION', 'INDEX_WORKERS', fallback=1)
+        ingest_queue_size = config.getint('INGESTION', 'QUEUE_SIZE', fallback=4)
+        ingest_process_workers = config.getint('INGESTION', 'PROCESS_WORKERS', fallback=0)
+        ingest_incremental = config.getboolean('INGESTION', 'INCREMENTAL', fallback=True)
+        ingest_prune_deleted = config.getboolean('INGESTION', 'PRUNE_DELETED', fallback=False)
+        ingest_manifest_dir = config.get('INGESTION', 'MANIFEST_DIR', fallback='.ingest_state')
+        ingest_batch_size = config.getint('INGESTION', 'BATCH_SIZE', fallback=1)
+        ingest_batch_sort_window = config.getint('INGESTION', 'BATCH_SORT_WINDOW', fallback=8)
+        ingest_longform_mode = config.getboolean('INGESTION', 'LONGFORM_MODE', fallback=False)
+        ingest_longform_window_seconds = config.getfloat('INGESTION', 'LONGFORM_WINDOW_SECONDS', fallback=30)
+        ingest_longform_overlap_seconds = config.getfloat('INGESTION', 'LONGFORM_OVERLAP_SECONDS', fallback=5)
+        ingestion_jobs_poll_interval = config.getfloat('INGESTION_JOBS', 'POLL_INTERVAL', fallback=2)
+        ingestion_jobs_max_history = config.getint('INGESTION_JOBS', 'MAX_HISTORY', fallback=20)
+        index_lifecycle_bulk_load = config.getboolean('INDEX_LIFECYCLE', 'BULK_LOAD', fallback=False)
+        index_lifecycle_replicas = config.getint('INDEX_LIFECYCLE', 'REPLICAS', fallback=1)
+        index_lifecycle_refresh_interval = config.get('INDEX_LIFECYCLE', 'REFRESH_INTERVAL', fallback='1s')
+        index_lifecycle_force_merge_segments = config.getint('INDEX_LIFECYCLE', 'FORCE_MERGE_SEGMENTS', fallback=1)
+        index_lifecycle_merge_timeout = config.getint('INDEX_LIFECYCLE', 'MERGE_TIMEOUT', fallback=600)
+        index_lifecycle_health_timeout = config.getint('INDEX_LIFECYCLE', 'HEALTH_TIMEOUT', fallback=60)
+        index_lifecycle_delete_old_index = config.getboolean('INDEX_LIFECYCLE', 'DELETE_OLD_INDEX', fallback=True)
+        index_lifecycle_max_failed = config.getint('INDEX_LIFECYCLE', 'MAX_FAILED', fallback=0)
+        transcript_cache_enabled = config.getboolean('TRANSCRIPT_CACHE', 'ENABLED', fallback=True)
+        transcript_cache_dir = config.get('TRANSCRIPT_CACHE', 'CACHE_DIR', fallback='.transcript_cache')
+        transcript_cache_max_bytes = config.getint('TRANSCRIPT_CACHE', 'MAX_SIZE_MB', fallback=512) * 1024 * 1024
+        streaming_enabled = config.getboolean('AZURE_OPENAI', 'STREAMING', fallback=True)
+        context_builder_enabled = config.getboolean('CONTEXT', 'ENABLED', fallback=True)
+        context_default_token_budget = config.getint('CONTEXT', 'DEFAULT_TOKEN_BUDGET', fallback=1500)
+        context_token_budgets = {"analyzer": config.getint('CONTEXT', 'ANALYZER_TOKEN_BUDGET', fallback=context_default_token_budget),
+                                 "comparer": config.getint('CONTEXT', 'COMPARER_TOKEN_BUDGET', fallback=2 * context_default_token_budget)}
+        context_inner_hits_size = config.getint('CONTEXT', 'INNER_HITS_SIZE', fallback=5)
+        comparer_size_per_subject = config.getint('CONTEXT', 'COMPARER_SIZE_PER_SUBJECT', fallback=1)
+        retrieval_backend = config.get('RETRIEVAL', 'BACKEND', fallback='elasticsearch').lower()
+        local_index_dir = config.get('RETRIEVAL', 'LOCAL_INDEX_DIR', fallback='.local_index')
+        local_index_chunk_words = config.getint('RETRIEVAL', 'CHUNK_WORDS', fallback=250)
+        local_index_chunk_overlap = config.getint('RETRIEVAL', 'CHUNK_OVERLAP', fallback=100)
+        retrieval_cache_enabled = config.getboolean('RETRIEVAL_CACHE', 'ENABLED', fallback=True)
+        retrieval_cache_max_entries = config.getint('RETRIEVAL_CACHE', 'MAX_ENTRIES', fallback=512)
+        retrieval_cache_max_bytes = config.getint('RETRIEVAL_CACHE', 'MAX_SIZE_MB', fallback=64) * 1024 * 1024
+        answer_cache_enabled = config.getboolean('ANSWER_CACHE', 'ENABLED', fallback=True)
+        answer_cache_backend = config.get('ANSWER_CACHE', 'BACKEND', fallback='memory').lower()
+        answer_cache_max_entries = config.getint('ANSWER_CACHE', 'MAX_ENTRIES', fallback=1000)
+        answer_cache_ttl = config.getint('ANSWER_CACHE', 'TTL_SECONDS', fallback=3600)
+        answer_cache_sqlite_path = config.get('ANSWER_CACHE', 'SQLITE_PATH', fallback='.answer_cache/answers.sqlite')
+        local_router_enabled = config.getboolean('LOCAL_ROUTER', 'ENABLED', fallback=False)
+        local_router_confidence_threshold = config.getfloat('LOCAL_ROUTER', 'CONFIDENCE_THRESHOLD', fallback=0.9)
+        local_router_log_decisions = config.getboolean('LOCAL_ROUTER', 'LOG_DECISIONS', fallback=False)
+        local_router_decision_log = config.get('LOCAL_ROUTER', 'DECISION_LOG', fallback='.router_state/decisions.jsonl')
+        local_router_decision_log_max_bytes = config.getint('LOCAL_ROUTER', 'DECISION_LOG_MAX_MB', fallback=16) * 1024 * 1024
+        local_router_model_path = config.get('LOCAL_ROUTER', 'MODEL_PATH', fallback='.router_state/classifier.json')
+        speculative_retrieval_enabled = config.getboolean('SPECULATIVE_RETRIEVAL', 'ENABLED', fallback=False)
+        speculative_match_threshold = config.getfloat('SPECULATIVE_RETRIEVAL', 'MATCH_THRESHOLD', fallback=0.8)
+        speculative_size = config.getint('SPECULATIVE_RETRIEVAL', 'SIZE', fallback=2)
+        batch_max_concurrency = config.getint('BATCH', 'MAX_CONCURRENCY', fallback=8)
+        resource_health_check_interval = config.getint('RESOURCES', 'HEALTH_CHECK_INTERVAL', fallback=60)
+        index_status_max_age = config.getint('RESOURCES', 'INDEX_STATUS_MAX_AGE', fallback=30)
+        tracing_enabled = config.getboolean('TRACING', 'ENABLED', fallback=False)
+        tracing_exporter = config.get('TRACING', 'EXPORTER', fallback='jsonl').lower()
+        tracing_jsonl_path = config.get('TRACING', 'JSONL_PATH', fallback='.traces/spans.jsonl')
+        tracing_otel_endpoint = config.get('TRACING', 'OTEL_ENDPOINT', fallback='')
+        tracing_service_name = config.get('TRACING', 'SERVICE_NAME', fallback='voices-to-vectors')
+        tracing_max_spans = config.getint('TRACING', 'MAX_SPANS', fallback=5000)
+        tracing_sample_rate = config.getfloat('TRACING', 'SAMPLE_RATE', fallback=1.0)
+        tracing_record_questions = config.getboolean('TRACING', 'RECORD_QUESTIONS', fallback=False)
+        tracing_buffer_spans = config.getint('TRACING', 'BUFFER_SPANS', fallback=256)
+        tracing_max_file_bytes = config.getint('TRACING', 'MAX_FILE_MB', fallback=64) * 1024 * 1024
     except Exception as e:
         abortProcess(e)
     
@@ -52,48 +219,95 @@ def abortProcess(msg):
 ###----------------------------------------------
 ### - Default Functions
 ###----------------------------------------------
-es_client = None
 getEnvVariables()
 getConfigData()
-from .agentTemplates import *
+set_health_check_interval(resource_health_check_interval)
 
 ###------------------------------------------------------------------------------
-###   OpenAI/Whisper-medium 
+###   OpenAI/Whisper 
 ###------------------------------------------------------------------------------
-def speech2Text():
+def speech2Text(model_id=None, device=None, quantize=None, num_threads=None, compile_model=None):
     from transformers import pipeline, WhisperForConditionalGeneration, WhisperFeatureExtractor, WhisperTokenizer
     import torch
-    device = torch.device("mps" if torch.backends.mps.is_available() else "cpu")
+    model_id = model_id or whisper_model_id
+    device = device or whisper_device
+    quantize = whisper_quantize if quantize is None else quantize
+    num_threads = whisper_num_threads if num_threads is None else num_threads
+    compile_model = whisper_compile if compile_model is None else compile_model
+
+    if device == "auto":
+        device = "mps" if torch.backends.mps.is_available() else "cuda" if torch.cuda.is_available() else "cpu"
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
     
-    feature_extractor = WhisperFeatureExtractor.from_pretrained("openai/whisper-medium")
-    tokenizer = WhisperTokenizer.from_pretrained("openai/whisper-medium", language="en", task="transcribe")
-    model = WhisperForConditionalGeneration.from_pretrained("openai/whisper-medium").to(device)
-    forced_decoder_ids = tokenizer.get_decoder_prompt_ids(language="en", task="transcribe")
+    feature_extractor = WhisperFeatureExtractor.from_pretrained(model_id)
+    tokenizer = WhisperTokenizer.from_pretrained(model_id, language=whisper_language, task=whisper_task)
+    model = WhisperForConditionalGeneration.from_pretrained(model_id).eval()
+    forced_decoder_ids = tokenizer.get_decoder_prompt_ids(language=whisper_language, task=whisper_task)
+
+    if quantize:
+        ### dynamic int8 quantization of the linear layers only runs on CPU
+        device = "cpu"
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model = model.to(device)
+    if compile_model:
+        ### the encoder sees fixed 30s frames; the decoder's growing sequence is left eager
+        model.model.encoder = torch.compile(model.model.encoder)
 
     transcribe_pipe = pipeline(
         "automatic-speech-recognition",
         model=model,
         feature_extractor=feature_extractor,
         tokenizer=tokenizer,
-        device=0)
+        device=torch.device(device))
     
     return transcribe_pipe, forced_decoder_ids
 
+register_resource("asr_pipeline", speech2Text)
+
+def transcription_settings(longform=False):
+    ### everything besides the audio and model that changes the transcript
+    settings = {"language": whisper_language, "task": whisper_task, "quantize": whisper_quantize}
+    if longform:
+        settings.update({"window_seconds": ingest_longform_window_seconds,
+                         "overlap_seconds": ingest_longform_overlap_seconds})
+    return settings
+
+def transcription_version(longform=False):
+    settings = transcription_settings(longform)
+    return f"{whisper_model_id}:" + ",".join(f"{key}={settings[key]}" for key in sorted(settings))
+
 ###------------------------------------------------------------------------------
 ###   Elastic Search 
 ###------------------------------------------------------------------------------
-def getOrCreate_es_client() -> Elasticsearch:
-    global es_client
-    
-    if es_client is None or not es_client.ping():
-        try:
-            es_client = Elasticsearch(os.environ.get("ELASTIC_ENDPOINT"),
-                                      api_key=os.environ.get("ELASTIC_API_KEY"))
-        except Exception as e:
-            abortProcess(f"unable to establish connection to ElasticSearch : {e}")
-    return es_client
+### elasticsearch, langchain and the Whisper stack are imported where they are
+### first used, so entry points that never touch them do not pay for the import
+def create_es_client() -> "Elasticsearch":
+    from .elasticConnection import create_pooled_es_client
+    return create_pooled_es_client()
+
+### liveness is checked by the registry's background thread, not by a ping per call
+register_resource("es_client", create_es_client, health_check=lambda client: client.ping())
 
-def create_index_in_elastic(elastic_index_name):
+def getOrCreate_es_client() -> "Elasticsearch":
+    try:
+        return get_resource("es_client")
+    except Exception as e:
+        abortProcess(f"unable to establish connection to ElasticSearch : {e}")
+
+def fetch_index_status():
+    es_client=getOrCreate_es_client()
+    status = {"index": elastic_index_name, "exists": False, "doc_count": 0, "sample": None, "refreshed_at": time.time()}
+    if es_client.indices.exists(index=elastic_index_name):
+        hits = es_client.search(index=elastic_index_name, size=1)["hits"]["hits"]
+        status.update({"exists": True,
+                       "doc_count": es_client.count(index=elastic_index_name)['count'],
+                       "sample": hits[0]["_source"] if hits else None})
+    return status
+
+register_resource("index_status", fetch_index_status, max_age=index_status_max_age)
+
+def create_index_in_elastic(elastic_index_name, settings=None):
     es_client=getOrCreate_es_client()
     if not es_client.indices.exists(index=elastic_index_name):
         mappings = {
@@ -103,14 +317,18 @@ def create_index_in_elastic(elastic_index_name):
                     "copy_to": [ "semantic_data" ]
                     },
                 "audio_id": { "type": "keyword"},
+                "audio_hash": { "type": "keyword"},
+                "ordinal": { "type": "integer"},
+                "start_time": { "type": "float"},
+                "end_time": { "type": "float"},
                 "semantic_data": {
                     "type": "semantic_text",
-                    "inference_id": "my-elser-model",
+                    "inference_id": elastic_model_id,
                     "model_settings": { "task_type": "sparse_embedding" }
                     }
                 }
             }
-        response=es_client.indices.create(index=elastic_index_name, mappings=mappings)
+        response=es_client.indices.create(index=elastic_index_name, mappings=mappings, settings=settings)
         return response.get('acknowledged')
     
 def semanting_search_with_rrf(params: dict) -> Dict:
@@ -132,6 +350,7 @@ def semanting_search_with_rrf(params: dict) -> Dict:
                                     },
                                     "inner_hits": {
                                         "name": "semantic_data",
+                                        "size": context_inner_hits_size,
                                         "_source": ["semantic_data.inference.chunks.text"]
                                     }
                                 }
@@ -151,52 +370,371 @@ def semanting_search_with_rrf(params: dict) -> Dict:
                 "rank_window_size": 10
             }
         },
+        ### chunk texts are kept for the context builder, their sparse embeddings are not
+        "_source": {"excludes": ["semantic_data.inference.chunks.embeddings"]},
         "size": params['size']
     }
     if debug_mode: print(query)
     return query
 
+def split_compare_subjects(subject):
+    ### the router separates compared subjects with '|'; older decisions use 'vs' or 'and'
+    for separator in (r"\s*\|\s*", r"\s+(?:vs\.?|versus)\s+"):
+        parts = [part.strip() for part in re.split(separator, subject.strip()) if part.strip()]
+        if len(parts) > 1:
+            return parts
+    ### 'and' also occurs inside titles ("beauty and the beast") : only a split into exactly two is trusted
+    parts = [part.strip() for part in re.split(r"\s+and\s+|\s*&\s*", subject.strip()) if part.strip()]
+    return parts if len(parts) == 2 else [subject.strip()]
+
+def hit_to_document(hit):
+    from langchain_core.documents import Document
+    ### same mapping as ElasticsearchRetriever with content_field="content"
+    return Document(page_content=hit["_source"].pop("content"), metadata=hit)
+
+def _msearch_body(inputs_list):
+    searches = []
+    for inputs in inputs_list:
+        searches.extend([{}, semanting_search_with_rrf(inputs)])
+    return searches
+
+def _msearch_results(inputs_list, responses):
+    results = []
+    for inputs, response in zip(inputs_list, responses):
+        if "error" in response:
+            raise RuntimeError(f"search for '{inputs['search_query']}' failed: {response['error']}")
+        results.append([hit_to_document(hit) for hit in response["hits"]["hits"]])
+    return results
+
+def semantic_multi_search(inputs_list):
+    ### one _msearch round trip for several RRF searches, results in input order
+    if retrieval_backend == "local":
+        from .localIndex import local_search
+        return [local_search(inputs) for inputs in inputs_list]
+    es_client=getOrCreate_es_client()
+    responses = es_client.msearch(index=elastic_index_name, searches=_msearch_body(inputs_list))["responses"]
+    return _msearch_results(inputs_list, responses)
+
+async def asemantic_multi_search(inputs_list):
+    if retrieval_backend == "local":
+        return semantic_multi_search(inputs_list)
+    from .elasticConnection import get_async_es_client
+    response = await get_async_es_client().msearch(index=elastic_index_name, searches=_msearch_body(inputs_list))
+    return _msearch_results(inputs_list, response["responses"])
+
 def format_docs(docs):
     return "\n\n".join([d.page_content for d in docs])
 
-def getOrCreate_retriever():
+def create_retriever():
+    if retrieval_backend == "local":
+        ### embedded BM25 + sparse vector index, nothing to cache over a sub-millisecond search
+        from .localIndex import local_retriever
+        return local_retriever()
+    from langchain_elasticsearch import ElasticsearchRetriever
     retriever = ElasticsearchRetriever(
         es_client=getOrCreate_es_client(),
         index_name=elastic_index_name,
         content_field="content",
         body_func=semanting_search_with_rrf,
         )
+    if retrieval_cache_enabled:
+        from .retrievalCache import cached_retriever
+        retriever = cached_retriever(retriever)
     return retriever
 
-def ingest_into_elastic(audio_in, transcribe_pipe, forced_decoder_ids):
+register_resource("retriever", create_retriever, depends_on=("es_client",))
+
+def getOrCreate_retriever():
+    return get_resource("retriever")
+
+def list_audio_feeds(dataSourceDir):
+    return [f"{dataSourceDir}/{audio_feed}" for audio_feed in sorted(os.listdir(dataSourceDir))
+            if not audio_feed.startswith(".") and os.path.isfile(os.path.join(dataSourceDir, audio_feed))]
+
+def make_feed(audio_in, doc_id=None):
+    return {"audio_in": audio_in, "audio_id": os.path.basename(audio_in), "doc_id": doc_id}
+
+###------------------------------------------------------------------------------
+###   Ingestion Progress : per-file events and cancellation
+###------------------------------------------------------------------------------
+### ingestAudio keeps the state of the run in a context variable, so the stage
+### threads of the pipeline see it too. The ingestion paths report each file
+### transcribed and each document indexed, and call check_ingest_cancelled() at
+### file boundaries; a background job's progress callback raises
+### IngestionCancelled there once the job is cancelled.
+_ingest_run = contextvars.ContextVar("ingest_run", default=None)
+
+class IngestionCancelled(Exception):
+    pass
+
+def report_ingest_progress(event, doc_id=None, **fields):
+    ### events : planned (files, skipped), transcribed (doc_id, audio_id, segments), indexed (doc_id), checkpoint
+    run = _ingest_run.get()
+    if run is None:
+        return
+    if doc_id and event == "transcribed":
+        run["segments"][doc_id] = fields.get("segments", 1)
+    elif doc_id and event == "indexed":
+        ### long-form segment ids are <content hash>-<ordinal>
+        content_hash = doc_id.split("-")[0]
+        run["indexed"][content_hash] = run["indexed"].get(content_hash, 0) + 1
+    if run["callback"] is None:
+        return
+    try:
+        run["callback"](event, {"doc_id": doc_id, **fields})
+    except IngestionCancelled:
+        run["cancelled"] = True
+        raise
+
+def ingest_target_index():
+    ### the versioned index of a bulk load (see indexLifecycle), else the configured index or alias
+    run = _ingest_run.get()
+    return run.get("index", elastic_index_name) if run else elastic_index_name
+
+def check_ingest_cancelled():
+    report_ingest_progress("checkpoint")
+
+def unfinished_feeds(audio_feeds):
+    ### feeds of the current run whose documents are not all confirmed in the index
+    run = _ingest_run.get()
+    return [feed for feed in audio_feeds
+            if feed["doc_id"] not in run["segments"] or run["indexed"].get(feed["doc_id"], 0) < run["segments"][feed["doc_id"]]]
+
+def transcribe_audio(audio_in, transcribe_pipe, forced_decoder_ids, audio_id=None, content_hash=None):
+    from .transcriptCache import get_cached_transcript, put_cached_transcript
+    from .tracing import span
+    check_ingest_cancelled()
+    audio_id = audio_id or os.path.basename(audio_in)
+    textContent = get_cached_transcript(content_hash)
+    if textContent is not None:
+        print(f"Feed: {audio_id}, Speech2Text served from transcript cache")
+    else:
+        speech2text_start_time = time.time()
+        with span("transcribe", audio_id=audio_id) as attributes:
+            textContent=transcribe_pipe(audio_in, generate_kwargs={"forced_decoder_ids": forced_decoder_ids})['text']
+            attributes.update({"chars": len(textContent), "words": len(textContent.split())})
+        print(f"Feed: {audio_id}, Speech2Text ElaspedTime: {round(time.time() - speech2text_start_time)} seconds\nContent: {textContent}")
+        put_cached_transcript(content_hash, textContent)
+    report_ingest_progress("transcribed", doc_id=content_hash, audio_id=audio_id)
+    return {'audio_id': audio_id,
+            'content': textContent
+            }
+
+def ingest_into_elastic(audio_in, transcribe_pipe, forced_decoder_ids, doc_id=None):
     es_client=getOrCreate_es_client()
     
     ### Speech2Text
-    speech2text_start_time = time.time()
-    textContent=transcribe_pipe(audio_in, generate_kwargs={"forced_decoder_ids": forced_decoder_ids})['text']
-    print(f"Feed: {audio_in}, Speech2Text ElaspedTime: {round(time.time() - speech2text_start_time)} seconds\nContent: {textContent}")
+    doc = transcribe_audio(audio_in, transcribe_pipe, forced_decoder_ids, content_hash=doc_id)
+    if doc_id: doc['audio_hash'] = doc_id
 
     ### Ingesting data into ElasticSearch
+    from .tracing import span
     ingest_start_time = time.time()
-    doc = {'audio_id': os.path.basename(audio_in),
-           'content': textContent
-           }
-    resp=es_client.index(index=elastic_index_name, body=json.dumps(doc))
+    body = json.dumps(doc)
+    with span("index", audio_id=doc['audio_id'], bytes=len(body)):
+        resp=es_client.index(index=ingest_target_index(), id=doc_id, body=body)
     print(f"doc {resp['result']} in elastic, ElaspedTime: {round(time.time() - ingest_start_time)} seconds")
-    
-def ingestAudio(dataSourceDir):
+    if resp['result'] in ('created', 'updated'): report_ingest_progress("indexed", doc_id=doc_id)
+    return resp['result'] in ('created', 'updated')
+
+###------------------------------------------------------------------------------
+###   Bulk Ingestion
+###------------------------------------------------------------------------------
+def bulk_action(feed, doc):
+    action = {"_index": elastic_index_name, "_source": doc}
+    if feed.get("doc_id"):
+        ### content hash as _id makes re-ingesting the same audio an overwrite, not a duplicate
+        action["_id"] = doc["audio_hash"] = feed["doc_id"]
+    return action
+
+def segment_action(feed, segment):
+    action = bulk_action(feed, {"audio_id": feed["audio_id"], **segment})
+    if feed.get("doc_id"): action["_id"] = f"{feed['doc_id']}-{segment['ordinal']}"
+    return action
+
+def generate_bulk_actions(audio_feeds, transcribe_pipe, forced_decoder_ids):
+    for feed in audio_feeds:
+        print(f"Feed: {feed['audio_in']}")
+        yield bulk_action(feed, transcribe_audio(feed["audio_in"], transcribe_pipe, forced_decoder_ids,
+                                                 content_hash=feed["doc_id"]))
+
+def bulk_ingest_into_elastic(actions):
+    from elasticsearch.helpers import streaming_bulk
+    ### flushes every BULK_CHUNK_SIZE docs or BULK_MAX_CHUNK_BYTES, retries 429 rejections with backoff
+    es_client=getOrCreate_es_client()
+    indexed, errors = 0, []
+    target_index = ingest_target_index()
+    if target_index != elastic_index_name:
+        actions = ({**action, "_index": target_index} for action in actions)
+
+    for ok, item in streaming_bulk(es_client, actions,
+                                   chunk_size=ingest_bulk_chunk_size,
+                                   max_chunk_bytes=ingest_bulk_max_chunk_bytes,
+                                   max_retries=ingest_bulk_max_retries,
+                                   initial_backoff=ingest_bulk_initial_backoff,
+                                   raise_on_error=False,
+                                   raise_on_exception=False):
+        result = next(iter(item.values()))
+        if ok:
+            indexed += 1
+            report_ingest_progress("indexed", doc_id=result.get("_id"))
+            if debug_mode: print(f"doc {result.get('result')} in elastic, id: {result.get('_id')}")
+        else:
+            errors.append({"_id": result.get("_id"), "status": result.get("status"), "error": result.get("error")})
+            print(f"Bulk item failed, status: {result.get('status')}, error: {result.get('error')}")
+    return indexed, errors
+
+def ingest_summary(total, indexed, errors, elapsed, skipped=0, deleted=0, cancelled=False, indexed_files=None):
+    ### indexed counts documents, one per segment in long-form mode; indexed_files the files behind them
+    return {"files": total,
+            "indexed": indexed,
+            "indexed_files": indexed if indexed_files is None else indexed_files,
+            "skipped": skipped,
+            "deleted": deleted,
+            "failed": len(errors),
+            "errors": errors,
+            "elapsed_seconds": round(elapsed, 2),
+            "docs_per_sec": round(indexed / elapsed, 2) if elapsed > 0 else 0.0,
+            "cancelled": cancelled}
+
+def format_ingest_summary(summary):
+    segments = f" ({summary['indexed']} segment docs)" if summary["indexed"] != summary["indexed_files"] else ""
+    return (f"{'Cancelled, ' if summary.get('cancelled') else ''}Indexed {summary['indexed_files']}/{summary['files']} files{segments}, {summary['skipped']} unchanged, "
+            f"{summary['deleted']} deleted, {summary['failed']} failed, "
+            f"ElaspedTime: {summary['elapsed_seconds']} seconds, Throughput: {summary['docs_per_sec']} docs/sec")
+
+def ingestAudio(dataSourceDir, bulk_mode=None, pipeline_mode=None, process_workers=None, incremental=None, prune=None,
+                longform_mode=None, batch_size=None, bulk_load=None, progress=None):
+    ### progress : callback(event, fields) of a background job (see ingestionJobs), may raise IngestionCancelled
+    from .tracing import trace
+    token = _ingest_run.set({"callback": progress, "segments": {}, "indexed": {}, "cancelled": False})
+    try:
+        with trace("ingest", source=dataSourceDir) as attributes:
+            summary = _ingest_audio(dataSourceDir, bulk_mode, pipeline_mode, process_workers, incremental, prune,
+                                    longform_mode, batch_size, bulk_load)
+            attributes.update({key: summary[key] for key in ("files", "indexed", "indexed_files", "skipped", "deleted", "failed", "docs_per_sec", "cancelled")})
+    finally:
+        _ingest_run.reset(token)
+    return summary
+
+def _ingest_audio(dataSourceDir, bulk_mode, pipeline_mode, process_workers, incremental, prune, longform_mode, batch_size, bulk_load):
     if not os.path.exists(dataSourceDir):
         abortProcess(f"Path-{dataSourceDir} does not exists")
+    if bulk_mode is None: bulk_mode = ingest_bulk_mode
+    if pipeline_mode is None: pipeline_mode = ingest_pipeline_mode
+    if process_workers is None: process_workers = ingest_process_workers
+    if incremental is None: incremental = ingest_incremental
+    if prune is None: prune = ingest_prune_deleted
+    if longform_mode is None: longform_mode = ingest_longform_mode
+    if batch_size is None: batch_size = ingest_batch_size
+    if bulk_load is None: bulk_load = index_lifecycle_bulk_load
+    model_version = transcription_version(longform_mode)
         
     start_time = time.time()
-    (transcribe_pipe, forced_decoder_ids)=speech2Text()
-    
-    create_index_in_elastic(elastic_index_name)
-    
-    for audio_feed in os.listdir(dataSourceDir):
-        audio_in=f"{dataSourceDir}/{audio_feed}"
-        print(f"Feed: {audio_in}")
-        ingest_into_elastic(audio_in, transcribe_pipe, forced_decoder_ids)
+    from .ingestionManifest import load_manifest, plan_incremental_ingestion, update_manifest, clear_reprocessed_documents, bump_index_generation
+    run = _ingest_run.get()
+    if bulk_load:
+        ### backfill : every file goes into a new versioned index, the manifest starts over with it
+        from .indexLifecycle import begin_bulk_load, finish_bulk_load, abort_bulk_load
+        ### the new index only holds this directory : refuse when the live one also serves others
+        other_dirs = sorted({os.path.dirname(path) for path in load_manifest(elastic_index_name)["entries"]} - {os.path.abspath(dataSourceDir)})
+        if other_dirs:
+            raise ValueError(f"a bulk load rebuilds '{elastic_index_name}' from {dataSourceDir} alone, "
+                             f"but it also holds files from {', '.join(other_dirs)}")
+        run["index"] = begin_bulk_load(elastic_index_name)
+        manifest, incremental = {"index": elastic_index_name, "entries": {}}, False
+    else:
+        create_index_in_elastic(elastic_index_name)
+        manifest = load_manifest(elastic_index_name)
+    total = len(list_audio_feeds(dataSourceDir))
+    audio_feeds, skipped, missing = plan_incremental_ingestion(dataSourceDir, manifest, model_version, force=not incremental)
+    print(f"Ingestion plan: {len(audio_feeds)} new/modified, {skipped} unchanged, {len(missing)} deleted")
+    report_ingest_progress("planned", files=len(audio_feeds), skipped=skipped)
+    ### a bulk load starts from an empty index, the live one must keep its documents
+    cleared = 0 if bulk_load else clear_reprocessed_documents(elastic_index_name, audio_feeds, model_version)
+
+    try:
+        indexed, errors = _transcribe_and_index(audio_feeds, bulk_mode, pipeline_mode, process_workers, longform_mode, batch_size)
+    except IngestionCancelled:
+        indexed, errors = 0, []
+    except BaseException:
+        if bulk_load: abort_bulk_load(run["index"])
+        raise
+    if bulk_load and (run["cancelled"] or len(errors) > index_lifecycle_max_failed):
+        ### a partial backfill is never swapped in, the alias keeps serving the previous index
+        abort_bulk_load(run["index"])
+        if run["cancelled"]:
+            errors = [{"audio_id": feed["audio_id"], "error": "cancelled"} for feed in audio_feeds]
+        else:
+            print(f"{len(errors)} files failed (MAX_FAILED={index_lifecycle_max_failed}), '{elastic_index_name}' left as it was")
+        summary = ingest_summary(total, 0, errors, time.time() - start_time, skipped, 0, run["cancelled"])
+        print(format_ingest_summary(summary))
+        return summary
+    if run["cancelled"]:
+        ### only files confirmed in the index reach the manifest, an incremental re-run resumes with the rest
+        indexed = sum(run["indexed"].values())
+        errors = [{"audio_id": feed["audio_id"], "error": "cancelled"} for feed in unfinished_feeds(audio_feeds)]
+        print(f"Ingestion cancelled, {len(errors)} files left for the next run")
+    if bulk_load:
+        try:
+            finish_bulk_load(run["index"], elastic_index_name)
+        except BaseException:
+            abort_bulk_load(run["index"])
+            raise
+
+    deleted = update_manifest(elastic_index_name, manifest, audio_feeds, errors, missing, model_version, prune)
+    reset_resource("index_status")
+    ### answers and search results cached against the previous contents are now stale
+    if indexed or deleted or cleared: bump_index_generation(elastic_index_name)
+    if retrieval_backend == "local":
+        from .localIndex import build_local_index, local_index_exists
+        if indexed or deleted or cleared or not local_index_exists(elastic_index_name):
+            ### refreshed first so the scan sees the documents just indexed
+            getOrCreate_es_client().indices.refresh(index=elastic_index_name)
+            build_local_index(elastic_index_name)
     
-    print(f"ElaspedTime: {round(time.time() - start_time)} seconds")
+    ### files whose documents (every segment in long-form mode) all reached the index
+    indexed_files = len(audio_feeds) - len(unfinished_feeds(audio_feeds))
+    summary = ingest_summary(total, indexed, errors, time.time() - start_time, skipped, deleted, run["cancelled"], indexed_files)
+    print(format_ingest_summary(summary))
+    return summary
+
+def _transcribe_and_index(audio_feeds, bulk_mode, pipeline_mode, process_workers, longform_mode, batch_size):
+    ### transcripts already in the cache go straight to the index, no decode or model load
+    from .transcriptCache import split_cached_feeds
+    cached_actions, uncached_feeds = split_cached_feeds(audio_feeds, longform=longform_mode)
+    cached_indexed, cached_errors = bulk_ingest_into_elastic(cached_actions) if cached_actions else (0, [])
+    if cached_actions: print(f"Indexed {cached_indexed}/{len(cached_actions)} docs from the transcript cache")
+
+    if not uncached_feeds:
+        indexed, errors = 0, []
+    elif longform_mode:
+        ### windows are transcribed and indexed as they finish, one segment per document
+        from .longformTranscription import generate_segment_actions
+        segment_errors = []
+        indexed, errors = bulk_ingest_into_elastic(generate_segment_actions(uncached_feeds, *get_resource("asr_pipeline"), segment_errors))
+        errors += segment_errors
+    elif batch_size > 1:
+        from .ingestionPipeline import generate_batched_actions
+        batch_errors = []
+        indexed, errors = bulk_ingest_into_elastic(generate_batched_actions(uncached_feeds, *get_resource("asr_pipeline"), batch_errors, batch_size))
+        errors += batch_errors
+    elif process_workers > 0:
+        ### each pool worker loads its own model, so skip loading one in this process
+        from .ingestionPipeline import run_process_pool_ingestion
+        indexed, errors = run_process_pool_ingestion(uncached_feeds, process_workers)
+    elif pipeline_mode:
+        from .ingestionPipeline import run_ingestion_pipeline
+        indexed, errors = run_ingestion_pipeline(uncached_feeds, *get_resource("asr_pipeline"))
+    elif bulk_mode:
+        (transcribe_pipe, forced_decoder_ids)=get_resource("asr_pipeline")
+        indexed, errors = bulk_ingest_into_elastic(generate_bulk_actions(uncached_feeds, transcribe_pipe, forced_decoder_ids))
+    else:
+        (transcribe_pipe, forced_decoder_ids)=get_resource("asr_pipeline")
+        indexed, errors = 0, []
+        for feed in uncached_feeds:
+            print(f"Feed: {feed['audio_in']}")
+            if ingest_into_elastic(feed["audio_in"], transcribe_pipe, forced_decoder_ids, doc_id=feed["doc_id"]): indexed += 1
+            else: errors.append({"audio_id": feed["audio_id"], "error": "not indexed"})
 
+    return indexed + cached_indexed, errors + cached_errors
@@ -13,8 +13,8 @@ def app():
     
     dataSourceDir="./datasets/short-stories/"
     
-    if 'ingest_status' not in st.session_state:
-        st.session_state['ingest_status'] = None
+    if 'ingest_job_id' not in st.session_state:
+        st.session_state['ingest_job_id'] = None
     
     # Create three columns
     col1, col2, col3 = st.columns([2, 1, 5])
@@ -28,38 +28,75 @@ def app():
         for file in os.listdir(dataSourceDir):
             st.write(f"- {file}")
 
-    # Center Column - Ingest Button
+    # Center Column - Ingest Button and progress of the background job
     with col2:
-        if st.session_state['ingest_status'] == "Running":
-            st.write("Data Ingestion is in progress")
-        elif st.button("Ingest Audio Files"):
-            st.session_state['ingest_status'] = "Running"
-            ingestAudio(dataSourceDir)
-            st.session_state['ingest_status'] = "Completed"
-            st.experimental_rerun()
+        ingestion_job_panel(dataSourceDir)
 
     # Right Column - Elasticsearch Document Count
-    with col3:        
-        es_client=getOrCreate_es_client()
-        
-        if not es_client.indices.exists(index=elastic_index_name):
-            st.error(f"{elastic_index_name} does not exists")
-        else:
-            doc_count = get_document_count()
-            one_doc = get_one_document()
+    with col3:
+        index_status_panel()
 
-def get_document_count():
-    es_client=getOrCreate_es_client()
-    try:
-        doc_count = es_client.count(index=elastic_index_name)['count']
-        st.write(f"Index: '{elastic_index_name}' has {doc_count} records")
-    except Exception as e:
-        st.error(f"Error fetching document count: {e}")
+# polls the job, ingestion itself runs in a background thread of the process
+@st.fragment(run_every=ingestion_jobs_poll_interval)
+def ingestion_job_panel(dataSourceDir):
+    from core.ingestionJobs import start_ingestion_job, resume_ingestion_job, cancel_ingestion_job, get_ingestion_job, active_ingestion_job
+    # a job on this index started from another session (or directory) is picked up too
+    job = active_ingestion_job()
+    if job is None and st.session_state['ingest_job_id'] is not None:
+        job = get_ingestion_job(st.session_state['ingest_job_id'])
+
+    if job is None or job["status"] in ("completed", "cancelled", "failed"):
+        if st.button("Ingest Audio Files"):
+            job = start_ingestion_job(dataSourceDir)
+    if job is None:
+        return
+    st.session_state['ingest_job_id'] = job["job_id"]
+
+    if job["status"] in ("queued", "running", "cancelling"):
+        st.write(f"Data Ingestion is in progress ({os.path.basename(os.path.normpath(job['source']))})")
+        st.progress(job["progress"], text=f"{job['transcribed']}/{job['files']} files")
+        st.metric("Throughput", f"{job['docs_per_sec']} docs/sec")
+        st.metric("ETA", f"{job['eta_seconds']} seconds" if job["eta_seconds"] is not None else "-")
+        if job["current_file"]:
+            st.caption(f"Last file: {job['current_file']}")
+        if job["status"] == "cancelling" or st.button("Cancel"):
+            cancel_ingestion_job(job["job_id"])
+            st.write("Cancelling after the current file")
+        return
 
-def get_one_document():
-    es_client=getOrCreate_es_client()
+    summary = job["summary"]
+    if job["status"] == "failed":
+        st.error(f"Ingestion failed: {job['error']}")
+    elif summary is not None:
+        st.metric("Throughput", f"{summary['docs_per_sec']} docs/sec")
+        st.write(format_ingest_summary(summary))
+        if job["status"] == "cancelled":
+            st.warning(f"Cancelled, {summary['failed']} files left")
+        elif summary['failed'] > 0:
+            st.error(f"{summary['failed']} documents failed to index")
+            st.json(summary['errors'])
+    # incremental run over the same directory, files already indexed are skipped; a bulk load starts over
+    if job["status"] in ("cancelled", "failed") and st.button("Restart" if job["bulk_load"] else "Resume"):
+        st.session_state['ingest_job_id'] = resume_ingestion_job(job["job_id"])["job_id"]
+        st.write("Data Ingestion is restarting" if job["bulk_load"] else "Data Ingestion is resuming")
+
+# served from the process-wide registry, refreshed in the background
+@st.fragment(run_every=index_status_max_age)
+def index_status_panel():
     try:
-        doc = es_client.search(index=elastic_index_name, size=1)
-        st.json(doc["hits"]["hits"][0]["_source"]) if doc["hits"]["total"]["value"] > 0 else st.error("No documents found")
+        index_status = get_resource("index_status")
     except Exception as e:
-        st.error(f"Error fetching document: {e}")
\ No newline at end of file
+        st.error(f"Error fetching index status: {e}")
+        return
+
+    if not index_status["exists"]:
+        st.error(f"{elastic_index_name} does not exists")
+    else:
+        get_document_count(index_status)
+        get_one_document(index_status)
+
+def get_document_count(index_status):
+    st.write(f"Index: '{index_status['index']}' has {index_status['doc_count']} records")
+
+def get_one_document(index_status):
+    st.json(index_status["sample"]) if index_status["sample"] is not None else st.error("No documents found")
@@ -8,6 +8,7 @@ import streamlit as st
 ### - Streamlit
 ###----------------------------------------------
 def app():
+    from core import stream_processflow_graph, processflow_graph_invoke
     st.markdown("### Multi-Agent RAG")
     st.markdown("""
     <style>
@@ -24,24 +25,27 @@ def app():
     
     if debug_mode: print("Its in debug mode")
 
-    if question:
-        # Add the user's question to the chat history
-        st.session_state['messages'].append({"role": "user", "content": question})
-
-        # Process the question
-        response = processflow_graph_invoke(question)
-
-        # Add the assistant's response to the chat history
-        st.session_state['messages'].append({"role": "assistant", "content": response["output"]})
-        
-        # Parse the response and display it as a table
-        if "||" in response:  # Example delimiter to check for Markdown table
-            st.markdown("### Comparison Table")
-            st.markdown(response)  # Display the raw Markdown response
-
     # Display the chat history
     for message in st.session_state['messages']:
         if message["role"] == "user":
             st.chat_message("user").markdown(message["content"])
         else:
             st.chat_message("assistant").markdown(message["content"])
+
+    if question:
+        # Add the user's question to the chat history
+        st.session_state['messages'].append({"role": "user", "content": question})
+        st.chat_message("user").markdown(question)
+
+        # Process the question, streaming the answer as it is generated
+        with st.chat_message("assistant"):
+            if streaming_enabled:
+                metrics = {}
+                output = st.write_stream(stream_processflow_graph(question, metrics))
+                st.caption(f"First token after {metrics['time_to_first_token']}s, complete after {metrics['total_seconds']}s")
+            else:
+                output = processflow_graph_invoke(question)["output"]
+                st.markdown(output)
+
+        # Add the assistant's response to the chat history
+        st.session_state['messages'].append({"role": "assistant", "content": output})
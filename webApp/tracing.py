@@ -0,0 +1,67 @@
+import json
+import streamlit as st
+from core import *
+
+def app():
+    from core.tracing import load_spans, summarize_traces, stage_breakdown, slowest_traces, trace_spans
+    import pandas as pd
+    st.markdown("### Tracing")
+
+    st.markdown("""
+    <style>
+    .stRadio > div { margin-top: -20px; } /* Adjust the margin-top value */
+    </style>
+    """, unsafe_allow_html=True)
+
+    if not tracing_enabled:
+        st.info("Tracing is disabled, set ENABLED=True in the [TRACING] section of config.ini")
+        return
+
+    spans = load_spans()
+    summaries = summarize_traces(spans)
+    if not summaries:
+        st.info(f"No traces recorded yet in {tracing_jsonl_path}, ask a question or ingest audio first")
+        return
+
+    # Kind of request to look at : questions or ingestion runs
+    trace_names = sorted({summary["name"] for summary in summaries})
+    trace_name = st.radio("Requests", trace_names, horizontal=True, label_visibility="hidden")
+    summaries = [summary for summary in summaries if summary["name"] == trace_name]
+    durations = sorted(summary["duration_ms"] for summary in summaries)
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Requests", len(summaries))
+    col2.metric("p50", f"{round(durations[len(durations) // 2])} ms")
+    col3.metric("p95", f"{round(durations[min(len(durations) - 1, int(len(durations) * 0.95))])} ms")
+    col4.metric("Errors", sum(1 for summary in summaries if summary["status"] == "error"))
+
+    # Latency breakdown per stage
+    st.markdown("#### Latency per stage")
+    breakdown = stage_breakdown(spans, trace_name)
+    breakdown.pop(trace_name, None)
+    if breakdown:
+        stages = pd.DataFrame.from_dict(breakdown, orient="index")
+        st.bar_chart(stages[["p50_ms", "p95_ms"]], stack=False)
+        st.dataframe(stages, use_container_width=True)
+    else:
+        # e.g. ingestion runs where every file was unchanged
+        st.info(f"No stage spans recorded for '{trace_name}' yet")
+
+    # Where the time of the latest requests went
+    st.markdown("#### Latest requests")
+    latest = pd.DataFrame([summary["stages"] for summary in summaries[-50:]]).fillna(0)
+    if not latest.empty:
+        st.bar_chart(latest)
+
+    # Slowest requests, with the span tree of the selected one
+    st.markdown("#### Slowest requests")
+    slowest = slowest_traces(spans, 20, trace_name)
+    st.dataframe(pd.DataFrame([{"trace_id": summary["trace_id"], "duration_ms": summary["duration_ms"],
+                                "status": summary["status"], **summary["attributes"], **summary["stages"]}
+                               for summary in slowest]), use_container_width=True)
+
+    trace_id = st.selectbox("Trace", [summary["trace_id"] for summary in slowest])
+    if trace_id:
+        st.dataframe(pd.DataFrame([{"span": "    " * record["depth"] + record["name"], "duration_ms": record["duration_ms"],
+                                    "status": record["status"], "attributes": json.dumps(record["attributes"], default=str)}
+                                   for record in trace_spans(spans, trace_id)]), use_container_width=True)